@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from ...services.agent_service import get_finaya_agent
+from ...services.competitor_impact import MAX_BATCH, legacy_competitor, legacy_competitor_impact
+from ...services.location_optimizer import optimize_location
+from ...core.exceptions import FinayaException
 from ...schemas.schemas import User
 from .auth import get_current_user, get_current_user_optional
 import json
@@ -19,19 +22,46 @@ class AdvisorRequest(BaseModel):
     user_id: Optional[str] = None
 
 class ExplorationRequest(BaseModel):
+    """
+    Cells are screened from server-side map tiles; without MAP_TILE_URL and
+    MAP_TILE_USER_AGENT `/explore` returns [] and `/explore/report` has no
+    pivots and an `unavailable` reason.
+    """
     lat: float
     lng: float
     business_params: Dict[str, Any]
+    radius_m: float = Field(600.0, gt=0)
+    max_vision_calls: int = Field(3, ge=0)
+    refine_levels: int = Field(1, ge=0, le=2)
 
 class ExecutiveSummaryRequest(BaseModel):
     context_data: Dict[str, Any]
 
+class HypotheticalCompetitor(BaseModel):
+    type: str = Field("independent", description="independent, local_chain, national_chain or flagship")
+    distance_m: float = Field(..., ge=0, le=5000)
+    bearing_deg: float = Field(0.0, description="Clockwise from north")
+    rating: Optional[float] = Field(None, ge=1, le=5, description="Defaults to the type's typical rating")
+    reviews: Optional[int] = Field(None, ge=0, description="Defaults to the type's typical review count")
+
 class CompetitorImpactRequest(BaseModel):
     current_data: Dict[str, Any]
-    new_competitor: Dict[str, Any]
+    competitors: List[HypotheticalCompetitor] = Field(default_factory=list, max_length=MAX_BATCH)
+    # Old single {brand_type, distance} request; alone, it gets the old response keys
+    # (adjusted_competitor_density, estimated_market_share_loss_percentage, new_risk_score, impact_summary)
+    new_competitor: Optional[Dict[str, Any]] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
+    narrate: bool = False
+
+class PlaceReviews(BaseModel):
+    place_id: str = Field(..., min_length=1)
+    name: Optional[str] = None
+    reviews: List[str] = Field(default_factory=list)
 
 class CompetitorSentimentRequest(BaseModel):
-    reviews_text: str
+    reviews_text: Optional[str] = None
+    places: List[PlaceReviews] = Field(default_factory=list)  # batch mode: chunked, concurrent, cached per place
 
 @router.post("/advise", response_model=Dict[str, str])
 async def get_agent_advice(
@@ -68,9 +98,38 @@ async def explore_nearby(
     """
     try:
         suggestions = await get_finaya_agent().autonomous_search_suggestion(
-            request.lat, request.lng, request.business_params
+            request.lat, request.lng, request.business_params,
+            radius_m=request.radius_m,
+            max_vision_calls=request.max_vision_calls,
+            refine_levels=request.refine_levels,
         )
         return suggestions
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post("/explore/report", response_model=Dict[str, Any])
+async def explore_nearby_report(
+    request: ExplorationRequest,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    Full optimiser run: best cell, pivots, and the vision calls spent against
+    how far the score moved from the start point and the coarse grid.
+    """
+    try:
+        return await optimize_location(
+            request.lat, request.lng, request.business_params,
+            radius_m=request.radius_m,
+            max_vision_calls=request.max_vision_calls,
+            refine_levels=request.refine_levels,
+        )
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -100,14 +159,25 @@ async def simulate_competitor_impact_endpoint(
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
-    Simulates the impact of a new hypothetical competitor.
+    Revenue, score and risk deltas for a batch of hypothetical competitors,
+    computed deterministically; `narrate` adds an LLM explanation.
+    A lone `new_competitor` is answered in the old single-competitor shape.
     """
     try:
-        impact = await get_finaya_agent().simulate_competitor_impact(
-            request.current_data, 
-            request.new_competitor
+        if request.new_competitor and not request.competitors:
+            return await legacy_competitor_impact(request.current_data, request.new_competitor)
+        competitors = [c.model_dump() for c in request.competitors]
+        if request.new_competitor:
+            competitors.append(legacy_competitor(request.new_competitor))
+        return await get_finaya_agent().simulate_competitor_impact(
+            request.current_data,
+            competitors,
+            lat=request.lat,
+            lng=request.lng,
+            narrate=request.narrate,
         )
-        return impact
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -121,12 +191,24 @@ async def analyze_competitor_sentiment_endpoint(
 ):
     """
     Analyzes sentiment from competitor reviews to find market gaps.
+    With `places`, reviews for many places are analysed in token-budgeted
+    chunks and merged, with per-chunk token and latency reports.
     """
     try:
+        if request.places:
+            return await get_finaya_agent().analyze_competitor_sentiment_batch(
+                [p.model_dump() for p in request.places]
+            )
+        if not request.reviews_text:
+            raise HTTPException(status_code=422, detail="Provide reviews_text or places")
         sentiment_analysis = await get_finaya_agent().analyze_competitor_sentiment(
             request.reviews_text
         )
         return sentiment_analysis
+    except HTTPException:
+        raise
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
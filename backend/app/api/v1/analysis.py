@@ -1,9 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from typing import AsyncIterator, List, Dict, Any, Literal, Optional, Tuple, Union
 from pydantic import BaseModel
-from ...schemas.schemas import AnalysisCreate, User
+import base64
+import json
+from ...core.config import settings
+from ...core.uploads import UPLOAD_CHUNK_SIZE, check_content_length, read_request_body, read_upload_file
+from ...core.exceptions import FinayaException
+from ...schemas.schemas import AnalysisCreate, HeatmapRequest, SimulationRequest, SweepRequest, User
 from ...services.analysis_service import AnalysisService
-from ...services.gemini_service_analysis import analyze_location_image, calculate_business_metrics, reverse_geocode
+from ...services.analysis_pipeline import run_analysis, stream_analysis
+from ...services.heatmap_service import plan_heatmap, stream_heatmap
+from ...services.landcover_classifier import landcover_agreement
+from ...services.monte_carlo import simulate_analysis
+from ...services.sweep_service import sweep_analysis
+from ...services.vision_cache import vision_cache
 from .auth import get_current_user, get_current_user_optional
 
 router = APIRouter()
@@ -19,6 +31,48 @@ class CalculateRequest(BaseModel):
     screenshot_base64: str
     screenshot_metadata: Dict[str, Any]
 
+@router.get("/cache/stats", response_model=Dict[str, Any])
+async def get_vision_cache_stats():
+    """Hit-rate and latency counters of the vision result cache"""
+    return vision_cache.info()
+
+@router.get("/landcover/agreement", response_model=Dict[str, Any])
+async def get_landcover_agreement():
+    """How closely the local land-cover classifier matches the Gemini results it was cached with"""
+    return landcover_agreement.as_dict()
+
+AnalysisMode = Literal["accurate", "fast"]
+MODE_QUERY = Query("accurate", description="'fast' uses the local land-cover classifier instead of Gemini")
+
+@router.post("/heatmap")
+async def site_selection_heatmap(
+    request: HeatmapRequest,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """
+    Score a grid of candidate locations inside a bbox.
+
+    Streams NDJSON: a `grid` line, `cells` lines as batches finish, then
+    `done` with the score surface, best cells and stats (or `error`).
+    """
+    try:
+        grid = plan_heatmap(request)
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    async def lines() -> AsyncIterator[str]:
+        stream = stream_heatmap(grid, request)
+        try:
+            async for event in stream:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print("HEATMAP_ERROR:", e)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 @router.post("/", response_model=dict)
 async def create_analysis(
     analysis: AnalysisCreate,
@@ -59,6 +113,58 @@ async def get_analysis(
             detail="Analysis not found"
         )
 
+@router.post("/{analysis_id}/sweep", response_model=Dict[str, Any])
+async def sweep_saved_analysis(
+    analysis_id: str,
+    request: SweepRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """What-if grid over building width / operating hours / price, reusing the stored vision result"""
+    try:
+        analysis = await analysis_service.get_analysis(analysis_id, current_user.id)
+        if not analysis:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Analysis not found"
+            )
+        return sweep_analysis(analysis, request)
+    except HTTPException:
+        raise
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except Exception as e:
+        print(f"ERROR in sweep_saved_analysis: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post("/{analysis_id}/simulate", response_model=Dict[str, Any])
+async def simulate_saved_analysis(
+    analysis_id: str,
+    request: SimulationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Seeded Monte Carlo revenue distribution (P10/P50/P90, break-even probability, expected risk)"""
+    try:
+        analysis = await analysis_service.get_analysis(analysis_id, current_user.id)
+        if not analysis:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Analysis not found"
+            )
+        return simulate_analysis(analysis, request)
+    except HTTPException:
+        raise
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except Exception as e:
+        print(f"ERROR in simulate_saved_analysis: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.get("/", response_model=List[dict])
 async def get_user_analyses(
     current_user: User = Depends(get_current_user)
@@ -96,6 +202,198 @@ async def get_user_analyses(
 #             detail=str(e)
 #         )
 
+async def _calculate(
+    location: str,
+    business_params: Dict[str, Any],
+    screenshot_metadata: Dict[str, Any],
+    image_bytes: Union[bytes, bytearray],
+    image_base64: Optional[str],
+    image_mime_type: str,
+    current_user: Optional[User],
+) -> Dict[str, Any]:
+    result = await run_analysis(
+        location,
+        business_params,
+        screenshot_metadata,
+        image_bytes,
+        image_base64=image_base64,
+        image_mime_type=image_mime_type
+    )
+    area_distribution = result["area_distribution"]
+    metrics = result["metrics"]
+    location_name = result["location_name"]
+
+    user_id = current_user.id if current_user else None
+
+    analysis_data = {
+        "name": f"Business Analysis - {location_name}",
+        "location": location,
+        "analysis_type": "business_profitability",
+        "data": {
+            "business_params": business_params,
+            "screenshot_metadata": screenshot_metadata,
+            "metrics": metrics
+        },
+        "gemini_analysis": {
+            "area_distribution": area_distribution.dict()
+        }
+    }
+
+    print("DEBUG_ANALYSIS_DATA:", analysis_data)
+    print(f"DEBUG_USER_ID: {user_id}")
+
+    try:
+        create_model = AnalysisCreate(**analysis_data)
+        print("DEBUG_CREATE_MODEL:", create_model)
+    except Exception as e:
+        print("MODEL_BUILD_ERROR:", e)
+        raise HTTPException(status_code=400, detail=f"Failed to build AnalysisCreate: {str(e)}")
+
+    if user_id:
+        saved = await analysis_service.create_analysis(
+            create_model, user_id
+        )
+        analysis_id = saved.id
+    else:
+        analysis_id = None
+
+    return {
+        "success": True,
+        "analysis_id": analysis_id,
+        "metrics": metrics,
+        "area_distribution": area_distribution.dict(),
+        "cache_hit": result["cache_hit"],
+        "timings": result["timings"]
+    }
+
+async def _analyze(
+    location: str,
+    business_params: Dict[str, Any],
+    screenshot_metadata: Dict[str, Any],
+    image_bytes: Union[bytes, bytearray],
+    image_base64: Optional[str],
+    image_mime_type: str,
+    mode: str = "accurate",
+) -> Dict[str, Any]:
+    result = await run_analysis(
+        location,
+        business_params,
+        screenshot_metadata,
+        image_bytes,
+        image_base64=image_base64,
+        image_mime_type=image_mime_type,
+        mode=mode
+    )
+
+    return {
+        "success": True,
+        "location_name": result["location_name"],
+        "metrics": result["metrics"],
+        "area_distribution": result["area_distribution"].dict(),
+        "cache_hit": result["cache_hit"],
+        "timings": result["timings"]
+    }
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _analyze_stream(
+    location: str,
+    business_params: Dict[str, Any],
+    screenshot_metadata: Dict[str, Any],
+    image_bytes: Union[bytes, bytearray],
+    image_base64: Optional[str],
+    image_mime_type: str,
+    mode: str = "accurate",
+) -> StreamingResponse:
+    """
+    Server-Sent Events over the analysis DAG: `location_name`, `search_context`,
+    `area_distribution` and `metrics` as each stage finishes, then `done`
+    (or `error`).
+
+    Starlette cancels the response body when the client disconnects; the
+    cancellation unwinds `stream_analysis`, which cancels the in-flight
+    geocode / search / Gemini calls instead of letting them run to completion.
+    """
+    async def events() -> AsyncIterator[str]:
+        stream = stream_analysis(
+            location,
+            business_params,
+            screenshot_metadata,
+            image_bytes,
+            image_base64=image_base64,
+            image_mime_type=image_mime_type,
+            mode=mode
+        )
+        try:
+            async for event, data in stream:
+                yield _sse(event, data)
+        except Exception as e:
+            print("ANALYZE_STREAM_ERROR:", e)
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _read_screenshot_upload(request: Request) -> Tuple[str, Dict[str, Any], Dict[str, Any], bytearray, str]:
+    """
+    Parse a binary screenshot request into (location, business_params, screenshot_metadata, image, mime_type).
+
+    Accepts either `multipart/form-data` with a `screenshot` file part and
+    `location`, `business_params`, `screenshot_metadata` form fields (the last
+    two JSON-encoded), or a raw `image/*` body with the same fields as query
+    parameters.
+    """
+    limit = settings.MAX_SCREENSHOT_BYTES
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        # Allow some headroom over the image limit for the form fields
+        check_content_length(request, limit + UPLOAD_CHUNK_SIZE)
+        form = await request.form()
+        try:
+            upload = form.get("screenshot")
+            if not isinstance(upload, StarletteUploadFile):
+                raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Missing 'screenshot' file part")
+            image = await read_upload_file(upload, limit)
+            # Browsers and HTTP clients often label the part application/octet-stream; Gemini needs an image type
+            mime_type = (upload.content_type or "").split(";")[0].strip().lower()
+            if not mime_type.startswith("image/"):
+                mime_type = "image/png"
+            fields = {key: form.get(key) for key in ("location", "business_params", "screenshot_metadata")}
+        finally:
+            await form.close()
+    elif content_type.startswith("image/"):
+        image = await read_request_body(request, limit)
+        mime_type = content_type.split(";")[0].strip()
+        fields = {key: request.query_params.get(key) for key in ("location", "business_params", "screenshot_metadata")}
+    else:
+        raise HTTPException(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            "Send multipart/form-data with a 'screenshot' file, or a raw image/* body"
+        )
+
+    if not image:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Empty screenshot")
+
+    try:
+        business_params = json.loads(fields["business_params"] or "")
+        screenshot_metadata = json.loads(fields["screenshot_metadata"] or "")
+        if not isinstance(business_params, dict) or not isinstance(screenshot_metadata, dict):
+            raise ValueError("not an object")
+    except ValueError:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            "'business_params' and 'screenshot_metadata' must be JSON objects"
+        )
+
+    return fields["location"] or "", business_params, screenshot_metadata, image, mime_type
+
 @router.post("/calculate", response_model=Dict[str, Any])
 async def calculate_analysis(
     request: CalculateRequest,
@@ -103,64 +401,35 @@ async def calculate_analysis(
 ):
     """Perform full business analysis calculation and save to DB"""
     try:
-        area_distribution, raw_response = await analyze_location_image(
+        return await _calculate(
+            request.location,
+            request.business_params,
+            request.screenshot_metadata,
+            base64.b64decode(request.screenshot_base64),
             request.screenshot_base64,
-            request.screenshot_metadata
+            "image/png",
+            current_user
         )
-
-        metrics = await calculate_business_metrics(
-            area_distribution,
-            request.business_params,
-            request.screenshot_metadata
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("HANDLER_ERROR:", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
         )
 
-        user_id = current_user.id if current_user else None
-
-        # Parse coordinates and get location name
-        try:
-            lat, lon = map(float, request.location.split(","))
-            location_name = await reverse_geocode(lat, lon)
-        except:
-            location_name = request.location  # Fallback to original if parsing fails
-
-        analysis_data = {
-            "name": f"Business Analysis - {location_name}",
-            "location": request.location,
-            "analysis_type": "business_profitability",
-            "data": {
-                "business_params": request.business_params,
-                "screenshot_metadata": request.screenshot_metadata,
-                "metrics": metrics
-            },
-            "gemini_analysis": {
-                "area_distribution": area_distribution.dict()
-            }
-        }
-
-        print("DEBUG_ANALYSIS_DATA:", analysis_data)
-        print(f"DEBUG_USER_ID: {user_id}")
-
-        try:
-            create_model = AnalysisCreate(**analysis_data)
-            print("DEBUG_CREATE_MODEL:", create_model)
-        except Exception as e:
-            print("MODEL_BUILD_ERROR:", e)
-            raise HTTPException(status_code=400, detail=f"Failed to build AnalysisCreate: {str(e)}")
-
-        if user_id:
-            result = await analysis_service.create_analysis(
-                create_model, user_id
-            )
-            analysis_id = result.id
-        else:
-            analysis_id = None
-
-        return {
-            "success": True,
-            "analysis_id": analysis_id,
-            "metrics": metrics,
-            "area_distribution": area_distribution.dict()
-        }
+@router.post("/calculate/upload", response_model=Dict[str, Any])
+async def calculate_analysis_upload(
+    request: Request,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """Same as /calculate, with the screenshot sent as binary (multipart file or raw image body)"""
+    location, business_params, screenshot_metadata, image, mime_type = await _read_screenshot_upload(request)
+    try:
+        return await _calculate(location, business_params, screenshot_metadata, image, None, mime_type, current_user)
+    except HTTPException:
+        raise
     except Exception as e:
         print("HANDLER_ERROR:", e)
         raise HTTPException(
@@ -171,37 +440,72 @@ async def calculate_analysis(
 @router.post("/analyze", response_model=Dict[str, Any])
 async def analyze_only(
     request: CalculateRequest,
+    mode: AnalysisMode = MODE_QUERY,
     current_user: User = Depends(get_current_user_optional)
 ):
     """Perform business analysis calculation without saving to DB"""
     try:
-        area_distribution = await analyze_location_image(
+        return await _analyze(
+            request.location,
+            request.business_params,
+            request.screenshot_metadata,
+            base64.b64decode(request.screenshot_base64),
             request.screenshot_base64,
-            request.screenshot_metadata
+            "image/png",
+            mode
         )
-
-        metrics = await calculate_business_metrics(
-            area_distribution,
-            request.business_params,
-            request.screenshot_metadata
+    except Exception as e:
+        print("ANALYZE_ERROR:", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
         )
 
-        # Parse coordinates and get location name
-        try:
-            lat, lon = map(float, request.location.split(","))
-            location_name = await reverse_geocode(lat, lon)
-        except:
-            location_name = request.location  # Fallback to original if parsing fails
-
-        return {
-            "success": True,
-            "location_name": location_name,
-            "metrics": metrics,
-            "area_distribution": area_distribution.dict()
-        }
+@router.post("/analyze/upload", response_model=Dict[str, Any])
+async def analyze_only_upload(
+    request: Request,
+    mode: AnalysisMode = MODE_QUERY,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """Same as /analyze, with the screenshot sent as binary (multipart file or raw image body)"""
+    location, business_params, screenshot_metadata, image, mime_type = await _read_screenshot_upload(request)
+    try:
+        return await _analyze(location, business_params, screenshot_metadata, image, None, mime_type, mode)
     except Exception as e:
         print("ANALYZE_ERROR:", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.post("/analyze/stream")
+async def analyze_only_stream(
+    request: CalculateRequest,
+    mode: AnalysisMode = MODE_QUERY,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """Streaming (text/event-stream) variant of /analyze"""
+    # Decoded before the stream starts, so a bad payload is a 422 rather than a broken stream
+    try:
+        image = base64.b64decode(request.screenshot_base64, validate=True)
+    except ValueError:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "'screenshot_base64' is not valid base64")
+    return _analyze_stream(
+        request.location,
+        request.business_params,
+        request.screenshot_metadata,
+        image,
+        request.screenshot_base64,
+        "image/png",
+        mode
+    )
+
+@router.post("/analyze/upload/stream")
+async def analyze_only_upload_stream(
+    request: Request,
+    mode: AnalysisMode = MODE_QUERY,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """Streaming (text/event-stream) variant of /analyze/upload"""
+    location, business_params, screenshot_metadata, image, mime_type = await _read_screenshot_upload(request)
+    return _analyze_stream(location, business_params, screenshot_metadata, image, None, mime_type, mode)
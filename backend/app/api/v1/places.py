@@ -1,25 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Dict, Any, Optional
-from app.services.places_service import places_service
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Any, Optional
+from app.core.config import settings
+from app.core.exceptions import FinayaException
+from app.core.ratelimiter import RateLimitConfig, check_rate_limit
+from app.services.overpass_service import DEFAULT_FILTER, osm_competitors
+from app.services.places_service import MAX_RESULTS, places_service
+from app.services.places_store import PAGE_SIZE
 from app.schemas.schemas import User
-from .auth import get_current_user
+from .auth import get_current_user, get_current_user_optional
 
 router = APIRouter()
 
-@router.get("/competitors", response_model=List[Dict[str, Any]])
+@router.get("/competitors")
 async def get_competitors(
     lat: float,
     lng: float,
     radius: int = 1000,
     keyword: Optional[str] = "food",
     type: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_RESULTS),
+    stream: bool = Query(False, description="Stream NDJSON places as each results page arrives"),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get nearby competitors using Google Places API.
+
+    Follows result pages up to `limit` places (one page = 20, the API stops
+    at 60). With `stream=true` the response is NDJSON: a `place` line per
+    competitor as its page arrives, then `done`; otherwise a JSON list.
+    """
+    if not stream:
+        try:
+            return await places_service.search_nearby(lat, lng, radius, keyword, type, limit)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def lines() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        count = 0
+        places = places_service.iter_nearby(lat, lng, radius, keyword, type, limit)
+        try:
+            async for place in places:
+                count += 1
+                yield json.dumps({"type": "place", "place": place}) + "\n"
+            yield json.dumps({"type": "done", "count": count, "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)}) + "\n"
+        except Exception as e:
+            print("PLACES_STREAM_ERROR:", e)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        finally:
+            await places.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@router.get("/competitors/osm", response_model=Dict[str, Any])
+async def get_osm_competitors(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: int = Query(1000, gt=0, le=settings.OVERPASS_MAX_RADIUS_M),
+    filter: str = Query(DEFAULT_FILTER, max_length=200),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    OpenStreetMap competitors via Overpass, served from geohash tiles cached
+    server-side; only tiles nobody has scanned yet are fetched upstream.
+    Guests are allowed, within a per-IP quota (`RateLimitConfig.OSM_GUEST`).
     """
+    if current_user is None:
+        await check_rate_limit(request, RateLimitConfig.OSM_GUEST, "places:competitors:osm")
     try:
-        competitors = await places_service.search_nearby(lat, lng, radius, keyword, type)
-        return competitors
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return await osm_competitors(lat, lng, radius, filter)
+    except FinayaException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -0,0 +1,161 @@
+"""
+Two-tier result cache: per-process LRU in front of a shared Mongo collection.
+
+Both tiers evict by TTL; the LRU additionally evicts by size. Mongo failures
+(e.g. the database is not configured) degrade the cache to memory-only rather
+than failing the request.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..repositories.cache_repository import CacheRepository
+
+logger = logging.getLogger(__name__)
+
+# After a Mongo error the persistent tier is skipped for this long, so an
+# unreachable database doesn't add a server-selection timeout to every lookup
+PERSISTENT_RETRY_SECONDS = 60
+
+
+def stable_hash(*parts: Any) -> str:
+    """SHA-256 over bytes and/or JSON-serialisable parts, order-sensitive"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, separators=(",", ":"), default=str).encode())
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class CacheStats:
+    """Hit/miss counters and cumulative latencies for one cache"""
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_latency_ms": round(1000 * self.hit_seconds / hits, 3) if hits else None,
+            "avg_miss_latency_ms": round(1000 * self.miss_seconds / self.misses, 3) if self.misses else None,
+        }
+
+
+class TieredCache:
+    """LRU + Mongo cache for JSON-serialisable dict values"""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: int, persistent: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._repository = CacheRepository(f"cache_{name}") if persistent else None
+        self._persistent_down_until = 0.0
+
+    @property
+    def _persistent_available(self) -> bool:
+        return self._repository is not None and time.time() >= self._persistent_down_until
+
+    def _mark_persistent_down(self, error: Exception):
+        logger.warning(f"{self.name} cache: persistent tier unavailable ({error}), memory-only for {PERSISTENT_RETRY_SECONDS}s")
+        self._persistent_down_until = time.time() + PERSISTENT_RETRY_SECONDS
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _set_memory(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = (time.time() + self.ttl_seconds, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up `key` in memory, then Mongo. Counts a miss if neither has it."""
+        start = time.perf_counter()
+
+        value = self._get_memory(key)
+        if value is not None:
+            self.stats.memory_hits += 1
+            self.stats.hit_seconds += time.perf_counter() - start
+            return value
+
+        if self._persistent_available:
+            try:
+                value = await self._repository.get_entry(key)
+            except Exception as e:
+                self._mark_persistent_down(e)
+                value = None
+            if value is not None:
+                self._set_memory(key, value)
+                self.stats.persistent_hits += 1
+                self.stats.hit_seconds += time.perf_counter() - start
+                return value
+
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self._set_memory(key, value)
+        if self._persistent_available:
+            try:
+                await self._repository.set_entry(key, value, self.ttl_seconds)
+            except Exception as e:
+                self._mark_persistent_down(e)
+
+    def record_compute(self, seconds: float):
+        """Account the time spent producing a value after a miss"""
+        self.stats.miss_seconds += seconds
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda value: True,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Return `(value, hit)`. On a miss `compute()` runs and its latency is recorded."""
+        value = await self.get(key)
+        if value is not None:
+            return value, True
+
+        start = time.perf_counter()
+        value = await compute()
+        self.record_compute(time.perf_counter() - start)
+
+        if cacheable(value):
+            await self.set(key, value)
+        return value, False
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._repository is not None,
+            **self.stats.as_dict(),
+        }
@@ -30,6 +30,115 @@ class Settings(BaseSettings):
     GOOGLE_SEARCH_API_KEY: str = "" # Custom Search JSON API Key
     GOOGLE_SEARCH_CX: str = ""      # Programmable Search Engine ID
 
+    # LLM Gateway (shared async Gemini REST client)
+    GEMINI_API_BASE_URL: str = "https://generativelanguage.googleapis.com"
+    GEMINI_API_VERSION: str = "v1beta"
+    LLM_MAX_CONNECTIONS: int = 32       # pooled HTTP connections per worker
+    LLM_MAX_CONCURRENCY: int = 16       # in-flight model calls per worker
+    LLM_TIMEOUT: float = 60.0           # seconds
+
+    # Vision result cache (in-memory LRU + Mongo)
+    VISION_CACHE_MAX_ENTRIES: int = 512
+    VISION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Screenshot uploads
+    MAX_SCREENSHOT_BYTES: int = 16 * 1024 * 1024
+
+    # Screenshot normalisation before vision inference
+    SCREENSHOT_NORMALIZE: bool = True
+    SCREENSHOT_MAX_EDGE: int = 1024          # px, longest edge after downsampling
+    SCREENSHOT_CROP_MARGINS: str = "0,0,0,0" # px "top,right,bottom,left"; e.g. "0,0,20,0" drops a baked-in Leaflet attribution bar
+    SCREENSHOT_FORMAT: str = "WEBP"          # WEBP | JPEG | PNG
+    SCREENSHOT_QUALITY: int = 80
+
+    # Local land-cover classifier (mode=fast and Gemini fallback)
+    LANDCOVER_MAX_EDGE: int = 256            # px, longest edge the classifier works on
+
+    # Map tiles fetched server-side (heatmap cells, /agent/explore). Off by default: bulk fetching
+    # breaks the tile.openstreetmap.org usage policy, so point MAP_TILE_URL at a self-hosted or
+    # commercial tile server and name the app with contact details in MAP_TILE_USER_AGENT
+    MAP_TILE_URL: str = ""                   # e.g. "https://tiles.example.com/{z}/{x}/{y}.png"
+    MAP_TILE_USER_AGENT: str = ""            # e.g. "Finaya/1.0 (+https://finaya.example; ops@finaya.example)"
+    MAP_TILE_MAX_ZOOM: int = 17
+    MAP_TILE_MAX_CONNECTIONS: int = 2
+    MAP_TILE_CACHE_TILES: int = 512          # raw tile LRU (neighbouring cells share tiles)
+    MAP_TILE_TIMEOUT: float = 10.0
+
+    # Site-selection heatmap
+    HEATMAP_MAX_CELLS: int = 900
+    HEATMAP_CACHE_MAX_ENTRIES: int = 20000
+    HEATMAP_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+
+    # Nearby-location optimiser (/agent/explore)
+    OPTIMIZER_MAX_VISION_CALLS: int = 5      # hard cap on Gemini vision inferences per run
+    OPTIMIZER_MAX_RADIUS_M: float = 2000.0
+
+    # Weather (Open-Meteo), cached per geohash cell and hour
+    OPEN_METEO_URL: str = "https://api.open-meteo.com/v1/forecast"
+    WEATHER_TIMEOUT: float = 3.0
+    WEATHER_GEOHASH_PRECISION: int = 5       # ~5 km cells; Open-Meteo's grid is coarser
+    WEATHER_CACHE_MAX_ENTRIES: int = 4096
+    WEATHER_STALE_SECONDS: int = 6 * 3600    # past its hour an entry is served stale while it refreshes
+    WEATHER_FORECAST_DAYS: int = 7           # hourly forecast horizon fetched per cell (Open-Meteo max 16)
+
+    # Hourly pedestrian profiles per area type; empty = app/data/traffic_profiles.json
+    TRAFFIC_PROFILES_PATH: str = ""
+
+    # Offline road network (.osm XML extract or a compiled .npz); empty = default junction chain
+    ROAD_GRAPH_PATH: str = ""
+
+    # Walking catchments on the road graph
+    WALK_SPEED_M_S: float = 1.3
+    CATCHMENT_MINUTES: int = 10              # isochrone whose area replaces the screenshot for CGLP/POPS
+    ISOCHRONE_CACHE_MAX_ENTRIES: int = 20000
+    ISOCHRONE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+
+    # Gridded population (ESRI GridFloat .flt/.bil + .hdr, people per cell); empty = GLOBAL_AVERAGE_DENSITY for CGLP
+    DENSITY_RASTER_PATH: str = ""
+    DENSITY_WEB_SEARCH: bool = True          # search the web for Gemini's density context when the raster does not cover the site
+
+    # Sent to OpenStreetMap services (Nominatim, Overpass) in the User-Agent; their usage
+    # policies require a way to reach the operator: a site URL or "mailto:ops@example.com"
+    OSM_CONTACT: str = "https://finaya.vercel.app"
+
+    # Offline reverse geocoding (GeoNames-style TSV such as cities500.txt); empty = Nominatim only
+    GAZETTEER_PATH: str = ""
+    GAZETTEER_MAX_DISTANCE_M: float = 5000.0  # a nearer place than this names the site
+    NOMINATIM_ENRICH: bool = False            # still ask Nominatim for a street-level name when the gazetteer has one
+    NOMINATIM_TIMEOUT: float = 10.0
+    NOMINATIM_MIN_INTERVAL: float = 1.0       # usage policy: at most one request per second
+
+    # OpenStreetMap competitors via Overpass, cached per geohash tile
+    OVERPASS_URLS: str = "https://overpass-api.de/api/interpreter,https://overpass.kumi.systems/api/interpreter,https://lz4.overpass-api.de/api/interpreter"
+    OVERPASS_TIMEOUT: float = 30.0
+    OVERPASS_TILE_PRECISION: int = 6          # ~1.2 x 0.6 km cells
+    OVERPASS_MAX_RADIUS_M: int = 5000
+    OVERPASS_CACHE_MAX_ENTRIES: int = 20000
+    OVERPASS_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Google Places Nearby Search results kept in a local spatial store
+    PLACES_STORE_TTL_SECONDS: int = 24 * 3600
+    PLACES_STORE_MAX_PLACES: int = 100000
+    PLACES_STORE_MAX_CIRCLES: int = 2000     # searched circles kept per keyword/type
+    PLACES_TIMEOUT: float = 10.0
+    PLACES_PAGE_TOKEN_DELAY: float = 2.0     # next_page_token becomes valid a short while after it is issued
+    PLACES_PAGE_TOKEN_RETRIES: int = 3
+
+    # Competitor analytics (KD-tree rings + Huff market share) from Places results
+    COMPETITOR_RADIUS_M: int = 1000          # trade area and Nearby Search radius
+    COMPETITOR_KEYWORD: str = "food"
+    # Nearby Search's cap: 3 pages, each next_page_token waits ~2 s. One page (20) would floor the
+    # share factor at ~0.40 (20 equal rivals); 60 reaches the old "high" 0.3
+    COMPETITOR_SEARCH_LIMIT: int = 60
+    COMPETITOR_HUFF_DECAY: float = 2.0       # distance exponent of the Huff model
+
+    # Batched competitor review sentiment
+    SENTIMENT_CHUNK_TOKENS: int = 6000       # estimated review tokens per model call
+    SENTIMENT_MAX_CONCURRENCY: int = 4       # chunks in flight per request (the gateway caps the worker)
+    SENTIMENT_MAX_PLACES: int = 200
+    SENTIMENT_CACHE_MAX_ENTRIES: int = 5000
+    SENTIMENT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
     # Security
     SECRET_KEY: str = "default_unsafe_secret_key_for_dev_only"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080
@@ -37,6 +146,14 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:5174,http://localhost:3000,http://127.0.0.1:5173,http://127.0.0.1:5174,http://localhost:8000,https://finaya.vercel.app,https://finaya-production-f6f2.up.railway.app"
     
+    @property
+    def overpass_urls_list(self) -> List[str]:
+        return [url.strip() for url in self.OVERPASS_URLS.split(",") if url.strip()]
+
+    @property
+    def osm_user_agent(self) -> str:
+        return f"Finaya/1.0 (+{self.OSM_CONTACT})" if self.OSM_CONTACT else "Finaya/1.0"
+
     @property
     def cors_origins_list(self) -> List[str]:
         """Parse CORS_ORIGINS string into a list"""
@@ -48,6 +165,8 @@ class Settings(BaseSettings):
     RATE_LIMIT_WINDOW: int = 60     # seconds
     AUTH_RATE_LIMIT_REQUESTS: int = 5  # auth endpoints stricter
     AUTH_RATE_LIMIT_WINDOW: int = 300   # 5 minutes
+    OSM_GUEST_RATE_LIMIT_REQUESTS: int = 20  # /places/competitors/osm without sign-in, per IP
+    OSM_GUEST_RATE_LIMIT_WINDOW: int = 60    # seconds
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,142 @@
+"""
+Geodesy helpers: haversine distances, geohashes, Web Mercator tile math and
+globally snapped cell grids.
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE_LAT = 111_320
+TILE_SIZE = 256
+# Ground resolution of zoom 0 at the equator, metres per pixel
+MERCATOR_M_PER_PX_Z0 = 2 * math.pi * 6_378_137 / TILE_SIZE
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres; accepts scalars or NumPy arrays"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 8) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            ch = (ch << 1) | (lng >= mid)
+            lng_lo, lng_hi = (mid, lng_hi) if lng >= mid else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = (ch << 1) | (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Center (lat, lng) of a geohash cell"""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _GEOHASH_BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+
+
+def geohash_steps(precision: int) -> Tuple[float, float]:
+    """(lat, lng) size in degrees of a geohash cell at `precision`"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a geohash cell"""
+    lat, lng = geohash_decode(geohash)
+    lat_step, lng_step = geohash_steps(len(geohash))
+    return lat - lat_step / 2, lng - lng_step / 2, lat + lat_step / 2, lng + lng_step / 2
+
+
+def geohash_cover(south: float, west: float, north: float, east: float, precision: int) -> List[str]:
+    """Geohash cells at `precision` intersecting a bbox, row by row from the south-west"""
+    lat_step, lng_step = geohash_steps(precision)
+    rows = range(math.floor((south + 90) / lat_step), math.floor((north + 90) / lat_step) + 1)
+    cols = range(math.floor((west + 180) / lng_step), math.floor((east + 180) / lng_step) + 1)
+    return [
+        geohash_encode((r + 0.5) * lat_step - 90, (c + 0.5) * lng_step - 180, precision)
+        for r in rows for c in cols
+    ]
+
+
+def meters_per_pixel(lat: float, zoom: int) -> float:
+    """Ground resolution of a Web Mercator tile pixel"""
+    return MERCATOR_M_PER_PX_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def to_global_pixel(lat: float, lng: float, zoom: int) -> Tuple[float, float]:
+    """Web Mercator pixel coordinates at `zoom` (tile x = px // 256)"""
+    scale = TILE_SIZE * (2 ** zoom)
+    x = (lng + 180.0) / 360.0 * scale
+    sin_lat = min(max(math.sin(math.radians(lat)), -0.9999), 0.9999)
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+@dataclass
+class CellGrid:
+    """
+    Square cells of `cell_m` metres covering a bbox, snapped to a global lattice.
+
+    Row/column indices are global, so two overlapping bboxes (at similar
+    latitudes) produce identical cells, which makes per-cell results cacheable.
+    """
+    cell_m: float
+    lat_step: float
+    lng_step: float
+    cos_bucket: float
+    row0: int
+    col0: int
+    rows: int
+    cols: int
+
+    @classmethod
+    def cover(cls, south: float, west: float, north: float, east: float, cell_m: float) -> "CellGrid":
+        lat_step = cell_m / METERS_PER_DEGREE_LAT
+        # Quantise cos(lat) so the column lattice only changes every ~50 km of latitude
+        cos_bucket = max(round(math.cos(math.radians((south + north) / 2)), 3), 0.01)
+        lng_step = cell_m / (METERS_PER_DEGREE_LAT * cos_bucket)
+        row0, col0 = math.floor(south / lat_step), math.floor(west / lng_step)
+        rows = max(1, math.ceil(north / lat_step) - row0)
+        cols = max(1, math.ceil(east / lng_step) - col0)
+        return cls(cell_m, lat_step, lng_step, cos_bucket, row0, col0, rows, cols)
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.cols
+
+    def center(self, row: int, col: int) -> Tuple[float, float]:
+        """Center of the cell at local (row, col); row 0 is the southern edge"""
+        return (self.row0 + row + 0.5) * self.lat_step, (self.col0 + col + 0.5) * self.lng_step
+
+    def key(self, row: int, col: int) -> str:
+        """Global identity of a cell, stable across requests"""
+        return f"{self.cell_m:g}:{self.cos_bucket:.3f}:{self.row0 + row}:{self.col0 + col}"
@@ -2,6 +2,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from limits import parse
 from starlette.responses import JSONResponse
 from fastapi import Request, HTTPException
 from redis.asyncio import Redis
@@ -105,6 +106,9 @@ class RateLimitConfig:
     # Analysis endpoints (computationally expensive)
     ANALYSIS = f"{settings.RATE_LIMIT_REQUESTS // 4} per {settings.RATE_LIMIT_WINDOW * 2} seconds"
 
+    # Anonymous (guest) callers of endpoints that reach third-party services
+    OSM_GUEST = f"{settings.OSM_GUEST_RATE_LIMIT_REQUESTS} per {settings.OSM_GUEST_RATE_LIMIT_WINDOW} seconds"
+
     @staticmethod
     def by_endpoint(request: Request) -> str:
         """Dynamic rate limit based on endpoint"""
@@ -119,6 +123,21 @@ class RateLimitConfig:
         else:
             return RateLimitConfig.GENERAL
 
+async def check_rate_limit(request: Request, limit: str, scope: str):
+    """
+    Count one request against `limit` for the caller's IP in `scope`, on top
+    of the default limits; raises a 429 once it is used up
+    """
+    limiter = await get_limiter()
+    item = parse(limit)
+    if not limiter.limiter.hit(item, scope, get_remote_address(request)):
+        logger.warning(f"Rate limit {limit} exceeded for {get_remote_address(request)} on {scope}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded ({limit}). Please sign in or try again later.",
+            headers={"Retry-After": str(item.get_expiry())},
+        )
+
 # Custom rate limit exceeded handler
 def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
     """Custom handler for rate limit exceeded"""
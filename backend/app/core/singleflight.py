@@ -0,0 +1,123 @@
+"""
+Single-flight coalescing of identical in-flight async calls.
+
+Concurrent callers that ask for the same normalised key while a call is
+already running await that call's result instead of issuing their own
+upstream request. Nothing is cached: once the call finishes, the next caller
+starts a fresh one (caching is `TieredCache`'s job).
+
+The shared call is cancelled only when every caller waiting on it has been
+cancelled, so one client disconnecting doesn't fail the others.
+"""
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlightStats:
+    def __init__(self):
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "saved_calls": self.coalesced,
+            "saved_rate": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "errors": self.errors,
+        }
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """One group of coalesced calls, e.g. all reverse geocodes"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = SingleFlightStats()
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Run `func()` unless a call for `key` is already in flight, and return its result"""
+        self.stats.calls += 1
+        flight = self._flights.get(key)
+        # A flight left over from another event loop (e.g. a previous test run) can't be awaited here
+        if flight is not None and flight.task.get_loop() is not asyncio.get_running_loop():
+            flight = None
+
+        if flight is None:
+            self.stats.upstream_calls += 1
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._finished, key, flight))
+        else:
+            self.stats.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finished(self, key: Hashable, flight: _Flight, task: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.errors += 1
+
+    def info(self) -> Dict[str, Any]:
+        return {"name": self.name, "in_flight": self.in_flight, **self.stats.as_dict()}
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Process-wide group for `name`, created on first use"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def singleflight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Decorator coalescing concurrent calls of an async function.
+
+    `key` receives the same arguments as the function and returns the
+    normalised key (defaults to the positional and keyword arguments as-is).
+    """
+    group = get_singleflight(name)
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            k = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await group.do(k, lambda: func(*args, **kwargs))
+
+        wrapper.singleflight = group
+        return wrapper
+
+    return decorator
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: group.info() for name, group in _groups.items()}
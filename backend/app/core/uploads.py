@@ -0,0 +1,50 @@
+"""
+Bounded reading of binary request bodies and multipart uploads
+"""
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request, UploadFile, status
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Screenshot exceeds the {limit // (1024 * 1024)} MB limit",
+    )
+
+
+def check_content_length(request: Request, limit: int):
+    """Reject early when the client announces a body larger than `limit`"""
+    length: Optional[str] = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise _too_large(limit)
+
+
+async def _read_chunks(chunks: AsyncIterator[bytes], limit: int) -> bytearray:
+    buffer = bytearray()
+    async for chunk in chunks:
+        if len(buffer) + len(chunk) > limit:
+            raise _too_large(limit)
+        buffer += chunk
+    return buffer
+
+
+async def read_request_body(request: Request, limit: int) -> bytearray:
+    """Stream a raw request body into a single buffer of at most `limit` bytes"""
+    check_content_length(request, limit)
+    return await _read_chunks(request.stream(), limit)
+
+
+async def read_upload_file(upload: UploadFile, limit: int) -> bytearray:
+    """Read a multipart `UploadFile` (spooled by Starlette) into a buffer of at most `limit` bytes"""
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    return await _read_chunks(chunks(), limit)
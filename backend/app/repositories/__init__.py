@@ -4,10 +4,12 @@ Repository layer for database operations
 from .base_repository import BaseRepository
 from .user_repository import UserRepository
 from .analysis_repository import AnalysisRepository
+from .cache_repository import CacheRepository
 
 __all__ = [
     'BaseRepository',
     'UserRepository', 
     'AnalysisRepository',
+    'CacheRepository',
     'FileRepository'
 ]
@@ -0,0 +1,45 @@
+"""
+Key/value cache repository with TTL eviction using MongoDB
+"""
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from .base_repository import BaseRepository
+
+
+class CacheRepository(BaseRepository):
+    """Repository for expiring cache entries. Expiry is enforced by a Mongo TTL index on `expires_at`."""
+
+    def __init__(self, collection_name: str):
+        super().__init__(collection_name)
+        self._ttl_index_ready = False
+
+    async def _ensure_ttl_index(self):
+        if not self._ttl_index_ready:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._ttl_index_ready = True
+
+    async def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached value, ignoring entries the TTL monitor has not removed yet"""
+        doc = await self.collection.find_one({"_id": key})
+        if not doc or doc.get("expires_at", datetime.max) <= datetime.utcnow():
+            return None
+        return doc.get("value")
+
+    async def set_entry(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        """Insert or replace a cached value"""
+        await self._ensure_ttl_index()
+        now = datetime.utcnow()
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "value": value,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+            },
+            upsert=True,
+        )
+
+    async def get_by_user_id(self, user_id: str) -> List[Dict[str, Any]]:
+        """Cache entries are not user-owned"""
+        return []
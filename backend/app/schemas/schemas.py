@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 # Area Distribution schema
@@ -48,6 +48,57 @@ class Analysis(AnalysisBase):
     class Config:
         from_attributes = True
 
+# What-if sweep schemas
+class SweepAxis(BaseModel):
+    """Either explicit `values`, or `steps` evenly spaced points from `start` to `stop`"""
+    values: Optional[List[float]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: int = Field(10, ge=1, le=1000)
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.values is None and (self.start is None or self.stop is None):
+            raise ValueError("Provide either 'values' or both 'start' and 'stop'")
+        if self.values is not None and not self.values:
+            raise ValueError("'values' must not be empty")
+        return self
+
+class SweepRequest(BaseModel):
+    # Axes left out stay at the value stored with the analysis
+    buildingWidth: Optional[SweepAxis] = None
+    operatingHours: Optional[SweepAxis] = None
+    productPrice: Optional[SweepAxis] = None
+    monthlyCost: Optional[float] = Field(None, ge=0, description="Fixed monthly cost; enables break-even and profit")
+    hourlyCost: float = Field(0.0, ge=0, description="Cost per operating hour per day (staff, utilities)")
+    objective: Literal["monthlyProfit", "monthlyRevenue", "locationScore"] = "monthlyProfit"
+
+class SimulationRequest(BaseModel):
+    samples: int = Field(10_000, ge=100, le=200_000)
+    seed: Optional[int] = Field(None, ge=0, description="Defaults to a seed derived from the inputs")
+    monthlyCost: Optional[float] = Field(None, ge=0, description="Fixed monthly cost; enables break-even probability")
+    hourlyCost: float = Field(0.0, ge=0, description="Cost per operating hour per day (staff, utilities)")
+
+# Site-selection heatmap schemas
+class BoundingBox(BaseModel):
+    south: float = Field(..., ge=-85, le=85)
+    west: float = Field(..., ge=-180, le=180)
+    north: float = Field(..., ge=-85, le=85)
+    east: float = Field(..., ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_order(self):
+        if self.south >= self.north or self.west >= self.east:
+            raise ValueError("Expected south < north and west < east")
+        return self
+
+class HeatmapRequest(BaseModel):
+    bbox: BoundingBox
+    cell_size_m: float = Field(250, ge=50, le=2000)
+    business_params: Dict[str, Any]
+    budget_seconds: float = Field(30, gt=0, le=120)
+    max_concurrency: int = Field(8, ge=1, le=32)
+
 # Auth schemas
 class Token(BaseModel):
     access_token: str
@@ -1,59 +1,45 @@
-import google.generativeai as genai
 import json
-import base64
 import httpx
 from typing import Dict, Any, List, Optional, Tuple
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.exceptions import ExternalServiceError
+from app.core.singleflight import singleflight
+from .competitor_analytics import format_competition
+from .competitor_impact import simulate_competitor_impact
+from .competitor_sentiment import analyze_sentiment_batch
 from .gemini_service_analysis import analyze_location_image, calculate_business_metrics, reverse_geocode
-
-from google import genai
-from google.genai import types
+from .llm_gateway import get_llm_gateway, text_part
+from .location_optimizer import optimize_location
 
 class FinayaAgent:
     def __init__(self):
         self.api_key = settings.GEMINI_API_KEY
         self.model_name = settings.GEMINI_MODEL or "gemini-2.0-flash"
-        self.client = None
-        self.legacy_client = None
-        self.use_legacy = False
+        # All model calls go through the process-wide async gateway
+        self.gateway = get_llm_gateway()
 
-        if not self.api_key:
+        if not self.gateway.enabled:
             print("⚠️ GEMINI_API_KEY not found. Agent features will be disabled.")
-            return
 
-        # Try initializing Google Gen AI SDK v0 (google.generativeai) first as it is more stable in this env
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=self.api_key)
-            self.legacy_client = genai.GenerativeModel(self.model_name)
-            self.use_legacy = True
-            print("✅ Initialized Gemini using Legacy SDK (google.generativeai)")
-        except ImportError:
-            print("⚠️ Legacy SDK not found, trying new SDK...")
-        except Exception as e:
-            print(f"❌ Failed to initialize Legacy SDK: {e}")
+    @property
+    def enabled(self) -> bool:
+        return self.gateway.enabled
 
-        # If legacy failed, try new SDK v1 (google.genai)
-        if not self.use_legacy:
-            try:
-                from google import genai
-                self.client = genai.Client(api_key=self.api_key)
-                print("✅ Initialized Gemini using New SDK (google.genai)")
-            except Exception as e:
-                print(f"❌ Failed to initialize New SDK: {e}")
-                print("❌ FinayaAgent logic will be disabled.")
-
-    def _format_competitors(self, competitors: List[Dict[str, Any]]) -> str:
+    def _format_competitors(self, competitors: List[Dict[str, Any]], competition: Optional[Dict[str, Any]] = None) -> str:
+        """Numeric summary (see `competitor_analytics`) when the analysis has one, then the top names"""
+        summary = format_competition(competition)
         if not competitors:
-            return "No data available."
+            return summary or "No data available."
         
         formatted = []
         for c in competitors[:20]:
             params = f"{c.get('name')} (Rating: {c.get('rating')}⭐, {c.get('user_ratings_total')} reviews)"
             formatted.append(params)
-        return ", ".join(formatted)
+        names = ", ".join(formatted)
+        return f"{summary}. {names}" if summary else names
 
+    @singleflight("web_search", key=lambda self, query: " ".join(query.lower().split()))
     async def _web_search(self, query: str) -> str:
         if not settings.GOOGLE_SEARCH_API_KEY or not settings.GOOGLE_SEARCH_CX:
             return "Web Search Unavailable (API Key/CX not configured)."
@@ -85,7 +71,7 @@ class FinayaAgent:
             return f"Search Exception: {str(e)}"
 
     async def generate_executive_summary(self, context_data: Dict[str, Any]) -> str:
-        if not self.client and not self.legacy_client:
+        if not self.enabled:
             return "Executive Summary Unavailable (AI Agent disabled)."
 
         metrics = context_data.get("metrics", {})
@@ -121,53 +107,47 @@ class FinayaAgent:
         """
         
         try:
-            if self.use_legacy:
-                response = self.legacy_client.generate_content(prompt)
-                return response.text
-            else:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
-                return response.text
+            response = await self.gateway.generate(prompt)
+            return response.text
         except Exception as e:
             return f"Error generating summary: {str(e)}"
 
-    async def simulate_competitor_impact(self, current_data: Dict[str, Any], new_competitor: Dict[str, Any]) -> Dict[str, Any]:
-        if not self.client and not self.legacy_client:
-            return {"error": "AI Agent disabled"}
+    async def simulate_competitor_impact(
+        self,
+        current_data: Dict[str, Any],
+        competitors: List[Dict[str, Any]],
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+        narrate: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Deterministic batch simulation (see `competitor_impact`); the model
+        only writes the optional `narrative` over the computed numbers.
+        """
+        result = await simulate_competitor_impact(current_data, competitors, lat, lng)
+        if not narrate:
+            return result
+        if not self.enabled:
+            result["narrative"] = None
+            return result
 
         prompt = f"""
-        Simulate impact of new competitor.
-        Current Density: {current_data.get('competitor_density')}
-        New Competitor: {new_competitor.get('brand_type')} at {new_competitor.get('distance')}m
-
-        Output JSON only:
-        {{
-          "adjusted_competitor_density": "string",
-          "estimated_market_share_loss_percentage": number,
-          "new_risk_score": number,
-          "impact_summary": "string"
-        }}
+        Explain this competitor impact simulation to a business owner in 3-5 sentences.
+        Use only these numbers; do not invent others. Highlight the most damaging scenario.
+        Location: {current_data.get('location_name', 'Unknown')}
+        Baseline: {json.dumps(result['baseline'])}
+        Scenarios: {json.dumps(result['results'][:20])}
         """
-        
         try:
-            if self.use_legacy:
-                response = self.legacy_client.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-                return json.loads(response.text)
-            else:
-                from google.genai import types
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(response_mime_type="application/json")
-                )
-                return json.loads(response.text)
+            response = await self.gateway.generate(prompt)
+            result["narrative"] = response.text
         except Exception as e:
-            return {"error": str(e)}
+            print(f"Competitor impact narration failed: {e}")
+            result["narrative"] = None
+        return result
 
     async def analyze_competitor_sentiment(self, reviews_text: str) -> Dict[str, Any]:
-        if not self.client and not self.legacy_client:
+        if not self.enabled:
             return {"error": "AI Agent disabled"}
 
         prompt = f"""
@@ -183,22 +163,19 @@ class FinayaAgent:
         }}
         """
         try:
-            if self.use_legacy:
-                response = self.legacy_client.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-                return json.loads(response.text)
-            else:
-                from google.genai import types
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(response_mime_type="application/json")
-                )
-                return json.loads(response.text)
+            response = await self.gateway.generate(prompt, response_mime_type="application/json")
+            return json.loads(response.text)
         except Exception as e:
             return {"error": str(e)}
 
+    async def analyze_competitor_sentiment_batch(self, places: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reviews for many places, chunked and merged; see `competitor_sentiment`"""
+        if not self.enabled:
+            return {"error": "AI Agent disabled"}
+        return await analyze_sentiment_batch(places)
+
     async def run_advisor_task(self, query: str, context_data: Dict[str, Any], history: List[Any] = [], user_id: Optional[str] = None) -> str:
-        if not self.client and not self.legacy_client:
+        if not self.enabled:
              return "I apologize, but I am currently disabled because the AI Engine API Key is missing."
 
         # 0. Fetch User History Context
@@ -228,7 +205,7 @@ class FinayaAgent:
         - Location: {context_data.get('location_name', 'Unknown')}
         - Business: {context_data.get('business_params', {})}
         - Metrics: {context_data.get('metrics', {})}
-        - Competitors: {self._format_competitors(context_data.get('competitors', []))}
+        - Competitors: {self._format_competitors(context_data.get('competitors', []), (context_data.get('metrics') or {}).get('competition'))}
         
         REAL-TIME SEARCH:
         {search_results}
@@ -240,95 +217,64 @@ class FinayaAgent:
         """
         
         try:
-            if self.use_legacy:
-                # Build history for legacy SDK
-                # Legacy SDK expects [{'role': 'user'|'model', 'parts': ['text']}]
-                chat_history = []
-                
-                # 1. System Prompt (as User)
-                chat_history.append({'role': 'user', 'parts': [system_prompt]})
-                
-                # 2. Check first message in history
-                if history:
-                    # Get role of first message safely
-                    first_msg = history[0]
-                    first_role = getattr(first_msg, 'role', None) or first_msg.get('role', 'user')
-                    if first_role == 'assistant': first_role = 'model'
-                    
-                    # If first historic message is User, we need a Model message before it to maintain alternation
-                    if first_role == 'user':
-                        chat_history.append({'role': 'model', 'parts': ["I understand the context. Please proceed."]})
-                
-                # 3. Append History
-                for msg in history:
-                     role = getattr(msg, 'role', None) or msg.get('role', 'user')
-                     text = getattr(msg, 'text', None) or msg.get('text', '')
-                     if role == 'assistant': role = 'model'
-                     
-                     chat_history.append({'role': role, 'parts': [text]})
-                
-                # 4. Start Chat
-                chat = self.legacy_client.start_chat(history=chat_history)
-                
-                # 5. Send Query
-                response = chat.send_message(query)
-                return response.text
+            # Gemini expects strictly alternating user/model turns:
+            # system prompt (user) -> acknowledgement (model) -> history -> query
+            chat_history = [
+                {'role': 'user', 'parts': [text_part(system_prompt)]},
+                {'role': 'model', 'parts': [text_part("I am ready to advise.")]},
+            ]
+
+            for msg in history:
+                role = getattr(msg, 'role', None) or msg.get('role', 'user')
+                text = getattr(msg, 'text', None) or msg.get('text', '')
+                if role == 'assistant': role = 'model'
+                if role == 'system': role = 'user'
+
+                # Merge consecutive turns from the same side to keep alternation
+                if chat_history[-1]['role'] == role:
+                    chat_history[-1]['parts'].append(text_part(text))
+                else:
+                    chat_history.append({'role': role, 'parts': [text_part(text)]})
+
+            if chat_history[-1]['role'] == 'user':
+                chat_history.append({'role': 'model', 'parts': [text_part("Understood.")]})
+
+            response = await self.gateway.chat(chat_history, query, temperature=0.7)
+            return response.text
 
-            else:
-                from google.genai import types
-                
-                chat_history = []
-                chat_history.append(types.Content(role="user", parts=[types.Part.from_text(text=system_prompt)]))
-                chat_history.append(types.Content(role="model", parts=[types.Part.from_text(text="I am ready to advise.")]))
-
-                for msg in history:
-                    role = getattr(msg, 'role', msg.get('role', 'user'))
-                    text = getattr(msg, 'text', msg.get('text', ''))
-                    if role == "system": role = "user"
-                    chat_history.append(types.Content(role=role, parts=[types.Part.from_text(text=text)]))
-
-                chat = self.client.chats.create(
-                    model=self.model_name,
-                    history=chat_history,
-                    config=types.GenerateContentConfig(temperature=0.7)
-                )
-                
-                response = chat.send_message(query)
-                return response.text
-                
         except Exception as e:
             print(f"Agent Task Error: {e}")
             return f"I apologize, but I encountered an error: {str(e)}"
 
-    async def autonomous_search_suggestion(self, current_lat: float, current_lng: float, params: Dict[str, Any]) -> List[Dict[str, Any]]:
-        if not self.client and not self.legacy_client:
-            return []
+    async def autonomous_search_suggestion(
+        self,
+        current_lat: float,
+        current_lng: float,
+        params: Dict[str, Any],
+        radius_m: float = 600.0,
+        max_vision_calls: int = 3,
+        refine_levels: int = 1,
+    ) -> List[Dict[str, Any]]:
+        """
+        Nearby 'Pivot' locations scored by the metrics formula, best first.
 
-        prompt = f"""
-        Based on a location at {current_lat}, {current_lng} and these business parameters {params},
-        suggest 3 potential nearby 'Pivot' locations (relative directions) that might yield higher ROI.
-        
-        Respond in JSON format:
-        [
-          {{"reason": "closer to high foot traffic", "direction": "North-East", "offset_meters": 300}},
-          ...
-        ]
+        Backed by the budgeted coarse-to-fine optimiser rather than LLM-invented
+        offsets, so every pivot carries a score and costs at most
+        `max_vision_calls` vision inferences. Empty when the optimiser cannot
+        run (no map tile source, tiles or Gemini unreachable); invalid input
+        still raises.
         """
-        
         try:
-            if self.use_legacy:
-                response = self.legacy_client.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-                return json.loads(response.text)
-            else:
-                from google.genai import types
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(response_mime_type="application/json")
-                )
-                return json.loads(response.text)
-        except:
+            result = await optimize_location(
+                current_lat, current_lng, params,
+                radius_m=radius_m, max_vision_calls=max_vision_calls, refine_levels=refine_levels,
+            )
+        except ExternalServiceError as e:
+            print(f"Exploration unavailable: {e.message}")
             return []
+        if result["unavailable"]:
+            print(f"Exploration unavailable: {result['unavailable']}")
+        return result["pivots"]
 
 # Lazy singleton instance (not initialized at import time)
 finaya_agent = None
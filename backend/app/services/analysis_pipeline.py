@@ -0,0 +1,369 @@
+"""
+Stage DAG behind /analysis/analyze and /analysis/calculate.
+
+    cache_lookup ──┬── center_name ── search_context ──┐
+                   ├───────────────────────────────────┼── area_distribution ──┐
+                   ├── screenshot ──┬── landcover ─────┤                       │
+                   │                └──────────────────┴───────────────────────┼── metrics
+                   └── location_name                    weather ───────────────┤
+                                                        competition ───────────┘
+
+`screenshot` normalises the image (crop, downsample, recompress) and its
+geometry; on a cache hit only the geometry is rewritten. `landcover` is the
+local pixel classifier: the whole answer with `mode="fast"`, otherwise the
+fallback when Gemini fails and a reference for agreement statistics. Weather
+and `competition` (Places competitors -> KD-tree / Huff figures) have no
+dependencies and overlap with the whole geocode -> search -> Gemini chain.
+The route-level `location_name` and the image `center_name` share one
+memoised reverse geocode when they are the same point, and a vision cache
+hit short-circuits geocoding, search and Gemini.
+"""
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+from app.schemas.schemas import AreaDistribution
+from app.services.gemini_service_analysis import (
+    analyze_with_gemini,
+    calculate_business_metrics,
+    reverse_geocode,
+    _web_search_density,
+)
+from app.core.config import settings
+from app.services.catchment import get_catchment
+from app.services.competitor_analytics import nearby_competitors, site_competition
+from app.services.density_raster import screenshot_ring, site_density
+from app.services.image_preprocess import NormalizedScreenshot, normalize_screenshot
+from app.services.landcover_classifier import LandcoverEstimate, classify_landcover, landcover_agreement
+from app.services.metrics_engine import screenshot_area
+from app.services.pipeline import Pipeline, PipelineContext, Stage
+from app.services.vision_cache import vision_cache, vision_cache_key, vision_flight
+from app.services.traffic_probability import business_window
+from app.services.weather_probability import get_weather, get_weather_outlook
+
+
+def _fast(ctx: PipelineContext) -> bool:
+    return ctx.inputs.get("mode") == "fast"
+
+
+def _center(ctx: PipelineContext) -> Tuple[Optional[float], Optional[float]]:
+    center = ctx.inputs["screenshot_metadata"].get("center") or {}
+    return center.get("lat"), center.get("lng")
+
+
+def _same_point(a: Tuple[Any, Any], b: Tuple[Any, Any]) -> bool:
+    try:
+        return round(float(a[0]), 6) == round(float(b[0]), 6) and round(float(a[1]), 6) == round(float(b[1]), 6)
+    except (TypeError, ValueError):
+        return False
+
+
+async def _geocode(ctx: PipelineContext, lat: float, lng: float) -> str:
+    return await ctx.memo(("geocode", round(lat, 6), round(lng, 6)), lambda: reverse_geocode(lat, lng))
+
+
+async def stage_cache_lookup(ctx: PipelineContext) -> Dict[str, Any]:
+    key = vision_cache_key(ctx.inputs["image_bytes"], ctx.inputs["screenshot_metadata"])
+    return {"key": key, "entry": await vision_cache.get(key)}
+
+
+async def stage_center_name(ctx: PipelineContext, cache_lookup: Dict[str, Any]) -> str:
+    if cache_lookup["entry"]:
+        return cache_lookup["entry"]["location_name"]
+    if _fast(ctx):
+        return None  # only feeds the Gemini prompt
+    try:
+        lat, lng = _center(ctx)
+        return await _geocode(ctx, float(lat), float(lng))
+    except Exception:
+        return "Unknown Location"
+
+
+async def stage_location_name(ctx: PipelineContext, cache_lookup: Dict[str, Any]) -> str:
+    location = ctx.inputs.get("location") or ""
+    try:
+        lat, lng = map(float, location.split(","))
+    except ValueError:
+        return location  # Fallback to original if parsing fails
+
+    if cache_lookup["entry"] and _same_point((lat, lng), _center(ctx)):
+        return cache_lookup["entry"]["location_name"]
+    return await _geocode(ctx, lat, lng)
+
+
+async def stage_search_context(
+    ctx: PipelineContext,
+    cache_lookup: Dict[str, Any],
+    center_name: Optional[str],
+    density: Optional[Dict[str, Any]],
+) -> Optional[str]:
+    if cache_lookup["entry"] or _fast(ctx):
+        return None
+    if density:
+        # Local raster figure; no search round trip
+        return f"Gridded population data: about {density['density']:,.0f} people/km2 ({density['population']:,} people in {density['areaSqKm']} km2 around the site)."
+    if not settings.DENSITY_WEB_SEARCH:
+        return None
+    return await _web_search_density(center_name)
+
+
+async def stage_screenshot(ctx: PipelineContext, cache_lookup: Dict[str, Any]) -> NormalizedScreenshot:
+    image_bytes = ctx.inputs["image_bytes"]
+    metadata = ctx.inputs["screenshot_metadata"]
+    mime_type = ctx.inputs.get("image_mime_type") or "image/png"
+
+    if not settings.SCREENSHOT_NORMALIZE:
+        return NormalizedScreenshot(image_bytes, mime_type, metadata, len(image_bytes))
+    if cache_lookup["entry"] or _fast(ctx):
+        # No Gemini call; only the rewritten geometry is needed for the metrics
+        return normalize_screenshot(image_bytes, metadata, mime_type, encode=False)
+    # Decode/resize/encode is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(normalize_screenshot, image_bytes, metadata, mime_type)
+
+
+async def stage_landcover(
+    ctx: PipelineContext,
+    cache_lookup: Dict[str, Any],
+    screenshot: NormalizedScreenshot,
+) -> Optional[LandcoverEstimate]:
+    if cache_lookup["entry"]:
+        return None
+    # A re-encoded screenshot is already cropped; otherwise apply the planned crop to the original
+    crop_box = None if screenshot.reencoded else (screenshot.metadata.get("normalized") or {}).get("crop_box")
+    try:
+        return await asyncio.to_thread(classify_landcover, screenshot.data, crop_box)
+    except Exception as e:
+        print(f"Landcover classification failed: {e}")
+        return None
+
+
+async def stage_weather(ctx: PipelineContext) -> str:
+    lat, lng = _center(ctx)
+    return await get_weather(lat, lng)
+
+
+async def stage_weather_outlook(ctx: PipelineContext) -> Optional[Dict[str, Any]]:
+    lat, lng = _center(ctx)
+    try:
+        opening, hours = business_window(ctx.inputs["business_params"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return await get_weather_outlook(lat, lng, hours, opening)
+
+
+async def stage_catchment(ctx: PipelineContext) -> Optional[Dict[str, Any]]:
+    lat, lng = _center(ctx)
+    return await get_catchment(lat, lng)
+
+
+async def stage_density(ctx: PipelineContext, catchment: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Raster population over the walking catchment, or the screenshot rectangle without one"""
+    ring = None
+    if catchment:
+        ring = next((i["outline"] for i in catchment["isochrones"] if i["minutes"] == catchment["minutes"]), None)
+    if ring is None:
+        metadata = ctx.inputs["screenshot_metadata"]
+        try:
+            width_m, height_m, _ = screenshot_area(metadata)
+            ring = screenshot_ring(metadata["center"], width_m, height_m)
+        except (KeyError, TypeError, ValueError):
+            return None
+    return site_density(ring)
+
+
+async def stage_competition(ctx: PipelineContext) -> Optional[Dict[str, Any]]:
+    """Numeric competition around the site; None leaves Gemini's low/medium/high estimate in charge"""
+    lat, lng = _center(ctx)
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    places = await nearby_competitors(lat, lng)
+    return None if places is None else site_competition(lat, lng, places)
+
+
+async def stage_area_distribution(
+    ctx: PipelineContext,
+    cache_lookup: Dict[str, Any],
+    center_name: Optional[str],
+    search_context: Optional[str],
+    screenshot: NormalizedScreenshot,
+    landcover: Optional[LandcoverEstimate],
+) -> AreaDistribution:
+    entry = cache_lookup["entry"]
+    if entry:
+        return AreaDistribution(**entry["area_distribution"])
+
+    fallback = landcover.to_area_distribution() if landcover else None
+    if _fast(ctx):
+        if fallback is None:
+            raise ValueError("Screenshot could not be classified locally")
+        return fallback
+
+    if screenshot.reencoded:
+        image, mime_type = screenshot.data, screenshot.mime_type
+    else:
+        # JSON requests already carry base64, forward it as-is; uploads are encoded once by the gateway
+        image = ctx.inputs.get("image_base64") or screenshot.data
+        mime_type = screenshot.mime_type
+
+    async def compute() -> AreaDistribution:
+        start = time.perf_counter()
+        area_distribution = await analyze_with_gemini(
+            image, center_name, search_context, mime_type=mime_type, fallback=fallback
+        )
+        vision_cache.record_compute(time.perf_counter() - start)
+
+        # Never cache a fallback, the next request should retry Gemini
+        if not area_distribution.reasoning.startswith("Fallback"):
+            value = {
+                "location_name": center_name,
+                "area_distribution": area_distribution.dict(),
+            }
+            if landcover:
+                value["landcover"] = landcover.as_dict()
+                landcover_agreement.record(value["landcover"], value["area_distribution"])
+            await vision_cache.set(cache_lookup["key"], value)
+        return area_distribution
+
+    # Same cache key = same pixels and geometry, so concurrent misses can share one Gemini call
+    return await vision_flight.do(cache_lookup["key"], compute)
+
+
+async def stage_metrics(
+    ctx: PipelineContext,
+    area_distribution: AreaDistribution,
+    weather: str,
+    weather_outlook: Optional[Dict[str, Any]],
+    catchment: Optional[Dict[str, Any]],
+    density: Optional[Dict[str, Any]],
+    competition: Optional[Dict[str, Any]],
+    screenshot: NormalizedScreenshot,
+) -> Dict[str, Any]:
+    # Normalised geometry: width * scale covers exactly the pixels the vision stage saw
+    return await calculate_business_metrics(
+        area_distribution,
+        ctx.inputs["business_params"],
+        screenshot.metadata,
+        weather=weather,
+        weather_outlook=weather_outlook,
+        catchment=catchment,
+        density=density,
+        competition=competition,
+    )
+
+
+analysis_pipeline = Pipeline([
+    Stage("cache_lookup", stage_cache_lookup),
+    Stage("center_name", stage_center_name, ("cache_lookup",)),
+    Stage("location_name", stage_location_name, ("cache_lookup",)),
+    Stage("catchment", stage_catchment),
+    Stage("density", stage_density, ("catchment",)),
+    Stage("search_context", stage_search_context, ("cache_lookup", "center_name", "density")),
+    Stage("screenshot", stage_screenshot, ("cache_lookup",)),
+    Stage("landcover", stage_landcover, ("cache_lookup", "screenshot")),
+    Stage("weather", stage_weather),
+    Stage("weather_outlook", stage_weather_outlook),
+    Stage("competition", stage_competition),
+    Stage(
+        "area_distribution",
+        stage_area_distribution,
+        ("cache_lookup", "center_name", "search_context", "screenshot", "landcover"),
+    ),
+    Stage(
+        "metrics",
+        stage_metrics,
+        ("area_distribution", "weather", "weather_outlook", "catchment", "density", "competition", "screenshot"),
+    ),
+])
+
+
+# Stages surfaced to streaming clients, in the order the UI renders them
+STREAM_EVENTS = ("location_name", "search_context", "area_distribution", "metrics")
+
+
+def _event_payload(name: str, result: Any) -> Dict[str, Any]:
+    if name == "area_distribution":
+        return result.dict()
+    if name == "metrics":
+        return result
+    return {name: result}
+
+
+async def stream_analysis(
+    location: str,
+    business_params: Dict[str, Any],
+    screenshot_metadata: Dict[str, Any],
+    image_bytes: Union[bytes, bytearray],
+    image_base64: Optional[str] = None,
+    image_mime_type: str = "image/png",
+    mode: str = "accurate",
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the same DAG as `run_analysis`, yielding `(event, payload)` as the
+    user-facing stages finish, then a final `("done", ...)` with the cache
+    flag and timings.
+
+    Closing the generator early cancels every stage still in flight.
+    """
+    timings: Dict[str, Dict[str, float]] = {}
+    cache_hit = False
+    t0 = time.perf_counter()
+    events = analysis_pipeline.stream(
+        location=location,
+        business_params=business_params,
+        screenshot_metadata=screenshot_metadata,
+        image_bytes=image_bytes,
+        image_base64=image_base64,
+        image_mime_type=image_mime_type,
+        mode=mode,
+    )
+    async with aclosing(events):
+        async for event in events:
+            timings[event.name] = {
+                "start_ms": round(event.start_ms, 1),
+                "duration_ms": round(event.duration_ms, 1),
+            }
+            if event.name == "cache_lookup":
+                cache_hit = event.result["entry"] is not None
+            if event.name in STREAM_EVENTS:
+                yield event.name, _event_payload(event.name, event.result)
+
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    yield "done", {"cache_hit": cache_hit, "timings": timings}
+
+
+async def run_analysis(
+    location: str,
+    business_params: Dict[str, Any],
+    screenshot_metadata: Dict[str, Any],
+    image_bytes: Union[bytes, bytearray],
+    image_base64: Optional[str] = None,
+    image_mime_type: str = "image/png",
+    mode: str = "accurate",
+) -> Dict[str, Any]:
+    """
+    Run the full analysis DAG and shape the result like the /analyze response.
+
+    `image_bytes` is the decoded screenshot (hashed for the cache key);
+    `image_base64`, when the client already sent it, is forwarded to Gemini
+    without re-encoding. `mode="fast"` skips Gemini (and the geocode/search
+    that feed it) in favour of the local land-cover classifier.
+    """
+    run = await analysis_pipeline.run(
+        location=location,
+        business_params=business_params,
+        screenshot_metadata=screenshot_metadata,
+        image_bytes=image_bytes,
+        image_base64=image_base64,
+        image_mime_type=image_mime_type,
+        mode=mode,
+    )
+    return {
+        "location_name": run.results["location_name"],
+        "metrics": run.results["metrics"],
+        "area_distribution": run.results["area_distribution"],
+        "cache_hit": run.results["cache_lookup"]["entry"] is not None,
+        "timings": {**run.timings, "total_ms": run.total_ms},
+    }
@@ -0,0 +1,261 @@
+"""
+Numeric competition figures for a candidate site.
+
+Competitors from `PlacesService` are projected to local metres around the
+site and indexed in one `cKDTree`; everything the score needs is then a few
+tree queries and array reductions, no per-competitor Python:
+
+* `nearestM` - distances to the NEAREST_K closest competitors
+* `rings` - competitor counts and competitors/km2 within RING_METERS
+* `huffShare` - Huff-model expected market share. Demand points on a
+  TRADE_STEP_M grid over the trade area each split their custom between the
+  candidate and their HUFF_NEIGHBOURS nearest competitors in proportion to
+  attractiveness / distance ** COMPETITOR_HUFF_DECAY; the candidate's share
+  is the mean over the grid. Attractiveness is rating x log review count,
+  and the candidate is taken to be a typical (median) competitor.
+
+`share_factor` maps the share onto the 0-1 factor `compute_metrics`
+uses, calibrated so the old "low" / "medium" / "high" estimates fall out of
+a free-standing site, about four equal rivals and about fifty.
+
+Jobs that score many sites (heatmap cells, optimiser candidates) make one
+search over the whole area (`area_field`) and ask the one field for every
+site's share with `CompetitorField.shares_at`.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app.core.config import settings
+from app.core.geo import METERS_PER_DEGREE_LAT
+from app.services.places_service import places_service
+
+NEAREST_K = 5
+RING_METERS = (250, 500, 1000)
+TRADE_STEP_M = 100
+HUFF_NEIGHBOURS = 32
+# Below this a demand point is "at" the shop; keeps 1/d**decay finite
+MIN_DISTANCE_M = 50.0
+# Places reports 0 for unrated places
+DEFAULT_RATING = 3.5
+# Candidate's review count when there are no competitors to take the median of
+DEFAULT_REVIEWS = 100
+# share ** exponent: 1 -> 1.0, 0.2 (four equal rivals) -> 0.62, 0.02 -> 0.31
+FACTOR_EXPONENT = 0.3
+# Sites per tree query in `shares_at`; bounds the (sites x demand points x neighbours) arrays
+SITE_CHUNK = 64
+# Places Nearby Search radius limit
+MAX_SEARCH_RADIUS_M = 50_000
+
+
+def attractiveness(rating: Any, reviews: Any) -> np.ndarray:
+    """Huff attractiveness: rating (1-5) weighted by the log of its review count"""
+    rating = np.asarray(rating, dtype=np.float64)
+    rating = np.clip(np.where(rating > 0, rating, DEFAULT_RATING), 1.0, 5.0)
+    return rating * (1.0 + np.log1p(np.maximum(np.asarray(reviews, dtype=np.float64), 0.0)))
+
+
+def share_factor(share: Any) -> np.ndarray:
+    """0-1 competitor factor for `compute_metrics` from a Huff market share"""
+    return np.clip(np.asarray(share, dtype=np.float64), 0.0, 1.0) ** FACTOR_EXPONENT
+
+
+def _demand_grid(radius_m: float) -> np.ndarray:
+    steps = np.arange(-radius_m, radius_m + TRADE_STEP_M / 2, TRADE_STEP_M)
+    x, y = np.meshgrid(steps, steps)
+    points = np.column_stack([x.ravel(), y.ravel()])
+    return points[np.hypot(points[:, 0], points[:, 1]) <= radius_m]
+
+
+class CompetitorField:
+    """Competitors around one site, in metres east / north of it"""
+
+    def __init__(
+        self,
+        lat: float,
+        lng: float,
+        coords: np.ndarray,
+        rating: np.ndarray,
+        reviews: np.ndarray,
+        radius_m: Optional[float] = None,
+    ):
+        """`coords` is (n, 2) [lat, lng]; see `from_places` for Places results"""
+        self.lat, self.lng = float(lat), float(lng)
+        self.radius_m = float(radius_m or settings.COMPETITOR_RADIUS_M)
+        self.kx = METERS_PER_DEGREE_LAT * math.cos(math.radians(self.lat))
+
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.xy = np.column_stack([
+            (coords[:, 1] - self.lng) * self.kx,
+            (coords[:, 0] - self.lat) * METERS_PER_DEGREE_LAT,
+        ])
+        self.attractiveness = attractiveness(rating, reviews)
+        # Built per site and queried a few hundred times: an unbalanced tree builds ~2x faster
+        self.tree = cKDTree(self.xy, balanced_tree=False, compact_nodes=False) if len(self.xy) else None
+
+        if len(self.xy):
+            self.site_attractiveness = float(np.median(self.attractiveness))
+        else:
+            self.site_attractiveness = float(attractiveness(DEFAULT_RATING, DEFAULT_REVIEWS))
+        self.demand = _demand_grid(self.radius_m)
+        d_site = np.maximum(np.hypot(self.demand[:, 0], self.demand[:, 1]), MIN_DISTANCE_M)
+        self.site_utility = self.site_attractiveness / d_site ** settings.COMPETITOR_HUFF_DECAY
+        self.rival_utility = self._rival_utility()
+
+    @classmethod
+    def from_places(cls, lat: float, lng: float, places: Sequence[Dict[str, Any]], radius_m: Optional[float] = None) -> "CompetitorField":
+        """From `PlacesService` dicts (lat, lng, rating, user_ratings_total); one pass over the list"""
+        rows = np.array(
+            [
+                (p["lat"], p["lng"], p.get("rating") or 0, p.get("user_ratings_total") or 0)
+                for p in places
+                if p.get("lat") is not None and p.get("lng") is not None
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        return cls(lat, lng, rows[:, :2], rows[:, 2], rows[:, 3], radius_m)
+
+    @classmethod
+    def calibrated(cls, share: float, radius_m: Optional[float] = None) -> "CompetitorField":
+        """
+        Site without known competitor positions whose rivals pull in step with
+        it everywhere, sized so the Huff share is `share`
+        """
+        field = cls(0.0, 0.0, np.empty((0, 2)), [], [], radius_m)
+        field.rival_utility = field.site_utility * (1 / min(max(share, 1e-6), 1.0) - 1)
+        return field
+
+    @property
+    def count(self) -> int:
+        return len(self.xy)
+
+    def _rival_utility(self) -> np.ndarray:
+        """Sum of competitor utilities at every demand point, nearest HUFF_NEIGHBOURS only"""
+        if self.tree is None:
+            return np.zeros(len(self.demand))
+        k = min(HUFF_NEIGHBOURS, self.count)
+        dist, idx = self.tree.query(self.demand, k=k)
+        dist, idx = dist.reshape(len(self.demand), k), idx.reshape(len(self.demand), k)
+        utility = self.attractiveness[idx] / np.maximum(dist, MIN_DISTANCE_M) ** settings.COMPETITOR_HUFF_DECAY
+        return utility.sum(axis=1)
+
+    def to_xy(self, lat: Any, lng: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Metres east / north of the site"""
+        return (np.asarray(lng, dtype=np.float64) - self.lng) * self.kx, (np.asarray(lat, dtype=np.float64) - self.lat) * METERS_PER_DEGREE_LAT
+
+    def shares_at(self, x: Any, y: Any) -> np.ndarray:
+        """
+        Huff share the candidate would have standing at metres `x` east / `y`
+        north instead, against the same competitors; one vector per site
+        chunk, like `huff_share` at each site
+        """
+        x, y = np.atleast_1d(np.asarray(x, dtype=np.float64)), np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if self.tree is None:
+            return np.ones(len(x))
+        k = min(HUFF_NEIGHBOURS, self.count)
+        shares = np.empty(len(x))
+        for lo in range(0, len(x), SITE_CHUNK):
+            sites = np.column_stack([x[lo:lo + SITE_CHUNK], y[lo:lo + SITE_CHUNK]])
+            points = (sites[:, None, :] + self.demand[None, :, :]).reshape(-1, 2)
+            dist, idx = self.tree.query(points, k=k)
+            utility = self.attractiveness[idx] / np.maximum(dist, MIN_DISTANCE_M) ** settings.COMPETITOR_HUFF_DECAY
+            rivals = utility.reshape(len(sites), len(self.demand), -1).sum(axis=2)
+            shares[lo:lo + SITE_CHUNK] = (self.site_utility / (self.site_utility + rivals)).mean(axis=1)
+        return shares
+
+    def factors_at(self, lat: Any, lng: Any) -> np.ndarray:
+        """`share_factor` of `shares_at` for sites given in degrees"""
+        return share_factor(self.shares_at(*self.to_xy(lat, lng)))
+
+    def utility_at(self, x: np.ndarray, y: np.ndarray, attractiveness: np.ndarray) -> np.ndarray:
+        """(n, demand points) utilities of rivals at metres `x` east / `y` north of the site"""
+        dist = np.hypot(self.demand[:, 0] - np.asarray(x)[:, None], self.demand[:, 1] - np.asarray(y)[:, None])
+        return np.asarray(attractiveness)[:, None] / np.maximum(dist, MIN_DISTANCE_M) ** settings.COMPETITOR_HUFF_DECAY
+
+    def huff_share(self, extra_utility: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Candidate's expected share over the demand grid; `extra_utility`
+        (..., demand points) adds hypothetical rivals and broadcasts.
+        """
+        rivals = self.rival_utility if extra_utility is None else self.rival_utility + extra_utility
+        return (self.site_utility / (self.site_utility + rivals)).mean(axis=-1)
+
+    def summary(self) -> Dict[str, Any]:
+        nearest: List[float] = []
+        counts = np.zeros(len(RING_METERS), dtype=np.int64)
+        if self.tree is not None:
+            dist, _ = self.tree.query((0.0, 0.0), k=min(NEAREST_K, self.count))
+            nearest = [round(float(d)) for d in np.atleast_1d(dist)]
+            counts = self.tree.query_ball_point(np.zeros((len(RING_METERS), 2)), r=RING_METERS, return_length=True)
+
+        share = float(self.huff_share())
+        in_radius = int(np.count_nonzero(np.hypot(self.xy[:, 0], self.xy[:, 1]) <= self.radius_m))
+        return {
+            "count": self.count,
+            "nearestM": nearest,
+            "rings": [
+                {
+                    "radiusM": r,
+                    "count": int(c),
+                    "perSqKm": round(int(c) / (math.pi * (r / 1000) ** 2), 2),
+                }
+                for r, c in zip(RING_METERS, counts)
+            ],
+            "huffShare": round(share, 4),
+            # What an equal split with every competitor in the trade area would give
+            "fairShare": round(1 / (in_radius + 1), 4),
+            "factor": round(float(share_factor(share)), 4),
+        }
+
+
+async def nearby_competitors(lat: float, lng: float, radius_m: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Places competitors within `radius_m` (default COMPETITOR_RADIUS_M); None
+    when there is no real data to go on
+    """
+    if not settings.GOOGLE_MAPS_API_KEY:
+        return None  # the keyless demo competitors are random
+    radius = min(math.ceil(radius_m or settings.COMPETITOR_RADIUS_M), MAX_SEARCH_RADIUS_M)
+    try:
+        places = await places_service.search_nearby(
+            lat, lng, radius, settings.COMPETITOR_KEYWORD, limit=settings.COMPETITOR_SEARCH_LIMIT
+        )
+    except Exception as e:
+        print(f"Competitor search failed: {e}")
+        return None
+    if any(str(p.get("id", "")).startswith("dummy_") for p in places):
+        return None  # Places API error fallback, not real competitors
+    return places
+
+
+async def area_field(lat: float, lng: float, radius_m: float) -> Optional[CompetitorField]:
+    """
+    One field for every site within `radius_m` of (lat, lng): a single search
+    reaching COMPETITOR_RADIUS_M past that radius, so each site's trade area
+    is covered. None without real competitor data.
+    """
+    places = await nearby_competitors(lat, lng, radius_m + settings.COMPETITOR_RADIUS_M)
+    return None if places is None else CompetitorField.from_places(lat, lng, places)
+
+
+def site_competition(lat: float, lng: float, places: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """`CompetitorField.summary` for one site plus the time it took"""
+    start = time.perf_counter()
+    summary = CompetitorField.from_places(lat, lng, places).summary()
+    summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return summary
+
+
+def format_competition(competition: Optional[Dict[str, Any]]) -> str:
+    """One-line summary for prompts"""
+    if not competition:
+        return ""
+    rings = ", ".join(f"{r['count']} within {r['radiusM']} m" for r in competition["rings"])
+    nearest = f"nearest {competition['nearestM'][0]} m" if competition["nearestM"] else "none nearby"
+    return (
+        f"{competition['count']} competitors ({rings}; {nearest}); "
+        f"expected Huff market share {competition['huffShare']:.0%} vs {competition['fairShare']:.0%} equal split"
+    )
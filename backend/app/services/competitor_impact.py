@@ -0,0 +1,235 @@
+"""
+Deterministic what-if for hypothetical competitors.
+
+Each hypothetical (brand type, distance, bearing) joins the site's Huff model
+(`competitor_analytics.CompetitorField`) as one more rival. The drop in the
+candidate's expected share scales the visitor rate, the new share sets the
+competitor factor, and the baseline plus every hypothetical go through
+`compute_metrics` as one batch: a (hypotheticals x demand points) utility
+matrix and one metrics pass, whatever the batch size. Same inputs, same
+numbers; the LLM at most narrates the table afterwards.
+
+The site's existing competitors come from Places around `lat`/`lng`, then
+from the context's own competitor list, and otherwise from a field
+calibrated to the stored share (or competitor factor) with no positions.
+
+`legacy_competitor_impact` answers the old single `{brand_type, distance}`
+request, whose clients send only `current_data.competitor_density`, in the
+old response keys.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.exceptions import ValidationError
+from app.services.competitor_analytics import (
+    FACTOR_EXPONENT,
+    CompetitorField,
+    attractiveness,
+    nearby_competitors,
+    share_factor,
+)
+from app.services.metrics_engine import (
+    COMPETITOR_FACTORS,
+    GLOBAL_AVERAGE_DENSITY,
+    VISITOR_RATE,
+    competitor_factor,
+    compute_metrics,
+    screenshot_area,
+)
+from app.services.traffic_probability import DEFAULT_JUNCTIONS, business_traffic_hours, probabilistic_traffic
+
+# Typical Places (rating, review count) per brand type
+BRAND_PROFILES = {
+    "independent": (4.0, 50),
+    "local_chain": (4.2, 300),
+    "national_chain": (4.4, 1500),
+    "flagship": (4.6, 5000),
+}
+MAX_BATCH = 500
+
+
+def legacy_competitor(new_competitor: Dict[str, Any]) -> Dict[str, Any]:
+    """The old single `{brand_type, distance}` payload as one hypothetical"""
+    brand = str(new_competitor.get("brand_type") or "").strip().lower().replace(" ", "_")
+    return {
+        "type": brand if brand in BRAND_PROFILES else "local_chain",
+        "distance_m": float(new_competitor.get("distance") or 0),
+        "bearing_deg": float(new_competitor.get("bearing") or 0),
+    }
+
+
+def _hypotheticals(competitors: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(x, y, attractiveness) arrays for the batch"""
+    if not competitors:
+        raise ValidationError("At least one hypothetical competitor is required")
+    if len(competitors) > MAX_BATCH:
+        raise ValidationError(f"At most {MAX_BATCH} hypothetical competitors per request")
+    unknown = sorted({c.get("type") for c in competitors} - BRAND_PROFILES.keys(), key=str)
+    if unknown:
+        raise ValidationError(f"Unknown competitor type(s) {unknown}; expected one of {sorted(BRAND_PROFILES)}")
+
+    distance = np.array([float(c["distance_m"]) for c in competitors])
+    bearing = np.radians([float(c.get("bearing_deg") or 0) for c in competitors])
+    rating = [c.get("rating") or BRAND_PROFILES[c["type"]][0] for c in competitors]
+    reviews = [BRAND_PROFILES[c["type"]][1] if c.get("reviews") is None else c["reviews"] for c in competitors]
+    # Bearing clockwise from north
+    return distance * np.sin(bearing), distance * np.cos(bearing), attractiveness(rating, reviews)
+
+
+def baseline_inputs(current_data: Dict[str, Any]) -> Dict[str, Any]:
+    """`compute_metrics` arguments that reproduce the analysed site's stored metrics"""
+    params = current_data.get("business_params") or {}
+    area = current_data.get("area_distribution") or {}
+    metrics = current_data.get("metrics") or {}
+    area_data = metrics.get("areaData") or {}
+    try:
+        bw, oh, price = (float(params[name]) for name in ("buildingWidth", "operatingHours", "productPrice"))
+        residential, road = float(area["residential"]), float(area["road"])
+        area_sq_m = area_data.get("areaSqM")
+        if area_sq_m is None:
+            _, _, area_sq_m = screenshot_area(current_data["screenshot_metadata"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValidationError(f"current_data needs business_params, area_distribution and metrics.areaData or screenshot_metadata: {e}")
+
+    traffic_hours = metrics.get("trafficHours")
+    if traffic_hours is None:
+        traffic_hours = float(business_traffic_hours(params, residential, road))
+    return {
+        "building_width": bw,
+        "operating_hours": oh,
+        "price": price,
+        "residential": residential,
+        "road": road,
+        "area_sq_m": float(area_sq_m),
+        "population_density": float(area.get("estimated_population_density", GLOBAL_AVERAGE_DENSITY)),
+        "competitor": float(metrics.get("competitorFactor", competitor_factor(area.get("competitor_density_estimate")))),
+        "weather_factor": float(metrics.get("weatherFactor", 1.0)),
+        "traffic_factor": float(metrics.get("trafficFactor", probabilistic_traffic(1.0, DEFAULT_JUNCTIONS))),
+        "traffic_hours": float(traffic_hours),
+        "catchment_sq_m": area_data.get("catchmentSqM"),
+        "cglp_density": float(metrics["cglpDensity"]) if metrics.get("cglpDensity") is not None else None,
+    }
+
+
+async def site_field(current_data: Dict[str, Any], lat: Optional[float], lng: Optional[float]) -> Tuple[CompetitorField, str]:
+    """The site's existing competition and where it came from"""
+    if lat is not None and lng is not None:
+        places = await nearby_competitors(lat, lng)
+        if places is not None:
+            return CompetitorField.from_places(lat, lng, places), "places"
+        known = [c for c in current_data.get("competitors") or [] if c.get("lat") is not None and c.get("lng") is not None]
+        if known:
+            return CompetitorField.from_places(lat, lng, known), "context"
+
+    metrics = current_data.get("metrics") or {}
+    share = (metrics.get("competition") or {}).get("huffShare")
+    if share is None:
+        # Old clients send the categorical estimate as `competitor_density`
+        estimate = (current_data.get("area_distribution") or {}).get("competitor_density_estimate") or current_data.get("competitor_density")
+        factor = metrics.get("competitorFactor", competitor_factor(estimate))
+        share = float(factor) ** (1 / FACTOR_EXPONENT)
+    return CompetitorField.calibrated(float(share)), "calibrated"
+
+
+def simulate_impact(field: CompetitorField, inputs: Dict[str, Any], competitors: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Baseline and every hypothetical in one Huff pass and one `compute_metrics` pass"""
+    x, y, attract = _hypotheticals(competitors)
+    base_share = float(field.huff_share())
+    shares = field.huff_share(field.utility_at(x, y, attract))  # (n,)
+
+    # Row 0 is the baseline; revenue follows the share, the score's competition term follows the factor
+    share = np.concatenate(([base_share], shares))
+    ratio = share / base_share if base_share > 0 else np.ones_like(share)
+    competitor = inputs["competitor"] * share_factor(share) / max(float(share_factor(base_share)), 1e-9)
+    kwargs = {k: v for k, v in inputs.items() if v is not None and k != "competitor"}
+    m = compute_metrics(**kwargs, competitor=competitor, visitor_rate=VISITOR_RATE * ratio)
+
+    revenue, score, risk = m["monthlyRevenue"], m["locationScore"], m["riskScore"]
+    results = []
+    for i, c in enumerate(competitors, start=1):
+        results.append({
+            "type": c["type"],
+            "distanceM": float(c["distance_m"]),
+            "bearingDeg": float(c.get("bearing_deg") or 0),
+            "huffShare": round(float(share[i]), 4),
+            "marketShareLossPct": round((1 - float(ratio[i])) * 100, 2),
+            "competitorFactor": round(float(competitor[i]), 4),
+            "monthlyRevenue": round(float(revenue[i])),
+            "revenueDelta": round(float(revenue[i] - revenue[0])),
+            "revenueDeltaPct": round(float((revenue[i] / revenue[0] - 1) * 100), 2) if revenue[0] > 0 else 0.0,
+            "locationScore": round(float(score[i]), 2),
+            "scoreDelta": round(float(score[i] - score[0]), 2),
+            "riskScore": round(float(risk[i]), 3),
+            "riskDelta": round(float(risk[i] - risk[0]), 3),
+        })
+    return {
+        "baseline": {
+            "huffShare": round(base_share, 4),
+            "competitorFactor": round(float(competitor[0]), 4),
+            "monthlyRevenue": round(float(revenue[0])),
+            "locationScore": round(float(score[0]), 2),
+            "riskScore": round(float(risk[0]), 3),
+            "competitors": field.count,
+        },
+        "results": results,
+    }
+
+
+async def simulate_competitor_impact(
+    current_data: Dict[str, Any],
+    competitors: List[Dict[str, Any]],
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+) -> Dict[str, Any]:
+    inputs = baseline_inputs(current_data)
+    field, source = await site_field(current_data, lat, lng)
+    start = time.perf_counter()
+    result = simulate_impact(field, inputs, competitors)
+    result["baseline"]["source"] = source
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def density_label(factor: float) -> str:
+    """Nearest of the categorical "low" / "medium" / "high" estimates"""
+    return min(COMPETITOR_FACTORS, key=lambda name: abs(COMPETITOR_FACTORS[name] - factor))
+
+
+async def legacy_competitor_impact(current_data: Dict[str, Any], new_competitor: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The old single-competitor response keys, computed like a batch of one.
+    Old clients send only `competitor_density`, so the site is a calibrated
+    field; `new_risk_score` needs the full analysis inputs and is None
+    without them.
+    """
+    competitor = legacy_competitor(new_competitor)
+    field, _ = await site_field(current_data, None, None)
+    try:
+        inputs = baseline_inputs(current_data)
+    except ValidationError:
+        inputs = None
+
+    if inputs is not None:
+        row = simulate_impact(field, inputs, [competitor])["results"][0]
+        before = inputs["competitor"]
+        loss, after, risk = row["marketShareLossPct"], row["competitorFactor"], row["riskScore"]
+    else:
+        x, y, attract = _hypotheticals([competitor])
+        base_share = float(field.huff_share())
+        share = float(field.huff_share(field.utility_at(x, y, attract))[0])
+        before, after = float(share_factor(base_share)), float(share_factor(share))
+        loss = round((1 - share / base_share) * 100, 2) if base_share > 0 else 0.0
+        risk = None
+
+    label = density_label(after)
+    return {
+        "adjusted_competitor_density": label,
+        "estimated_market_share_loss_percentage": loss,
+        "new_risk_score": risk,
+        "impact_summary": (
+            f"A {competitor['type'].replace('_', ' ')} competitor {competitor['distance_m']:.0f} m away takes about "
+            f"{loss:.1f}% of the site's expected market share; competition goes from {density_label(before)} to {label}."
+        ),
+    }
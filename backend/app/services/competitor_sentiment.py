@@ -0,0 +1,279 @@
+"""
+Batched competitor review sentiment.
+
+`FinayaAgent.analyze_competitor_sentiment` sends one reviews blob in one
+call. Here reviews for many places are
+
+1. looked up per place in `sentiment_cache`, keyed on the place id and a hash
+   of its review set, so places whose reviews have not changed cost nothing;
+2. packed in request order into chunks of about SENTIMENT_CHUNK_TOKENS
+   estimated tokens (a place with many reviews spans several chunks);
+3. sent concurrently, at most SENTIMENT_MAX_CONCURRENCY chunks in flight,
+   each answering complaints / strengths / gaps per place id;
+4. reduced deterministically: within a place, phrases are de-duplicated on a
+   normalised form and ranked by how many chunks raised them; across places,
+   by how many places share them, ties by first appearance.
+
+Every chunk reports its estimated and billed tokens, queueing and model
+latency. A place is cached only when all of its chunks succeeded; a failed
+chunk drops nothing but its own partial results.
+"""
+import asyncio
+import json
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import TieredCache, stable_hash
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.services.llm_gateway import get_llm_gateway
+
+# Rough characters per token for review text; avoids a tokenizer round trip
+CHARS_PER_TOKEN = 4
+PLACE_TOP_N = 5
+TOP_N = 10
+# Model answer key -> response key (same names as the single-blob analysis)
+KINDS = {
+    "complaints": "top_complaints",
+    "strengths": "top_strengths",
+    "gaps": "market_gap_opportunities",
+}
+
+sentiment_cache = TieredCache(
+    "competitor_sentiment",
+    max_entries=settings.SENTIMENT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SENTIMENT_CACHE_TTL_SECONDS,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _clean(review: Any) -> str:
+    return " ".join(str(review or "").split())
+
+
+def review_set_key(place_id: str, reviews: List[str]) -> str:
+    """Cache key for one place; review order and whitespace do not matter"""
+    reviews = sorted(r for r in (_clean(r) for r in reviews) if r)
+    return f"{place_id}:{stable_hash(get_llm_gateway().model, reviews)[:24]}"
+
+
+@dataclass
+class _Chunk:
+    index: int
+    places: List[Tuple[str, Optional[str], List[str]]] = field(default_factory=list)
+    tokens: int = 0
+
+    def add(self, place_id: str, name: Optional[str], review: str, tokens: int):
+        if not self.places or self.places[-1][0] != place_id:
+            self.places.append((place_id, name, []))
+        self.places[-1][2].append(review)
+        self.tokens += tokens
+
+    @property
+    def reviews(self) -> int:
+        return sum(len(reviews) for _, _, reviews in self.places)
+
+    def prompt(self) -> str:
+        blocks = []
+        for place_id, name, reviews in self.places:
+            lines = "\n".join(f"- {r}" for r in reviews)
+            blocks.append(f'<place id={json.dumps(place_id)} name={json.dumps(name or "")}>\n{lines}\n</place>')
+        places = "\n\n".join(blocks)
+        return f"""
+        Analyze customer reviews of competing businesses, grouped by place.
+
+        {places}
+
+        Output JSON only, with an entry for every place id above and at most {PLACE_TOP_N} short phrases per list:
+        {{
+          "places": {{
+            "<place id>": {{
+              "complaints": ["string"],
+              "strengths": ["string"],
+              "gaps": ["unmet need a new business could fill"]
+            }}
+          }}
+        }}
+        """
+
+
+def chunk_reviews(places: List[Dict[str, Any]], budget: int) -> List[_Chunk]:
+    """Greedy packing in request order; a single review over `budget` is truncated to it"""
+    chunks: List[_Chunk] = []
+    current = _Chunk(0)
+    for place in places:
+        for review in place["reviews"]:
+            review = _clean(review)
+            if not review:
+                continue
+            tokens = estimate_tokens(review)
+            if tokens > budget:
+                review, tokens = review[:budget * CHARS_PER_TOKEN], budget
+            if current.tokens and current.tokens + tokens > budget:
+                chunks.append(current)
+                current = _Chunk(len(chunks))
+            current.add(place["place_id"], place.get("name"), review, tokens)
+    if current.tokens:
+        chunks.append(current)
+    return chunks
+
+
+async def _run_chunk(chunk: _Chunk, semaphore: asyncio.Semaphore) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(answers per place id, report) for one chunk; errors are reported, not raised"""
+    report = {
+        "index": chunk.index,
+        "places": len(chunk.places),
+        "reviews": chunk.reviews,
+        "estimated_tokens": chunk.tokens,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "queued_ms": 0.0,
+        "latency_ms": 0.0,
+        "error": None,
+    }
+    answers: Dict[str, Any] = {}
+    start = time.perf_counter()
+    async with semaphore:
+        report["queued_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            response = await get_llm_gateway().generate(
+                chunk.prompt(), temperature=0.0, response_mime_type="application/json"
+            )
+            report.update(
+                prompt_tokens=response.prompt_tokens,
+                output_tokens=response.output_tokens,
+                latency_ms=round(response.latency * 1000, 1),
+            )
+            answers = json.loads(response.text).get("places") or {}
+            if not isinstance(answers, dict):
+                raise ValueError("'places' is not an object")
+        except Exception as e:
+            print(f"Sentiment chunk {chunk.index} failed: {e}")
+            report["error"] = str(e)
+            answers = {}
+    return answers, report
+
+
+def _normalise(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def rank_phrases(lists: Iterable[Any], top: int) -> List[Tuple[str, int]]:
+    """
+    (phrase, lists containing it) ranked by that count, ties by first
+    appearance; phrases equal after lower-casing and dropping punctuation
+    are one phrase, shown as first written
+    """
+    counts: Dict[str, int] = {}
+    shown: Dict[str, str] = {}
+    for items in lists:
+        if not isinstance(items, list):
+            continue
+        seen = set()
+        for item in items:
+            if not isinstance(item, str):
+                continue
+            key = _normalise(item)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            counts[key] = counts.get(key, 0) + 1
+            shown.setdefault(key, item.strip())
+    # dicts keep insertion order, so a stable sort leaves ties in first-seen order
+    return [(shown[key], counts[key]) for key in sorted(counts, key=lambda k: -counts[k])[:top]]
+
+
+def _summary(results: Dict[str, Dict[str, Any]], merged: Dict[str, List[Dict[str, Any]]], reviews: int) -> str:
+    analysed = sum(1 for r in results.values() if r["reviews"])
+    parts = [f"{analysed} of {len(results)} places analysed from {reviews} reviews."]
+    for label, key in (("complaint", "top_complaints"), ("strength", "top_strengths"), ("gap", "market_gap_opportunities")):
+        if merged[key]:
+            top = merged[key][0]
+            parts.append(f'Most shared {label}: "{top["text"]}" ({top["places"]} of {analysed} places).')
+    return " ".join(parts)
+
+
+async def analyze_sentiment_batch(places: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    `places` is [{place_id, name, reviews: [str]}]. Returns per-place and
+    merged complaints / strengths / gaps, per-chunk token and latency
+    reports, and cache counts.
+    """
+    start = time.perf_counter()
+    if not places:
+        raise ValidationError("At least one place with reviews is required")
+    if len(places) > settings.SENTIMENT_MAX_PLACES:
+        raise ValidationError(f"At most {settings.SENTIMENT_MAX_PLACES} places per request")
+    ids = [p["place_id"] for p in places]
+    if len(set(ids)) != len(ids):
+        raise ValidationError("Duplicate place_id in request")
+
+    keys = {p["place_id"]: review_set_key(p["place_id"], p["reviews"]) for p in places}
+    cached = await asyncio.gather(*(sentiment_cache.get(keys[pid]) for pid in ids))
+    results: Dict[str, Dict[str, Any]] = {}
+    for place, entry in zip(places, cached):
+        if entry is not None:
+            results[place["place_id"]] = {**entry, "name": place.get("name"), "cached": True, "complete": True}
+
+    pending = [p for p in places if p["place_id"] not in results]
+    chunks = chunk_reviews(pending, settings.SENTIMENT_CHUNK_TOKENS)
+    semaphore = asyncio.Semaphore(settings.SENTIMENT_MAX_CONCURRENCY)
+    compute_start = time.perf_counter()
+    outcomes = await asyncio.gather(*(_run_chunk(chunk, semaphore) for chunk in chunks))
+    if chunks:
+        sentiment_cache.record_compute(time.perf_counter() - compute_start)
+
+    # Chunk answers per place, in chunk order; a place with any failed chunk is incomplete
+    partial: Dict[str, List[Dict[str, Any]]] = {p["place_id"]: [] for p in pending}
+    failed = set()
+    for chunk, (answers, report) in zip(chunks, outcomes):
+        for place_id, _, _ in chunk.places:
+            answer = answers.get(place_id)
+            if report["error"] or not isinstance(answer, dict):
+                failed.add(place_id)
+            else:
+                partial[place_id].append(answer)
+
+    writes = []
+    for place in pending:
+        place_id = place["place_id"]
+        result = {
+            response_key: [text for text, _ in rank_phrases((a.get(kind) for a in partial[place_id]), PLACE_TOP_N)]
+            for kind, response_key in KINDS.items()
+        }
+        result["reviews"] = sum(1 for r in place["reviews"] if _clean(r))
+        complete = place_id not in failed
+        if complete and result["reviews"]:
+            writes.append(sentiment_cache.set(keys[place_id], result))
+        results[place_id] = {**result, "name": place.get("name"), "cached": False, "complete": complete}
+    await asyncio.gather(*writes)
+
+    ordered = {pid: results[pid] for pid in ids}
+    merged = {
+        response_key: [
+            {"text": text, "places": count}
+            for text, count in rank_phrases((r[response_key] for r in ordered.values()), TOP_N)
+        ]
+        for response_key in KINDS.values()
+    }
+    reports = [report for _, report in outcomes]
+    reviews = sum(r["reviews"] for r in ordered.values())
+    return {
+        **merged,
+        "summary_insight": _summary(ordered, merged, reviews),
+        "places": ordered,
+        "chunks": reports,
+        "tokens": {
+            "estimated": sum(r["estimated_tokens"] for r in reports),
+            "prompt": sum(r["prompt_tokens"] for r in reports),
+            "output": sum(r["output_tokens"] for r in reports),
+        },
+        "cache": {"hits": len(places) - len(pending), "misses": len(pending)},
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -0,0 +1,163 @@
+"""
+Gridded population raster for CGLP.
+
+A people-per-cell grid (WorldPop / GHS-POP exported as ESRI GridFloat: a raw
+float32 `.flt` or `.bil` next to its `.hdr`) is opened with `numpy.memmap`,
+so only the pages a query touches are read; a country-scale raster costs
+nothing to open and no RAM up front.
+
+* `density(lat, lng)` - people per km2 of the cell under a point
+* `population(polygon)` - people in the cells whose centres fall inside a
+  [lat, lng] ring, read from the ring's bounding window only
+
+`site_density` wraps both for the analysis: the walking catchment's outline
+when there is one, otherwise the screenshot rectangle.
+"""
+import functools
+import math
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geo import METERS_PER_DEGREE_LAT
+
+Ring = Sequence[Sequence[float]]  # [[lat, lng], ...]
+
+
+def _read_header(path: str) -> Dict[str, str]:
+    with open(path) as f:
+        return {k.lower(): v.strip() for k, v in (line.split(None, 1) for line in f if line.strip())}
+
+
+def _inside(lng: np.ndarray, lat: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    """
+    Even-odd test of the grid `lat` (rows) x `lng` (cols) against `ring`:
+    each row's edge crossings are found once, then counted left of every column.
+    """
+    prev = np.concatenate((ring[-1:], ring[:-1]))
+    y1, x1, y2, x2 = ring[:, 0], ring[:, 1], prev[:, 0], prev[:, 1]
+    dy = np.where(y2 == y1, 1.0, y2 - y1)
+    crosses = (y1 > lat[:, None]) != (y2 > lat[:, None])  # (rows, edges)
+    x = np.where(crosses, x1 + (lat[:, None] - y1) * (x2 - x1) / dy, -np.inf)
+    return (lng[None, :, None] < x[:, None, :]).sum(axis=2) % 2 == 1
+
+
+def ring_area_sq_km(ring: np.ndarray) -> float:
+    """Shoelace area of a [lat, lng] ring in a local equirectangular projection"""
+    kx = math.cos(math.radians(float(ring[:, 0].mean())))
+    nxt = np.concatenate((ring[1:], ring[:1]))
+    cross = ring[:, 1] @ nxt[:, 0] - ring[:, 0] @ nxt[:, 1]
+    return abs(float(cross)) * kx * (METERS_PER_DEGREE_LAT / 1000) ** 2 / 2
+
+
+class DensityRaster:
+    def __init__(self, data: np.ndarray, west: float, north: float, cell_deg: float, nodata: Optional[float] = None):
+        self.data = data
+        self.west = west
+        self.north = north
+        self.cell_deg = cell_deg
+        self.nodata = nodata
+        self.rows, self.cols = data.shape
+
+    @classmethod
+    def load(cls, path: str) -> "DensityRaster":
+        """Open `<name>.flt` / `<name>.bil` with its `<name>.hdr` (ESRI GridFloat, float32)"""
+        header = _read_header(os.path.splitext(path)[0] + ".hdr")
+        rows, cols = int(header["nrows"]), int(header["ncols"])
+        cell = float(header["cellsize"])
+        west = float(header.get("xllcorner") or float(header["xllcenter"]) - cell / 2)
+        south = float(header.get("yllcorner") or float(header["yllcenter"]) - cell / 2)
+        order = "<" if header.get("byteorder", "lsbfirst").lower() in ("lsbfirst", "i") else ">"
+        nodata = float(header["nodata_value"]) if "nodata_value" in header else None
+        data = np.memmap(path, dtype=f"{order}f4", mode="r", shape=(rows, cols))
+        return cls(data, west, south + rows * cell, cell, nodata)
+
+    def cell_area_sq_km(self, lat: float) -> float:
+        side_km = self.cell_deg * METERS_PER_DEGREE_LAT / 1000
+        return side_km * side_km * math.cos(math.radians(lat))
+
+    def _clean(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        bad = ~np.isfinite(values) | (values < 0)
+        if self.nodata is not None:
+            bad |= values == self.nodata
+        return np.where(bad, 0.0, values)
+
+    def _cell(self, lat: float, lng: float):
+        row = int((self.north - lat) // self.cell_deg)
+        col = int((lng - self.west) // self.cell_deg)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def density(self, lat: float, lng: float) -> Optional[float]:
+        """People per km2 in the cell under the point; None outside the raster"""
+        cell = self._cell(lat, lng)
+        if cell is None:
+            return None
+        return float(self._clean(self.data[cell])) / self.cell_area_sq_km(lat)
+
+    def population(self, ring: Ring) -> Optional[float]:
+        """
+        People in the cells whose centres fall inside `ring`. A ring smaller
+        than a cell catches no centre; it gets its area's share of the cell
+        under its centroid instead. None when the ring is off the raster.
+        """
+        ring = np.asarray(ring, dtype=np.float64)
+        r0 = max(int((self.north - ring[:, 0].max()) // self.cell_deg), 0)
+        r1 = min(int((self.north - ring[:, 0].min()) // self.cell_deg) + 1, self.rows)
+        c0 = max(int((ring[:, 1].min() - self.west) // self.cell_deg), 0)
+        c1 = min(int((ring[:, 1].max() - self.west) // self.cell_deg) + 1, self.cols)
+        if r0 >= r1 or c0 >= c1:
+            return None
+
+        lat = self.north - (np.arange(r0, r1) + 0.5) * self.cell_deg
+        lng = self.west + (np.arange(c0, c1) + 0.5) * self.cell_deg
+        mask = _inside(lng, lat, ring)
+        if mask.any():
+            return float(self._clean(self.data[r0:r1, c0:c1])[mask].sum())
+
+        density = self.density(float(ring[:, 0].mean()), float(ring[:, 1].mean()))
+        return None if density is None else density * ring_area_sq_km(ring)
+
+
+@functools.lru_cache(maxsize=1)
+def get_density_raster() -> Optional[DensityRaster]:
+    """The configured raster (memory-mapped, opened once), or None"""
+    if not settings.DENSITY_RASTER_PATH:
+        return None
+    try:
+        return DensityRaster.load(settings.DENSITY_RASTER_PATH)
+    except Exception as e:
+        print(f"Density raster load failed ({settings.DENSITY_RASTER_PATH}): {e}")
+        return None
+
+
+def screenshot_ring(center: Dict[str, Any], width_m: float, height_m: float) -> list:
+    """[lat, lng] corners of a north-up screenshot around its centre"""
+    lat, lng = float(center["lat"]), float(center["lng"])
+    d_lat = height_m / 2 / METERS_PER_DEGREE_LAT
+    d_lng = width_m / 2 / (METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+    return [[lat - d_lat, lng - d_lng], [lat - d_lat, lng + d_lng], [lat + d_lat, lng + d_lng], [lat + d_lat, lng - d_lng]]
+
+
+def site_density(ring: Optional[Ring]) -> Optional[Dict[str, Any]]:
+    """
+    {density (people/km2), population, areaSqKm} over `ring` from the raster;
+    None without a raster, a ring or coverage.
+    """
+    raster = get_density_raster()
+    if raster is None or not ring or len(ring) < 3:
+        return None
+    population = raster.population(ring)
+    area = ring_area_sq_km(np.asarray(ring, dtype=np.float64))
+    if population is None or area <= 0:
+        return None
+    return {
+        "density": round(population / area, 1),
+        "population": round(population),
+        "areaSqKm": round(area, 4),
+        "source": "raster",
+    }
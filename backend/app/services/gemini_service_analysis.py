@@ -1,25 +1,24 @@
 import json
 import re
 import base64
-import httpx
-import google.generativeai as genai
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.core.singleflight import singleflight
 from app.schemas.schemas import AreaDistribution
-from app.services.traffic_probability import probabilistic_traffic
-from app.services.weather_probability import apply_weather_to_apt
-
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-NOMINATIM_BASE_URL = "https://nominatim.openstreetmap.org/reverse"
-
-GLOBAL_AVERAGE_DENSITY = 4000
-AVG_ROAD_WIDTH = 30
-VISITOR_RATE = 0.1
-PURCHASE_RATE = 90
-ERROR_ADJUSTMENT = 1.305
+from app.services.geocoder import local_place_name, nominatim_name
+from app.services.llm_gateway import get_llm_gateway, image_part
+from app.services.metrics_engine import (
+    GLOBAL_AVERAGE_DENSITY,
+    VISITOR_RATE,
+    competitor_factor,
+    compute_metrics,
+    screenshot_area,
+)
+from app.services.road_graph import site_traffic
+from app.services.traffic_probability import business_traffic_hours
+from app.services.weather_probability import apply_weather_to_apt, get_weather
 
 
 # JSON EXTRACT
@@ -31,30 +30,13 @@ def extract_json(text: str) -> dict:
     return json.loads(match.group())
 
 # REVERSE GEOCODE
+@singleflight("reverse_geocode", key=lambda lat, lon: (round(float(lat), 6), round(float(lon), 6)))
 async def reverse_geocode(lat: float, lon: float) -> str:
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            res = await client.get(
-                NOMINATIM_BASE_URL,
-                params={
-                    "format": "json",
-                    "lat": lat,
-                    "lon": lon,
-                    "zoom": 16,
-                    "addressdetails": 1,
-                },
-                headers={"User-Agent": "Finaya/1.0"},
-            )
-
-            data = res.json()
-
-            if data and "display_name" in data:
-                return data["display_name"].split(",")[0]
-
-            return f"{lat}, {lon}"
-
-    except Exception:
-        return f"{lat}, {lon}"
+    """Local gazetteer name first; Nominatim only without one or with NOMINATIM_ENRICH"""
+    local = local_place_name(lat, lon)
+    if local and not settings.NOMINATIM_ENRICH:
+        return local
+    return await nominatim_name(lat, lon) or local or f"{lat}, {lon}"
 
 # GEMINI VISION WITH SEARCH AUGMENTATION
 async def _web_search_density(location_name: str) -> str:
@@ -72,18 +54,28 @@ async def analyze_location_image(
     image_base64: str,
     image_metadata: Dict[str, Any],
 ) -> AreaDistribution:
-
-    # 1. Get Location Context
-    try:
-        center_lat = image_metadata.get('center', {}).get('lat')
-        center_lng = image_metadata.get('center', {}).get('lng')
-        location_name = await reverse_geocode(center_lat, center_lng)
-    except:
-        location_name = "Unknown Location"
-
-    # 2. Search for Ground Truth Data (RAG)
-    search_context = await _web_search_density(location_name)
-
+    """Cached geocode -> density search -> Gemini chain, see analysis_pipeline"""
+    from app.services.analysis_pipeline import analysis_pipeline
+    run = await analysis_pipeline.run(
+        targets=["area_distribution"],
+        image_bytes=base64.b64decode(image_base64),
+        image_base64=image_base64,
+        screenshot_metadata=image_metadata,
+    )
+    return run.results["area_distribution"]
+
+async def analyze_with_gemini(
+    image: Union[bytes, bytearray, str],
+    location_name: str,
+    search_context: str,
+    mime_type: str = "image/png",
+    fallback: Optional[AreaDistribution] = None,
+) -> AreaDistribution:
+    """
+    `image` is raw bytes or an already base64-encoded string. When Gemini
+    fails, `fallback` (e.g. the local land-cover estimate) is returned instead
+    of the fixed 50/20/30 split.
+    """
     prompt = f"""
     You are an urban planner and business analyst.
     
@@ -103,30 +95,13 @@ async def analyze_location_image(
     }}
     """
 
-    # 3. Analyze with Gemini (New V1 SDK)
+    # Analyze with Gemini (shared async gateway)
     try:
-        image_bytes = base64.b64decode(image_base64)
-        
-        # Initialize the new GenAI client
-        from google import genai
-        from google.genai import types
-        
-        client = genai.Client(api_key=settings.GEMINI_API_KEY)
-
-        # Structure the multipart content correctly for the new SDK
-        response = client.models.generate_content(
-            model=settings.GEMINI_MODEL,
-            contents=[
-                prompt,
-                types.Part.from_bytes(data=image_bytes, mime_type="image/png")
-            ],
-            config=types.GenerateContentConfig(
-                temperature=0.1,
-                max_output_tokens=1024
-            )
+        response = await get_llm_gateway().generate(
+            [prompt, image_part(image, mime_type)],
+            temperature=0.1,
+            max_output_tokens=1024,
         )
-
-        # The new SDK response typically has .text directly accessible
         full_text = response.text
 
         data = extract_json(full_text)
@@ -142,6 +117,10 @@ async def analyze_location_image(
 
     except Exception as e:
         print(f"Gemini Analysis Failed: {e}")
+        if fallback is not None:
+            return fallback.model_copy(update={
+                "reasoning": f"Fallback: AI Analysis Failed - {str(e)}. {fallback.reasoning}"
+            })
         # Fallback if Gemini fails completely
         return AreaDistribution(
             residential=50,
@@ -156,76 +135,65 @@ async def calculate_business_metrics(
     area_distribution: AreaDistribution,
     business_params: Dict[str, Any],
     screenshot_metadata: Dict[str, Any],
+    weather: Optional[str] = None,
+    weather_outlook: Optional[Dict[str, Any]] = None,
+    catchment: Optional[Dict[str, Any]] = None,
+    density: Optional[Dict[str, Any]] = None,
+    competition: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-
+    """
+    Single-scenario view over `metrics_engine.compute_metrics`.
+
+    With a `weather_outlook` (see `get_weather_outlook`) the forecast multiplier
+    over the operating window replaces the single current-weather factor.
+    With a `catchment` (see `get_catchment`) CGLP / POPS cover the walking
+    isochrone instead of the screenshot rectangle, and with a `density` (see
+    `site_density`) the raster's people/km2 replaces GLOBAL_AVERAGE_DENSITY.
+    With a `competition` (see `site_competition`) the Huff market share of the
+    surrounding Places competitors replaces Gemini's low/medium/high guess.
+    """
     try:
         bw = float(business_params["buildingWidth"])
         oh = float(business_params["operatingHours"])
         price = float(business_params["productPrice"])
 
-        scale = screenshot_metadata["scale"] * ERROR_ADJUSTMENT
-        width_m = screenshot_metadata["width"] * scale
-        height_m = screenshot_metadata["height"] * scale
-
-        area_sq_m = width_m * height_m
-        area_sq_km = area_sq_m / 1_000_000
-
-        residential = area_distribution.residential
-        road = area_distribution.road
-
-        cglp = GLOBAL_AVERAGE_DENSITY * area_sq_km
-        pops = cglp * (residential / 100)
-
-        road_area = area_sq_m * (road / 100)
-        pdr = pops / road_area
-
-        apc = bw * AVG_ROAD_WIDTH * pdr
-        apt = apc * oh * 3600
-
-        # Weather effect (Real-time)
-        center_coords = screenshot_metadata.get('center', {})
-        apt, weather = apply_weather_to_apt(apt, lat=center_coords.get('lat'), lng=center_coords.get('lng'))
+        width_m, height_m, area_sq_m = screenshot_area(screenshot_metadata)
 
-        # Traffic probability
-        apt = probabilistic_traffic(apt, ["B", "P", "B"])
+        # Weather effect (Real-time, unless the caller already fetched it)
+        center_coords = screenshot_metadata.get('center') or {}
+        if weather is None:
+            weather = await get_weather(center_coords.get('lat'), center_coords.get('lng'))
+        weather_factor, weather = apply_weather_to_apt(1.0, weather=weather)
+        if weather_outlook is not None:
+            weather_factor = weather_outlook["factor"]
 
-        visitors = apt * (VISITOR_RATE / 100)
-        buyers = visitors * (PURCHASE_RATE / 100)
-
-        daily_rev = buyers * price
-        monthly_rev = daily_rev * 30
-        yearly_rev = daily_rev * 365
-
-        # SCORING (More realistic formula)
-        competitor_map = {"low": 1.0, "medium": 0.6, "high": 0.3}
-        competitor_factor = competitor_map.get(
-            area_distribution.competitor_density_estimate, 0.5
-        )
-
-        # Dampen profitability score.
-        # Assuming 100M IDR monthly revenue is "Very High" (Score ~9) for a small business
-        # Logarithmic scale helps dampen massive linear numbers
-        import math
-        if monthly_rev > 0:
-            profit_score = 3.5 * math.log10(monthly_rev / 1_000_000 + 1) # +1 to avoid log(0)
-            profit_score = min(profit_score, 9.5) # Hard cap at 9.5
+        cglp_density = density["density"] if density else GLOBAL_AVERAGE_DENSITY
+        if competition:
+            competitor = competition["factor"]
         else:
-            profit_score = 0
-
-        # Density factor: 20,000 p/km2 is very dense (Jakarta slump/high rise) -> score 10
-        density_factor = min(area_distribution.estimated_population_density / 2000, 10)
-
-        # Final Weighted Score
-        # Profitability (50%), Density (30%), Competitors (20%)
-        raw_score = (0.5 * profit_score) + (0.3 * density_factor) + (0.2 * competitor_factor * 10)
-        
-        # Penalize slightly if transaction count is very low (e.g. < 20/day) to reflect "niche" risk
-        if buyers < 20:
-            raw_score *= 0.85
-
-        final_score = min(max(raw_score, 1.0), 9.5) # Never 10/10, cap at 9.5
-
-        risk = 1 - (final_score / 12) # Simplified risk metric inversely prop to score
+            competitor = competitor_factor(area_distribution.competitor_density_estimate)
+
+        # Traffic probability along the site's approach paths (default chain without a road graph)
+        traffic_factor, junctions = site_traffic(center_coords.get('lat'), center_coords.get('lng'))
+        # Hourly profile over the opening window instead of a flat operatingHours * 3600
+        traffic_hours = float(business_traffic_hours(business_params, area_distribution.residential, area_distribution.road))
+
+        m = {
+            name: float(value)
+            for name, value in compute_metrics(
+                bw, oh, price,
+                residential=area_distribution.residential,
+                road=area_distribution.road,
+                area_sq_m=area_sq_m,
+                population_density=area_distribution.estimated_population_density,
+                competitor=competitor,
+                weather_factor=weather_factor,
+                traffic_factor=traffic_factor,
+                traffic_hours=traffic_hours,
+                catchment_sq_m=catchment["areaSqM"] if catchment else None,
+                cglp_density=cglp_density,
+            ).items()
+        }
 
         # Determine Confidence Level
         # Based on how much fallback data we used. 
@@ -239,24 +207,35 @@ async def calculate_business_metrics(
         assumptions = f"Assumes average transaction value of {price:,.0f} with a standard visitor conversion rate of {VISITOR_RATE}% from passing traffic."
 
         return {
-            "monthlyRevenue": round(monthly_rev),
-            "yearlyRevenue": round(yearly_rev),
-            "dailyRevenue": round(daily_rev),
-            "tppd": round(buyers),  # Total Purchases Per Day
-            "cglp": round(cglp),    # CGLP Population density
-            "pops": round(pops),    # Residential Population
-            "apt": round(apt),      # Adjusted Passing Traffic
-            "pdr": round(pdr, 4),   # Population Density Ratio
+            "monthlyRevenue": round(m["monthlyRevenue"]),
+            "yearlyRevenue": round(m["yearlyRevenue"]),
+            "dailyRevenue": round(m["dailyRevenue"]),
+            "tppd": round(m["buyers"]),  # Total Purchases Per Day
+            "cglp": round(m["cglp"]),    # CGLP Population density
+            "pops": round(m["pops"]),    # Residential Population
+            "apt": round(m["apt"]),      # Adjusted Passing Traffic
+            "pdr": round(m["pdr"], 4),   # Population Density Ratio
+            "trafficHours": round(traffic_hours, 2),
+            "trafficFactor": round(traffic_factor, 4),
+            "junctions": junctions,
             "weatherUsed": weather,
-            "locationScore": round(final_score, 2),
-            "riskScore": round(risk, 3),
+            "weatherFactor": round(weather_factor, 4),
+            "weatherForecast": weather_outlook,
+            "catchment": catchment,
+            "cglpDensity": cglp_density,
+            "density": density,
+            "competitorFactor": competitor,
+            "competition": competition,
+            "locationScore": round(m["locationScore"], 2),
+            "riskScore": round(m["riskScore"], 3),
             "confidenceLevel": confidence,
             "assumptions": assumptions,
             "areaData": {
-                "areaSqKm": area_sq_km,
+                "areaSqKm": area_sq_m / 1_000_000,
                 "areaSqM": area_sq_m,
                 "widthM": width_m,
-                "heightM": height_m
+                "heightM": height_m,
+                "catchmentSqM": catchment["areaSqM"] if catchment else None,
             }
         }
 
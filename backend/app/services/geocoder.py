@@ -0,0 +1,189 @@
+"""
+Offline reverse geocoding over a local gazetteer.
+
+A GeoNames-style TSV (`cities500.txt`, `ID.txt`, ...: id, name, asciiname,
+alternatenames, lat, lng, feature class, feature code, country, ...,
+population, ...) is loaded once into flat arrays - coordinates, population,
+country codes and all names as one UTF-8 blob with offsets - and a
+`cKDTree` over unit-sphere coordinates, so a lookup is a single tree query
+with no Python objects per place.
+
+Nominatim stays available as an optional enrichment for street-level names
+(`NOMINATIM_ENRICH`), through one pooled client paced to its 1 req/s policy.
+"""
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app.core.config import settings
+from app.core.geo import EARTH_RADIUS_M
+
+NOMINATIM_BASE_URL = "https://nominatim.openstreetmap.org/reverse"
+
+# GeoNames column indices
+_NAME, _LAT, _LNG, _CLASS, _COUNTRY, _POPULATION = 1, 4, 5, 6, 8, 14
+# Populated places (cities, towns, villages, city sections); "A" would add admin areas
+FEATURE_CLASSES = ("P",)
+
+
+def _unit_vectors(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+class Gazetteer:
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lng: np.ndarray,
+        names: bytes,
+        offsets: np.ndarray,
+        country: np.ndarray,
+        population: np.ndarray,
+    ):
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lng = np.asarray(lng, dtype=np.float32)
+        self.names = names
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.country = np.asarray(country, dtype="S2")
+        self.population = np.asarray(population, dtype=np.int64)
+        self.tree = cKDTree(_unit_vectors(self.lat, self.lng))
+        self.load_seconds = 0.0
+
+    @property
+    def places(self) -> int:
+        return len(self.lat)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Arrays plus the tree's own copy of the points and its index"""
+        arrays = sum(a.nbytes for a in (self.lat, self.lng, self.offsets, self.country, self.population))
+        return arrays + len(self.names) + self.tree.data.nbytes + self.tree.indices.nbytes
+
+    @classmethod
+    def load(cls, path: str, feature_classes: Sequence[str] = FEATURE_CLASSES) -> "Gazetteer":
+        start = time.perf_counter()
+        lat: List[float] = []
+        lng: List[float] = []
+        names: List[bytes] = []
+        country: List[bytes] = []
+        population: List[int] = []
+        with open(path, "rb") as f:
+            for line in f:
+                cols = line.rstrip(b"\n").split(b"\t")
+                if len(cols) <= _POPULATION or cols[_CLASS].decode() not in feature_classes:
+                    continue
+                lat.append(float(cols[_LAT]))
+                lng.append(float(cols[_LNG]))
+                names.append(cols[_NAME])
+                country.append(cols[_COUNTRY])
+                population.append(int(cols[_POPULATION] or 0))
+
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(n) for n in names], out=offsets[1:])
+        gazetteer = cls(np.array(lat), np.array(lng), b"".join(names), offsets, np.array(country, dtype="S2"), np.array(population))
+        gazetteer.load_seconds = time.perf_counter() - start
+        return gazetteer
+
+    def name(self, i: int) -> str:
+        return self.names[self.offsets[i]:self.offsets[i + 1]].decode("utf-8", "replace")
+
+    def nearest(self, lat: float, lng: float, k: int = 1, max_distance_m: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Up to `k` nearest places, closest first, optionally within `max_distance_m`"""
+        k = min(k, self.places)
+        if k == 0:
+            return []
+        # Chord length on the unit sphere; the tree bound is exact for the great-circle limit
+        bound = 2 * math.sin(min(max_distance_m / EARTH_RADIUS_M, math.pi) / 2) if max_distance_m else np.inf
+        phi, lam = math.radians(lat), math.radians(lng)
+        point = (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+        chord, idx = self.tree.query(point, k=k, distance_upper_bound=bound)
+        chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+        return [
+            {
+                "name": self.name(i),
+                "country": self.country[i].decode(),
+                "population": int(self.population[i]),
+                "lat": round(float(self.lat[i]), 6),
+                "lng": round(float(self.lng[i]), 6),
+                "distance_m": round(2 * EARTH_RADIUS_M * math.asin(min(c / 2, 1.0))),
+            }
+            for c, i in zip(chord, idx)
+            if np.isfinite(c)
+        ]
+
+
+# Loaded once at startup (see `load_gazetteer`); None when no gazetteer is configured
+gazetteer: Optional[Gazetteer] = None
+
+
+def load_gazetteer() -> Optional[Gazetteer]:
+    """Blocking load of GAZETTEER_PATH; call from a worker thread"""
+    global gazetteer
+    if gazetteer is None and settings.GAZETTEER_PATH:
+        try:
+            gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+            print(
+                f"Gazetteer loaded: {gazetteer.places} places in {gazetteer.load_seconds:.2f}s, "
+                f"{gazetteer.memory_bytes / 1e6:.1f} MB resident"
+            )
+        except Exception as e:
+            print(f"Gazetteer load failed ({settings.GAZETTEER_PATH}): {e}")
+    return gazetteer
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    return gazetteer
+
+
+def local_place_name(lat: float, lng: float) -> Optional[str]:
+    """Nearest gazetteer place within GAZETTEER_MAX_DISTANCE_M, or None"""
+    if gazetteer is None:
+        return None
+    hits = gazetteer.nearest(float(lat), float(lng), max_distance_m=settings.GAZETTEER_MAX_DISTANCE_M)
+    return hits[0]["name"] if hits else None
+
+
+_client: Optional[httpx.AsyncClient] = None
+_nominatim_lock = asyncio.Lock()
+_nominatim_last = 0.0
+
+
+def get_geocode_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=settings.NOMINATIM_TIMEOUT, headers={"User-Agent": settings.osm_user_agent})
+    return _client
+
+
+async def close_geocode_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+async def nominatim_name(lat: float, lng: float) -> Optional[str]:
+    """Most specific Nominatim name for a point, or None; requests are spaced NOMINATIM_MIN_INTERVAL apart"""
+    global _nominatim_last
+    try:
+        async with _nominatim_lock:
+            wait = _nominatim_last + settings.NOMINATIM_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            _nominatim_last = time.monotonic()
+        res = await get_geocode_client().get(
+            NOMINATIM_BASE_URL,
+            params={"format": "json", "lat": lat, "lon": lng, "zoom": 16, "addressdetails": 1},
+        )
+        data = res.json()
+        if data and "display_name" in data:
+            return data["display_name"].split(",")[0]
+    except Exception:
+        pass
+    return None
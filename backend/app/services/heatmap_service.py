@@ -0,0 +1,224 @@
+"""
+Site-selection heatmap: score a grid of candidate locations.
+
+A bbox is covered with square cells snapped to a global lattice
+(`CellGrid`), so overlapping jobs hit the same per-cell cache entries. Each
+cell's land cover comes from the cache or from server-side map tiles run
+through the local classifier; cells run concurrently under a semaphore and a
+wall-clock budget, nearest-to-center first. Finished cells are flushed every
+`FLUSH_INTERVAL_SECONDS`; metrics for each batch, and for the final surface,
+are one vectorised `compute_metrics` call. Competition comes from one Places
+search over the whole bbox, with a Huff share per cell
+(`CompetitorField.factors_at`), or the "medium" estimate without Places data.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.cache import TieredCache
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.geo import CellGrid, geohash_encode, haversine_m
+from app.schemas.schemas import HeatmapRequest
+from app.services.competitor_analytics import area_field
+from app.services.landcover_classifier import classify_landcover
+from app.services.metrics_engine import GLOBAL_AVERAGE_DENSITY, competitor_factor, compute_metrics
+from app.services.tile_service import get_tile_service
+from app.services.road_graph import site_traffic
+from app.services.traffic_probability import business_traffic_hours
+from app.services.weather_probability import WEATHER_VIC, get_weather
+
+cell_cache = TieredCache(
+    "cell_landcover",
+    max_entries=settings.HEATMAP_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.HEATMAP_CACHE_TTL_SECONDS,
+)
+
+TOP_CELLS = 5
+# Finished cells are flushed (and scored together) at most this often
+FLUSH_INTERVAL_SECONDS = 0.2
+
+
+def validate_business_params(params: Dict[str, Any]):
+    try:
+        for name in ("buildingWidth", "operatingHours", "productPrice"):
+            float(params[name])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValidationError(f"business_params needs numeric buildingWidth, operatingHours and productPrice ({e})")
+
+
+def plan_heatmap(request: HeatmapRequest) -> CellGrid:
+    """
+    Cell grid for the request; raises ValidationError when it exceeds
+    HEATMAP_MAX_CELLS and ExternalServiceError without a tile source
+    """
+    validate_business_params(request.business_params)
+    get_tile_service().require_source()
+
+    b = request.bbox
+    grid = CellGrid.cover(b.south, b.west, b.north, b.east, request.cell_size_m)
+    if grid.size > settings.HEATMAP_MAX_CELLS:
+        raise ValidationError(
+            f"Grid of {grid.rows}x{grid.cols} cells exceeds the {settings.HEATMAP_MAX_CELLS}-cell limit; "
+            "use a smaller bbox or a larger cell_size_m"
+        )
+    return grid
+
+
+async def cell_landcover(grid: CellGrid, row: int, col: int) -> Tuple[Dict[str, Any], bool]:
+    """Land-cover shares of one cell and whether they came from cache"""
+    tiles = get_tile_service()
+    key = f"{grid.key(row, col)}:z{tiles.max_zoom}"
+
+    async def compute() -> Dict[str, Any]:
+        lat, lng = grid.center(row, col)
+        image = await tiles.render_area(lat, lng, grid.cell_m)
+        estimate = await asyncio.to_thread(classify_landcover, image)
+        return estimate.as_dict()
+
+    return await cell_cache.get_or_compute(key, compute)
+
+
+def score_cells(cells: List[Dict[str, Any]], business_params: Dict[str, Any], area_sq_m: float, weather_factor: float) -> Dict[str, np.ndarray]:
+    """Vectorised metrics for cells carrying `landcover` shares"""
+    residential = np.array([c["landcover"]["residential"] for c in cells], dtype=np.float64)
+    road = np.array([c["landcover"]["road"] for c in cells], dtype=np.float64)
+    return compute_metrics(
+        float(business_params["buildingWidth"]),
+        float(business_params["operatingHours"]),
+        float(business_params["productPrice"]),
+        residential=residential,
+        road=road,
+        area_sq_m=area_sq_m,
+        population_density=GLOBAL_AVERAGE_DENSITY,
+        competitor=np.array([c["competitor"] for c in cells], dtype=np.float64),
+        weather_factor=weather_factor,
+        traffic_factor=np.array([site_traffic(c["lat"], c["lng"])[0] for c in cells]),
+        traffic_hours=business_traffic_hours(business_params, residential, road),
+    )
+
+
+def _cell_payload(cell: Dict[str, Any], metrics: Dict[str, np.ndarray], i: int) -> Dict[str, Any]:
+    lc = cell["landcover"]
+    return {
+        "row": cell["row"],
+        "col": cell["col"],
+        "lat": round(cell["lat"], 6),
+        "lng": round(cell["lng"], 6),
+        "geohash": cell["geohash"],
+        "cached": cell["cached"],
+        "areaDistribution": {"residential": lc["residential"], "road": lc["road"], "openSpace": lc["openSpace"]},
+        "competitorFactor": round(cell["competitor"], 4),
+        "monthlyRevenue": round(float(metrics["monthlyRevenue"][i])),
+        "tppd": round(float(metrics["buyers"][i])),
+        "locationScore": round(float(metrics["locationScore"][i]), 2),
+        "riskScore": round(float(metrics["riskScore"][i]), 3),
+    }
+
+
+async def stream_heatmap(grid: CellGrid, request: HeatmapRequest) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a `grid` event, `cells` events as batches of cells finish, then `done`
+    with the full score surface (row 0 = south), the best cells and stats.
+
+    Closing the generator early cancels all outstanding cell work.
+    """
+    t0 = time.perf_counter()
+    b = request.bbox
+    area_sq_m = grid.cell_m ** 2
+    mid_lat, mid_lng = (b.south + b.north) / 2, (b.west + b.east) / 2
+
+    yield {
+        "type": "grid",
+        "rows": grid.rows,
+        "cols": grid.cols,
+        "cell_size_m": grid.cell_m,
+        "origin": {"lat": grid.row0 * grid.lat_step, "lng": grid.col0 * grid.lng_step},
+        "lat_step": grid.lat_step,
+        "lng_step": grid.lng_step,
+    }
+
+    weather_task = asyncio.create_task(get_weather(mid_lat, mid_lng))
+    competition_task = asyncio.create_task(area_field(mid_lat, mid_lng, float(haversine_m(mid_lat, mid_lng, b.north, b.east))))
+    semaphore = asyncio.Semaphore(request.max_concurrency)
+
+    async def run_cell(row: int, col: int) -> Dict[str, Any]:
+        async with semaphore:
+            lat, lng = grid.center(row, col)
+            landcover, cached = await cell_landcover(grid, row, col)
+            return {
+                "row": row, "col": col, "lat": lat, "lng": lng,
+                "geohash": geohash_encode(lat, lng, 8),
+                "landcover": landcover, "cached": cached,
+            }
+
+    # Screen from the middle outwards so a truncated job still covers the area of interest
+    cells = sorted(
+        ((r, c) for r in range(grid.rows) for c in range(grid.cols)),
+        key=lambda rc: (rc[0] - (grid.rows - 1) / 2) ** 2 + (rc[1] - (grid.cols - 1) / 2) ** 2,
+    )
+    pending = {asyncio.create_task(run_cell(r, c)) for r, c in cells}
+    finished: List[Dict[str, Any]] = []
+    failed = 0
+    deadline = time.perf_counter() + request.budget_seconds
+
+    try:
+        # One lookup each for the whole bbox; cells keep downloading meanwhile
+        weather = await weather_task
+        weather_factor = WEATHER_VIC.get(weather, 1.0)
+        field = await competition_task
+
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=min(remaining, FLUSH_INTERVAL_SECONDS))
+            batch = []
+            for task in done:
+                if task.exception() is not None:
+                    failed += 1
+                    print(f"Heatmap cell failed: {task.exception()}")
+                else:
+                    batch.append(task.result())
+            if batch:
+                if field is None:
+                    factors = [competitor_factor("medium")] * len(batch)
+                else:
+                    factors = await asyncio.to_thread(field.factors_at, [c["lat"] for c in batch], [c["lng"] for c in batch])
+                for cell, factor in zip(batch, factors):
+                    cell["competitor"] = float(factor)
+                metrics = score_cells(batch, request.business_params, area_sq_m, weather_factor)
+                finished.extend(batch)
+                yield {"type": "cells", "cells": [_cell_payload(cell, metrics, i) for i, cell in enumerate(batch)]}
+    finally:
+        for task in pending:
+            task.cancel()
+        weather_task.cancel()
+        competition_task.cancel()
+
+    surface: List[List[Any]] = [[None] * grid.cols for _ in range(grid.rows)]
+    best: List[Dict[str, Any]] = []
+    if finished:
+        metrics = score_cells(finished, request.business_params, area_sq_m, weather_factor)
+        for i, cell in enumerate(finished):
+            surface[cell["row"]][cell["col"]] = round(float(metrics["locationScore"][i]), 2)
+        order = np.argsort(-metrics["monthlyRevenue"], kind="stable")[:TOP_CELLS]
+        best = [_cell_payload(finished[i], metrics, i) for i in order]
+
+    yield {
+        "type": "done",
+        "surface": surface,
+        "best": best,
+        "weatherUsed": weather,
+        "competitors": None if field is None else field.count,
+        "stats": {
+            "cells": grid.size,
+            "scored": len(finished),
+            "cached": sum(1 for c in finished if c["cached"]),
+            "failed": failed,
+            "skipped": len(pending),
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+        },
+    }
@@ -0,0 +1,129 @@
+"""
+Screenshot normalisation before vision inference.
+
+html2canvas hands us whatever the browser rendered: often a multi-megabyte
+PNG, sometimes with Leaflet's attribution bar or zoom control baked in. This
+stage crops configurable edge margins, downsamples to a maximum edge and
+recompresses to a compact format. The map geometry in `screenshot_metadata`
+is rewritten so that `width * scale` / `height * scale` still describe the
+ground extent of the pixels that are actually analysed.
+"""
+import io
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple, Union
+
+from PIL import Image
+
+from app.core.config import settings
+
+METERS_PER_DEGREE_LAT = 111_320
+
+_FORMAT_MIME = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+@dataclass
+class NormalizedScreenshot:
+    data: Union[bytes, bytearray]
+    mime_type: str
+    metadata: Dict[str, Any]
+    original_size: int
+    reencoded: bool = False
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def parse_margins(value: str) -> Tuple[int, int, int, int]:
+    """Parse "top,right,bottom,left" pixel margins (CSS order)"""
+    parts = [int(p) for p in value.split(",")] if value else []
+    if len(parts) != 4 or min(parts) < 0:
+        raise ValueError(f"Expected 4 non-negative margins 'top,right,bottom,left', got {value!r}")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def _plan(
+    image_size: Tuple[int, int],
+    metadata: Dict[str, Any],
+    max_edge: int,
+    margins: Tuple[int, int, int, int],
+) -> Tuple[Tuple[int, int, int, int], Tuple[int, int], Dict[str, Any]]:
+    """Work out the crop box, output size and rewritten metadata for an image of `image_size`"""
+    img_w, img_h = image_size
+    top, right, bottom, left = margins
+    if left + right >= img_w or top + bottom >= img_h:
+        top = right = bottom = left = 0
+
+    crop_box = (left, top, img_w - right, img_h - bottom)
+    crop_w, crop_h = crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]
+
+    factor = min(1.0, max_edge / max(crop_w, crop_h)) if max_edge else 1.0
+    out_w, out_h = max(1, round(crop_w * factor)), max(1, round(crop_h * factor))
+
+    new_metadata = dict(metadata)
+    scale = metadata.get("scale")
+    if scale:
+        # `scale` is meters per *metadata* pixel, which may differ from image pixels (devicePixelRatio)
+        meters_per_image_px = float(scale) * float(metadata.get("width") or img_w) / img_w
+        new_metadata["scale"] = meters_per_image_px * crop_w / out_w
+
+        # Asymmetric crops move the image center; keep `center` pointing at the middle of what we analyse
+        center = metadata.get("center") or {}
+        if center.get("lat") is not None and center.get("lng") is not None:
+            dx_m = (left - right) / 2 * meters_per_image_px
+            dy_m = (bottom - top) / 2 * meters_per_image_px
+            lat = float(center["lat"]) + dy_m / METERS_PER_DEGREE_LAT
+            lng = float(center["lng"]) + dx_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+            new_metadata["center"] = {**center, "lat": lat, "lng": lng}
+
+    new_metadata["width"] = out_w
+    new_metadata["height"] = out_h
+    new_metadata["normalized"] = {
+        "source_size": [img_w, img_h],
+        "crop_box": list(crop_box),
+        "output_size": [out_w, out_h],
+    }
+    return crop_box, (out_w, out_h), new_metadata
+
+
+def normalize_screenshot(
+    image_bytes: Union[bytes, bytearray],
+    metadata: Dict[str, Any],
+    mime_type: str = "image/png",
+    encode: bool = True,
+) -> NormalizedScreenshot:
+    """
+    Crop, downsample and recompress a screenshot.
+
+    With `encode=False` only the header is read and the metadata rewritten,
+    which is enough when the vision result comes from cache but the metrics
+    still need the normalised geometry. Undecodable input is passed through
+    unchanged.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        crop_box, out_size, new_metadata = _plan(
+            image.size,
+            metadata,
+            settings.SCREENSHOT_MAX_EDGE,
+            parse_margins(settings.SCREENSHOT_CROP_MARGINS),
+        )
+    except Exception:
+        return NormalizedScreenshot(image_bytes, mime_type, metadata, len(image_bytes))
+
+    if not encode:
+        return NormalizedScreenshot(image_bytes, image.get_format_mimetype() or mime_type, new_metadata, len(image_bytes))
+
+    fmt = settings.SCREENSHOT_FORMAT.upper()
+    image = image.convert("RGB").crop(crop_box)
+    if image.size != out_size:
+        image = image.resize(out_size, Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt == "PNG":
+        image.save(out, format=fmt, optimize=True)
+    else:
+        image.save(out, format=fmt, quality=settings.SCREENSHOT_QUALITY)
+
+    return NormalizedScreenshot(out.getvalue(), _FORMAT_MIME.get(fmt, "image/png"), new_metadata, len(image_bytes), reencoded=True)
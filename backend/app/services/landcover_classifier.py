@@ -0,0 +1,235 @@
+"""
+Offline land-cover estimate from screenshot pixels.
+
+A vectorised NumPy classifier that splits a map screenshot into residential,
+road and open-space shares in a few milliseconds on CPU. It backs the
+`mode=fast` analysis and replaces the hard-coded 50/20/30 split when Gemini
+fails.
+
+Two styles are recognised:
+
+* `map` - the OpenStreetMap Carto street layer. Pixels are matched to the
+  nearest known fill colour through a 6-bit-per-channel lookup table; labels,
+  icons and anti-aliasing that match nothing are left out of the denominator.
+* `satellite` - the ArcGIS World Imagery layer. Colour indices (excess green,
+  blue dominance) and local texture separate vegetation/water, smooth grey
+  asphalt and textured built-up roofs.
+"""
+import functools
+import io
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.schemas.schemas import AreaDistribution
+from app.services.metrics_engine import GLOBAL_AVERAGE_DENSITY
+
+CLASSES = ("residential", "road", "openSpace")
+
+_RES = (1.0, 0.0, 0.0)
+_ROAD = (0.0, 1.0, 0.0)
+_OPEN = (0.0, 0.0, 1.0)
+
+# OSM Carto fills -> (residential, road, openSpace) weights
+_OSM_FILLS = [
+    ((242, 239, 233), (0.5, 0.0, 0.5)),  # untagged land, built-up or not
+    ((224, 223, 223), _RES),             # landuse=residential
+    ((217, 208, 201), _RES),             # building
+    ((196, 182, 171), _RES),             # building outline
+    ((242, 218, 217), _RES),             # commercial
+    ((255, 214, 209), _RES),             # retail
+    ((235, 219, 232), _RES),             # industrial
+    ((255, 255, 229), _RES),             # school / hospital grounds
+    ((255, 255, 255), _ROAD),            # residential / tertiary road
+    ((247, 250, 191), _ROAD),            # secondary
+    ((252, 214, 164), _ROAD),            # primary
+    ((249, 178, 156), _ROAD),            # trunk
+    ((232, 146, 162), _ROAD),            # motorway
+    ((221, 221, 232), _ROAD),            # pedestrian / service area
+    ((187, 187, 187), _ROAD),            # road casing
+    ((200, 250, 204), _OPEN),            # park
+    ((205, 235, 176), _OPEN),            # grass / meadow
+    ((173, 209, 158), _OPEN),            # forest
+    ((170, 211, 223), _OPEN),            # water
+    ((238, 240, 213), _OPEN),            # farmland
+    ((170, 224, 203), _OPEN),            # pitch
+    ((170, 203, 175), _OPEN),            # cemetery
+    ((200, 215, 171), _OPEN),            # scrub
+    ((255, 241, 186), _OPEN),            # sand / beach
+    ((223, 252, 226), _OPEN),            # playground
+]
+OSM_PALETTE = np.array([rgb for rgb, _ in _OSM_FILLS], dtype=np.float32)
+OSM_WEIGHTS = np.array([w for _, w in _OSM_FILLS], dtype=np.float32)
+
+PALETTE_TOLERANCE = 12.0    # RGB distance to count as a palette match
+MAP_STYLE_MIN_MATCH = 0.45  # share of matching pixels above which the image is a street map
+TEXTURE_WINDOW = 5          # px, local std window (after downsampling)
+
+
+@dataclass
+class LandcoverEstimate:
+    residential: float
+    road: float
+    openSpace: float
+    style: str
+    coverage: float  # share of pixels that contributed to the estimate
+    elapsed_ms: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "residential": self.residential,
+            "road": self.road,
+            "openSpace": self.openSpace,
+            "style": self.style,
+            "coverage": self.coverage,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+    def to_area_distribution(self, reasoning: Optional[str] = None) -> AreaDistribution:
+        return AreaDistribution(
+            residential=self.residential,
+            road=self.road,
+            openSpace=self.openSpace,
+            estimated_population_density=GLOBAL_AVERAGE_DENSITY,
+            competitor_density_estimate="medium",
+            reasoning=reasoning or (
+                f"Local pixel classifier ({self.style} style, "
+                f"{self.coverage:.0%} of pixels classified)"
+            ),
+        )
+
+
+def _load_rgb(image: Union[bytes, bytearray, Image.Image], crop_box: Optional[Tuple[int, int, int, int]], max_edge: int) -> np.ndarray:
+    if not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(image))
+    if crop_box:
+        image = image.crop(tuple(crop_box))
+    w, h = image.size
+    factor = min(1.0, max_edge / max(w, h))
+    if factor < 1.0:
+        # Nearest keeps flat map fills exact; box/bilinear would blend thin roads into unknown colours
+        image.draft("RGB", (round(w * factor), round(h * factor)))
+        image = image.resize((max(1, round(w * factor)), max(1, round(h * factor))), Image.NEAREST)
+    return np.asarray(image.convert("RGB"), dtype=np.uint8)
+
+
+def _local_std(gray: np.ndarray, window: int) -> np.ndarray:
+    """Standard deviation over a `window`x`window` neighbourhood via integral images"""
+    pad = window // 2
+    padded = np.pad(gray, pad, mode="edge")
+
+    def box_mean(a: np.ndarray) -> np.ndarray:
+        s = np.pad(a.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        total = s[window:, window:] - s[:-window, window:] - s[window:, :-window] + s[:-window, :-window]
+        return total / (window * window)
+
+    mean = box_mean(padded)
+    mean_sq = box_mean(padded * padded)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+@functools.lru_cache(maxsize=1)
+def _palette_lut() -> np.ndarray:
+    """Nearest palette index (+1, 0 = no match) for every 6-bit-per-channel colour"""
+    levels = np.arange(64, dtype=np.float32) * 4 + 1.5  # bin centers
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    colours = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, so the whole distance matrix is one matmul
+    d2 = (colours * colours).sum(axis=1)[:, None] - 2 * colours @ OSM_PALETTE.T + (OSM_PALETTE * OSM_PALETTE).sum(axis=1)
+    nearest = d2.argmin(axis=1)
+    matched = d2[np.arange(len(colours)), nearest] <= PALETTE_TOLERANCE ** 2
+    return np.where(matched, nearest + 1, 0).astype(np.uint8)
+
+
+def _classify_map(pixels: np.ndarray) -> Tuple[np.ndarray, float]:
+    q = pixels >> 2
+    index = (q[:, 0].astype(np.int32) << 12) | (q[:, 1].astype(np.int32) << 6) | q[:, 2]
+    counts = np.bincount(_palette_lut()[index], minlength=len(OSM_PALETTE) + 1)
+    totals = counts[1:] @ OSM_WEIGHTS
+    return totals, float(counts[1:].sum() / max(len(pixels), 1))
+
+
+def _classify_satellite(rgb: np.ndarray) -> Tuple[np.ndarray, float]:
+    x = rgb.astype(np.float32) / 255.0
+    r, g, b = x[..., 0], x[..., 1], x[..., 2]
+    mx, mn = x.max(axis=2), x.min(axis=2)
+    sat = (mx - mn) / (mx + 1e-6)
+    texture = _local_std(x.mean(axis=2), TEXTURE_WINDOW)
+
+    usable = mx >= 0.12  # deep shadow carries no colour information
+    vegetation = (2 * g - r - b > 0.05) & (g >= r)
+    water = (b > r + 0.04) & (b >= g) & (mx < 0.6)
+    bare_soil = (r > g) & (g > b) & (sat > 0.15) & (sat < 0.4) & (texture < 0.03)
+    open_space = usable & (vegetation | water | bare_soil)
+    road = usable & ~open_space & (sat < 0.12) & (mx > 0.25) & (mx < 0.75) & (texture < 0.05)
+    residential = usable & ~open_space & ~road
+
+    totals = np.array([residential.sum(), road.sum(), open_space.sum()], dtype=np.float64)
+    return totals, float(usable.mean())
+
+
+def classify_landcover(
+    image: Union[bytes, bytearray, Image.Image],
+    crop_box: Optional[Tuple[int, int, int, int]] = None,
+    max_edge: Optional[int] = None,
+) -> LandcoverEstimate:
+    """Estimate residential / road / open-space percentages of a screenshot"""
+    start = time.perf_counter()
+    rgb = _load_rgb(image, crop_box, max_edge or settings.LANDCOVER_MAX_EDGE)
+
+    totals, coverage = _classify_map(rgb.reshape(-1, 3))
+    style = "map"
+    if coverage < MAP_STYLE_MIN_MATCH:
+        totals, coverage = _classify_satellite(rgb)
+        style = "satellite"
+
+    if totals.sum() <= 0:
+        raise ValueError("No classifiable pixels in screenshot")
+
+    shares = totals / totals.sum() * 100
+    residential, road = round(float(shares[0]), 1), round(float(shares[1]), 1)
+    return LandcoverEstimate(
+        residential=residential,
+        road=road,
+        openSpace=round(100.0 - residential - road, 1),
+        style=style,
+        coverage=round(coverage, 3),
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+
+
+class AgreementStats:
+    """Running comparison of local estimates against the Gemini results they were cached with"""
+
+    def __init__(self):
+        self.count = 0
+        self.abs_error = np.zeros(len(CLASSES))
+        self.within_10pp = 0
+
+    def record(self, estimate: Dict[str, Any], reference: Dict[str, Any]):
+        est = np.array([float(estimate[c]) for c in CLASSES])
+        ref = np.array([float(reference.get(c) or 0) for c in CLASSES])
+        if ref.sum() <= 0:
+            return
+        ref = ref / ref.sum() * 100  # Gemini's percentages don't always add up to 100
+        err = np.abs(est - ref)
+        self.count += 1
+        self.abs_error += err
+        self.within_10pp += int(err.max() <= 10)
+
+    def as_dict(self) -> Dict[str, Any]:
+        n = max(self.count, 1)
+        mae = self.abs_error / n
+        return {
+            "samples": self.count,
+            "mean_abs_error_pp": {c: round(float(e), 2) for c, e in zip(CLASSES, mae)},
+            "mean_abs_error_pp_overall": round(float(mae.mean()), 2),
+            "within_10pp_rate": round(self.within_10pp / n, 3),
+        }
+
+
+landcover_agreement = AgreementStats()
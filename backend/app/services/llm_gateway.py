@@ -0,0 +1,226 @@
+"""
+Process-wide async gateway to the Gemini REST API.
+
+The google-genai / google-generativeai SDKs either block the event loop
+(`generate_content`) or hop to a worker thread with a fresh `requests.Session`
+per call. The gateway talks to the REST endpoint directly over one pooled
+`httpx.AsyncClient`, so concurrent analysis and agent requests overlap on the
+same worker instead of serialising.
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import ExternalServiceError
+
+logger = logging.getLogger(__name__)
+
+Part = Dict[str, Any]
+Content = Dict[str, Any]
+
+_BLOB_MARKER = "__finaya_inline_blob_"
+
+
+def text_part(text: str) -> Part:
+    """Build a text part for a request"""
+    return {"text": text}
+
+
+def image_part(data: Union[bytes, bytearray, str], mime_type: str = "image/png") -> Part:
+    """
+    Build an inline image part. `data` may be raw bytes or an already base64-encoded string.
+
+    Raw bytes are base64-encoded once and kept as bytes; `_encode_body` splices
+    them into the request JSON without another str/bytes round trip.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = base64.b64encode(data)
+    return {"inline_data": {"mime_type": mime_type, "data": data}}
+
+
+def _encode_body(body: Dict[str, Any]) -> bytes:
+    """JSON-encode a request body whose inline image data may be base64 bytes"""
+    blobs: List[bytes] = []
+
+    def stash(obj: Any) -> str:
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            blobs.append(obj)
+            return f"{_BLOB_MARKER}{len(blobs) - 1}__"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    text = json.dumps(body, default=stash)
+    if not blobs:
+        return text.encode()
+
+    pieces: List[bytes] = []
+    rest = text
+    for i, blob in enumerate(blobs):
+        head, _, rest = rest.partition(f"{_BLOB_MARKER}{i}__")
+        pieces.append(head.encode())
+        pieces.append(blob)
+    pieces.append(rest.encode())
+    return b"".join(pieces)
+
+
+def user_content(*parts: Union[Part, str]) -> Content:
+    return {"role": "user", "parts": [text_part(p) if isinstance(p, str) else p for p in parts]}
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+
+
+class LLMGateway:
+    """Shared async client for Gemini `generateContent` calls"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        api_version: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key if api_key is not None else settings.GEMINI_API_KEY
+        self.model = model or settings.GEMINI_MODEL or "gemini-2.0-flash"
+        self.base_url = (base_url or settings.GEMINI_API_BASE_URL).rstrip("/")
+        self.api_version = api_version or settings.GEMINI_API_VERSION
+        self.max_connections = max_connections or settings.LLM_MAX_CONNECTIONS
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.LLM_MAX_CONCURRENCY)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the pooled HTTP client on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"x-goog-api-key": self.api_key, "Content-Type": "application/json"},
+                transport=self._transport,
+            )
+        return self._client
+
+    async def generate(
+        self,
+        contents: Union[str, List[Union[Part, str]], List[Content]],
+        *,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+        response_mime_type: Optional[str] = None,
+    ) -> LLMResponse:
+        """
+        Call `models/{model}:generateContent`.
+
+        `contents` is either a prompt string, a list of parts for a single user
+        turn, or a full list of `{"role", "parts"}` turns (chat history).
+        """
+        if not self.enabled:
+            raise ExternalServiceError("LLM gateway disabled (GEMINI_API_KEY not set)")
+
+        body: Dict[str, Any] = {"contents": self._normalize_contents(contents)}
+        generation_config: Dict[str, Any] = {}
+        if temperature is not None:
+            generation_config["temperature"] = temperature
+        if max_output_tokens is not None:
+            generation_config["maxOutputTokens"] = max_output_tokens
+        if response_mime_type:
+            generation_config["responseMimeType"] = response_mime_type
+        if generation_config:
+            body["generationConfig"] = generation_config
+
+        path = f"/{self.api_version}/models/{model or self.model}:generateContent"
+
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                resp = await self.client.post(path, content=_encode_body(body))
+            except httpx.HTTPError as e:
+                raise ExternalServiceError(f"Gemini request failed: {e}")
+            latency = time.perf_counter() - start
+
+        if resp.status_code != 200:
+            raise ExternalServiceError(f"Gemini API error {resp.status_code}: {resp.text[:300]}")
+
+        return self._parse_response(resp.json(), latency)
+
+    async def chat(
+        self,
+        history: List[Content],
+        message: str,
+        **kwargs: Any,
+    ) -> LLMResponse:
+        """Send `message` after a prior `{"role", "parts"}` history"""
+        return await self.generate([*history, user_content(message)], **kwargs)
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @staticmethod
+    def _normalize_contents(contents) -> List[Content]:
+        if isinstance(contents, str):
+            return [user_content(contents)]
+        if contents and isinstance(contents[0], dict) and "role" in contents[0]:
+            return list(contents)
+        return [user_content(*contents)]
+
+    @staticmethod
+    def _parse_response(data: Dict[str, Any], latency: float) -> LLMResponse:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            reason = data.get("promptFeedback", {}).get("blockReason", "no candidates")
+            raise ExternalServiceError(f"Gemini returned no content ({reason})")
+
+        parts = candidates[0].get("content", {}).get("parts", [])
+        text = "".join(p.get("text", "") for p in parts)
+        usage = data.get("usageMetadata", {})
+
+        return LLMResponse(
+            text=text,
+            prompt_tokens=usage.get("promptTokenCount", 0),
+            output_tokens=usage.get("candidatesTokenCount", 0),
+            latency=latency,
+        )
+
+
+# Lazy singleton shared by every service in the worker
+llm_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    global llm_gateway
+    if llm_gateway is None:
+        llm_gateway = LLMGateway()
+    return llm_gateway
+
+
+async def close_llm_gateway():
+    if llm_gateway is not None:
+        await llm_gateway.close()
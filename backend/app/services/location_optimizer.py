@@ -0,0 +1,442 @@
+"""
+Budgeted coarse-to-fine search for the best location near a start point.
+
+1. Screen: every coarse cell (the heatmap lattice, so cached cells are shared)
+   whose center lies within the radius gets the local land-cover estimate.
+2. Refine: the best cells are split into half-size cells and screened again,
+   `refine_levels` times.
+3. Verify: the best leaf cells (and the start cell) are re-estimated by Gemini
+   vision. Results already in the vision cache are free; misses are spent in
+   rank order until `max_vision_calls` is exhausted, and no more are made.
+
+Every score is `compute_metrics`, the formula behind
+`calculate_business_metrics`, evaluated for all candidates at once, with
+each candidate's Huff competitor factor from one Places search over the
+radius (the "medium" / vision estimate without Places data). The report
+says how many expensive calls were spent and how the answer moved.
+"""
+import asyncio
+import io
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import ExternalServiceError, ValidationError
+from app.core.geo import METERS_PER_DEGREE_LAT, CellGrid, haversine_m, meters_per_pixel
+from app.schemas.schemas import AreaDistribution
+from app.services.competitor_analytics import CompetitorField, area_field
+from app.services.gemini_service_analysis import analyze_with_gemini
+from app.services.heatmap_service import cell_landcover, validate_business_params
+from app.services.metrics_engine import GLOBAL_AVERAGE_DENSITY, competitor_factor, compute_metrics
+from app.services.tile_service import NOT_CONFIGURED, get_tile_service
+from app.services.road_graph import site_traffic
+from app.services.traffic_probability import business_traffic_hours
+from app.services.vision_cache import vision_cache, vision_cache_key, vision_flight
+from app.services.weather_probability import WEATHER_VIC, get_weather
+
+COARSE_CELL_M = 250.0
+MIN_CELL_M = 50.0
+# Cells split per refinement level
+REFINE_TOP = 3
+# Leaf cells looked up in the vision cache; misses among them spend the budget
+VISION_SHORTLIST = 8
+MAX_PIVOTS = 3
+SCREEN_CONCURRENCY = 8
+
+COMPASS = ("North", "North-East", "East", "South-East", "South", "South-West", "West", "North-West")
+
+
+@dataclass
+class Candidate:
+    grid: CellGrid
+    row: int
+    col: int
+    level: int
+    lat: float
+    lng: float
+    landcover: Dict[str, Any]
+    cached: bool
+    # Huff factor at the cell centre; None without Places data
+    competitor: Optional[float] = None
+    local_score: float = 0.0
+    vision: Optional[AreaDistribution] = None
+    vision_score: Optional[float] = None
+    monthly_revenue: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return self.grid.key(self.row, self.col)
+
+    @property
+    def score(self) -> float:
+        return self.vision_score if self.vision_score is not None else self.local_score
+
+
+def _direction(lat0: float, lng0: float, lat: float, lng: float) -> str:
+    dy = lat - lat0
+    dx = (lng - lng0) * math.cos(math.radians(lat0))
+    bearing = math.degrees(math.atan2(dx, dy)) % 360
+    return COMPASS[round(bearing / 45) % 8]
+
+
+def _score(
+    params: Dict[str, Any],
+    candidates: List[Candidate],
+    residential: List[float],
+    road: List[float],
+    density: List[float],
+    competitor: List[float],
+    weather_factor: float,
+) -> Dict[str, np.ndarray]:
+    # Area cancels out of the per-road-metre traffic, so cells of every level compare directly
+    residential = np.asarray(residential, dtype=np.float64)
+    road = np.asarray(road, dtype=np.float64)
+    return compute_metrics(
+        float(params["buildingWidth"]),
+        float(params["operatingHours"]),
+        float(params["productPrice"]),
+        residential=residential,
+        road=road,
+        area_sq_m=COARSE_CELL_M ** 2,
+        population_density=np.asarray(density, dtype=np.float64),
+        competitor=np.asarray(competitor, dtype=np.float64),
+        weather_factor=weather_factor,
+        traffic_factor=np.array([site_traffic(c.lat, c.lng)[0] for c in candidates]),
+        traffic_hours=business_traffic_hours(params, residential, road),
+    )
+
+
+def _score_local(candidates: List[Candidate], params: Dict[str, Any], weather_factor: float):
+    if not candidates:
+        return
+    n = len(candidates)
+    m = _score(
+        params,
+        candidates,
+        [c.landcover["residential"] for c in candidates],
+        [c.landcover["road"] for c in candidates],
+        [GLOBAL_AVERAGE_DENSITY] * n,
+        [competitor_factor("medium") if c.competitor is None else c.competitor for c in candidates],
+        weather_factor,
+    )
+    for i, c in enumerate(candidates):
+        c.local_score = float(m["locationScore"][i])
+        c.monthly_revenue = float(m["monthlyRevenue"][i])
+
+
+def _score_vision(candidates: List[Candidate], params: Dict[str, Any], weather_factor: float):
+    verified = [c for c in candidates if c.vision is not None]
+    if not verified:
+        return
+    m = _score(
+        params,
+        verified,
+        [c.vision.residential for c in verified],
+        [c.vision.road for c in verified],
+        [c.vision.estimated_population_density for c in verified],
+        [competitor_factor(c.vision.competitor_density_estimate) if c.competitor is None else c.competitor for c in verified],
+        weather_factor,
+    )
+    for i, c in enumerate(verified):
+        c.vision_score = float(m["locationScore"][i])
+        c.monthly_revenue = float(m["monthlyRevenue"][i])
+
+
+async def _screen(cells: List[Tuple[CellGrid, int, int, int]]) -> List[Candidate]:
+    semaphore = asyncio.Semaphore(SCREEN_CONCURRENCY)
+
+    async def run(grid: CellGrid, row: int, col: int, level: int) -> Candidate:
+        async with semaphore:
+            landcover, cached = await cell_landcover(grid, row, col)
+        lat, lng = grid.center(row, col)
+        return Candidate(grid, row, col, level, lat, lng, landcover, cached)
+
+    results = await asyncio.gather(*(run(*cell) for cell in cells), return_exceptions=True)
+    screened = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Optimizer cell failed: {result}")
+        else:
+            screened.append(result)
+    return screened
+
+
+async def _set_competition(candidates: List[Candidate], field: Optional[CompetitorField]):
+    if field is not None and candidates:
+        factors = await asyncio.to_thread(field.factors_at, [c.lat for c in candidates], [c.lng for c in candidates])
+        for c, factor in zip(candidates, factors):
+            c.competitor = float(factor)
+
+
+def _children(parent: Candidate, cell_m: float) -> List[Tuple[CellGrid, int, int, int]]:
+    """Half-size lattice cells whose centers fall inside `parent`"""
+    g = parent.grid
+    south = (g.row0 + parent.row) * g.lat_step
+    west = (g.col0 + parent.col) * g.lng_step
+    north, east = south + g.lat_step, west + g.lng_step
+    child = CellGrid.cover(south, west, north, east, cell_m)
+    cells = []
+    for r in range(child.rows):
+        for c in range(child.cols):
+            lat, lng = child.center(r, c)
+            if south <= lat < north and west <= lng < east:
+                cells.append((child, r, c, parent.level + 1))
+    return cells
+
+
+def _png(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+async def _vision_lookup(candidate: Candidate) -> Tuple[str, bytes, Optional[Dict[str, Any]]]:
+    """Cache key, image and cached vision entry of a candidate cell"""
+    tiles = get_tile_service()
+    cell_m = candidate.grid.cell_m
+    image = await tiles.render_area(candidate.lat, candidate.lng, cell_m)
+    data = await asyncio.to_thread(_png, image)
+    zoom = tiles.zoom_for(candidate.lat, cell_m)
+    metadata = {
+        "center": {"lat": candidate.lat, "lng": candidate.lng},
+        "scale": meters_per_pixel(candidate.lat, zoom),
+        "zoom": zoom,
+    }
+    key = vision_cache_key(data, metadata)
+    return key, data, await vision_cache.get(key)
+
+
+async def _vision_compute(candidate: Candidate, key: str, image: bytes) -> AreaDistribution:
+    lc = candidate.landcover
+    fallback = AreaDistribution(
+        residential=lc["residential"],
+        road=lc["road"],
+        openSpace=lc["openSpace"],
+        estimated_population_density=GLOBAL_AVERAGE_DENSITY,
+        competitor_density_estimate="medium",
+        reasoning=f"Local pixel classifier ({lc.get('style', 'map')} style)",
+    )
+
+    async def compute() -> AreaDistribution:
+        start = time.perf_counter()
+        # No geocode or web search per candidate: they would cost more than the inference itself
+        area = await analyze_with_gemini(
+            image,
+            f"the area around {candidate.lat:.5f}, {candidate.lng:.5f}",
+            "No external data; estimate from the image.",
+            mime_type="image/png",
+            fallback=fallback,
+        )
+        vision_cache.record_compute(time.perf_counter() - start)
+        if not area.reasoning.startswith("Fallback"):
+            await vision_cache.set(key, {"location_name": None, "area_distribution": area.dict(), "landcover": lc})
+        return area
+
+    return await vision_flight.do(key, compute)
+
+
+def _payload(c: Candidate, start: Candidate) -> Dict[str, Any]:
+    area = c.vision.dict() if c.vision is not None else {
+        "residential": c.landcover["residential"],
+        "road": c.landcover["road"],
+        "openSpace": c.landcover["openSpace"],
+    }
+    return {
+        "lat": round(c.lat, 6),
+        "lng": round(c.lng, 6),
+        "cell_size_m": c.grid.cell_m,
+        "level": c.level,
+        "direction": _direction(start.lat, start.lng, c.lat, c.lng),
+        "offset_meters": round(float(haversine_m(start.lat, start.lng, c.lat, c.lng))),
+        "locationScore": round(c.score, 2),
+        "localScore": round(c.local_score, 2),
+        "monthlyRevenue": round(c.monthly_revenue),
+        "scoredBy": "vision" if c.vision_score is not None else "local",
+        "areaDistribution": {k: area[k] for k in ("residential", "road", "openSpace")},
+    }
+
+
+def _reason(c: Candidate, start: Candidate) -> str:
+    cur = c.vision.dict() if c.vision is not None else c.landcover
+    ref = start.vision.dict() if (start.vision is not None and c.vision is not None) else start.landcover
+    basis = "vision-verified" if c.vision_score is not None else "local estimate"
+    return (
+        f"{cur['residential']:.0f}% residential / {cur['road']:.0f}% road vs "
+        f"{ref['residential']:.0f}% / {ref['road']:.0f}% here; score {c.score:.2f} ({basis})"
+    )
+
+
+def _unavailable(reason: str, budget: int, t0: float) -> Dict[str, Any]:
+    """Report shape of a run that could not screen any cell"""
+    return {
+        "start": None,
+        "best": None,
+        "pivots": [],
+        "weatherUsed": None,
+        "competitors": None,
+        "budget": {
+            "maxVisionCalls": budget,
+            "visionCalls": 0,
+            "visionFallbacks": 0,
+            "visionCacheHits": 0,
+            "cellsScreened": 0,
+            "cellsCached": 0,
+        },
+        "quality": None,
+        "unavailable": reason,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+async def optimize_location(
+    lat: float,
+    lng: float,
+    business_params: Dict[str, Any],
+    radius_m: float = 600.0,
+    max_vision_calls: int = 3,
+    refine_levels: int = 1,
+    coarse_cell_m: float = COARSE_CELL_M,
+) -> Dict[str, Any]:
+    """
+    Best-scoring cell within `radius_m` of (lat, lng), at most
+    `max_vision_calls` Gemini inferences. Screening needs server-side map
+    tiles (MAP_TILE_URL and MAP_TILE_USER_AGENT); without them the report has
+    no pivots and says why under `unavailable`.
+    """
+    t0 = time.perf_counter()
+    validate_business_params(business_params)
+    if not 0 < radius_m <= settings.OPTIMIZER_MAX_RADIUS_M:
+        raise ValidationError(f"radius_m must be in (0, {settings.OPTIMIZER_MAX_RADIUS_M:g}]")
+    budget = max(0, min(max_vision_calls, settings.OPTIMIZER_MAX_VISION_CALLS))
+    fine_m = coarse_cell_m / 2 ** refine_levels
+    if fine_m < MIN_CELL_M:
+        raise ValidationError(f"refine_levels={refine_levels} would go below {MIN_CELL_M:g} m cells")
+    if not get_tile_service().configured:
+        # Nothing to screen without tiles: an empty answer with the reason, not an error
+        return _unavailable(NOT_CONFIGURED, budget, t0)
+
+    # Coarse lattice over the radius' bbox, cut to the disc
+    half_lat = radius_m / METERS_PER_DEGREE_LAT
+    half_lng = half_lat / max(math.cos(math.radians(lat)), 0.01)
+    grid = CellGrid.cover(lat - half_lat, lng - half_lng, lat + half_lat, lng + half_lng, coarse_cell_m)
+    coarse = [
+        (grid, r, c, 0)
+        for r in range(grid.rows)
+        for c in range(grid.cols)
+        if haversine_m(lat, lng, *grid.center(r, c)) <= radius_m
+    ]
+    if len(coarse) > settings.HEATMAP_MAX_CELLS:
+        raise ValidationError(f"{len(coarse)} coarse cells exceed the {settings.HEATMAP_MAX_CELLS}-cell limit")
+    # The finest cell containing the start point is the baseline
+    home = CellGrid.cover(lat, lng, lat, lng, fine_m)
+
+    # One lookup each for the whole radius; the coarse cells download meanwhile
+    weather_task = asyncio.create_task(get_weather(lat, lng))
+    competition_task = asyncio.create_task(area_field(lat, lng, radius_m))
+    try:
+        leaves = await _screen([(home, 0, 0, refine_levels)] + coarse)
+        weather = await weather_task
+        field = await competition_task
+    finally:
+        weather_task.cancel()
+        competition_task.cancel()
+    weather_factor = WEATHER_VIC.get(weather, 1.0)
+    await _set_competition(leaves, field)
+    if not leaves or leaves[0].grid is not home:
+        raise ExternalServiceError("Could not load map tiles around the start point")
+    start = leaves.pop(0)
+    screened = leaves + [start]
+    _score_local(leaves + [start], business_params, weather_factor)
+    coarse_best = max((c.local_score for c in leaves), default=start.local_score)
+
+    for level in range(refine_levels):
+        cell_m = coarse_cell_m / 2 ** (level + 1)
+        leaves.sort(key=lambda c: c.local_score, reverse=True)
+        parents, leaves = leaves[:REFINE_TOP], leaves[REFINE_TOP:]
+        children = await _screen([cell for p in parents for cell in _children(p, cell_m)])
+        await _set_competition(children, field)
+        screened.extend(children)
+        _score_local(children, business_params, weather_factor)
+        leaves.extend(children)
+    refined_best = max((c.local_score for c in leaves), default=start.local_score)
+
+    # Vision: cached entries are free, misses take the budget in rank order
+    leaves = [c for c in leaves if c.key != start.key]
+    leaves.sort(key=lambda c: c.local_score, reverse=True)
+    shortlist = [start] + leaves[:VISION_SHORTLIST]
+    lookups = await asyncio.gather(*(_vision_lookup(c) for c in shortlist), return_exceptions=True)
+    misses = []
+    for c, lookup in zip(shortlist, lookups):
+        if isinstance(lookup, Exception):
+            print(f"Optimizer vision lookup failed: {lookup}")
+            continue
+        key, image, entry = lookup
+        if entry:
+            c.vision = AreaDistribution(**entry["area_distribution"])
+        else:
+            misses.append((c, key, image))
+    cache_hits = sum(1 for c in shortlist if c.vision is not None)
+    # Spend on the baseline only when there is budget left for a candidate too
+    if budget < 2 and misses and misses[0][0] is start:
+        misses.append(misses.pop(0))
+    spend = misses[:budget]
+    results = await asyncio.gather(*(_vision_compute(c, key, image) for c, key, image in spend))
+    fallbacks = 0
+    for (c, _, _), area in zip(spend, results):
+        if area.reasoning.startswith("Fallback"):
+            fallbacks += 1
+        else:
+            c.vision = area
+    _score_vision(shortlist, business_params, weather_factor)
+
+    verified = [c for c in leaves if c.vision_score is not None]
+    ranked = sorted(verified, key=lambda c: c.vision_score, reverse=True) + sorted(
+        (c for c in leaves if c.vision_score is None), key=lambda c: c.local_score, reverse=True
+    )
+    best = ranked[0] if ranked else start
+    basis = "vision" if best.vision_score is not None and start.vision_score is not None else "local"
+    best_on_basis = best.score if basis == "vision" else best.local_score
+    start_on_basis = start.score if basis == "vision" else start.local_score
+
+    pivots = []
+    for c in ranked[:MAX_PIVOTS]:
+        pivot = _payload(c, start)
+        pivot["reason"] = _reason(c, start)
+        pivots.append(pivot)
+
+    local_top = leaves[0] if leaves else None
+    errors = [abs(c.vision_score - c.local_score) for c in shortlist if c.vision_score is not None]
+    return {
+        "start": _payload(start, start),
+        "best": pivots[0] if pivots else None,
+        "pivots": pivots,
+        "weatherUsed": weather,
+        "competitors": None if field is None else field.count,
+        "budget": {
+            "maxVisionCalls": budget,
+            "visionCalls": len(spend),
+            "visionFallbacks": fallbacks,
+            "visionCacheHits": cache_hits,
+            "cellsScreened": len(screened),
+            "cellsCached": sum(1 for c in screened if c.cached),
+        },
+        "quality": {
+            "basis": basis,
+            "startScore": round(start_on_basis, 2),
+            "coarseBestLocal": round(coarse_best, 2),
+            "refinedBestLocal": round(refined_best, 2),
+            "finalScore": round(best_on_basis, 2),
+            "scoreGain": round(best_on_basis - start_on_basis, 2),
+            "verifiedCandidates": len(verified),
+            # Did vision keep the local favourite on top?
+            "rankStable": bool(verified) and local_top is not None and best is local_top,
+            "meanAbsVisionDelta": round(float(np.mean(errors)), 3) if errors else None,
+        },
+        "unavailable": None,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
@@ -0,0 +1,164 @@
+"""
+Monte Carlo revenue and risk distribution.
+
+`calculate_business_metrics` returns one point: whatever weather was drawn or
+observed, the fixed `DEFAULT_JUNCTIONS` mix and the constant visitor and
+purchase rates. Here each of N samples draws its own weather state (from the
+climatological `WEATHER_PROBS`), junction types (from `JUNCTION_MIX`), visitor
+rate (log-normal around `VISITOR_RATE`) and purchase rate (Beta around
+`PURCHASE_RATE`), and the whole batch is one `compute_metrics` pass.
+
+Runs are seeded. Without an explicit seed the seed is derived from the
+inputs, so identical requests return identical distributions.
+"""
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.core.cache import stable_hash
+from app.core.exceptions import ValidationError
+from app.schemas.schemas import Analysis, SimulationRequest
+from app.services.metrics_engine import (
+    GLOBAL_AVERAGE_DENSITY,
+    PURCHASE_RATE,
+    VISITOR_RATE,
+    ArrayLike,
+    competitor_factor,
+    compute_metrics,
+    screenshot_area,
+)
+from app.services.traffic_probability import DEFAULT_JUNCTIONS, JUNCTION_FACTORS, JUNCTION_MIX, business_traffic_hours
+from app.services.weather_probability import WEATHER_PROBS, WEATHER_STATES, WEATHER_VIC
+
+# Log-normal spread of the visitor rate (sigma of ln)
+VISITOR_RATE_SIGMA = 0.35
+# Beta concentration of the purchase rate; higher = tighter around PURCHASE_RATE
+PURCHASE_RATE_CONCENTRATION = 40.0
+
+PERCENTILES = (10, 50, 90)
+
+_WEATHER_VIC = np.array([WEATHER_VIC[s] for s in WEATHER_STATES])
+_WEATHER_P = np.array(WEATHER_PROBS) / sum(WEATHER_PROBS)
+_JUNCTION_VIC = np.array([JUNCTION_FACTORS[t] for t in JUNCTION_MIX])
+_JUNCTION_P = np.array(list(JUNCTION_MIX.values())) / sum(JUNCTION_MIX.values())
+
+
+def _categorical(rng: np.random.Generator, p: np.ndarray, size) -> np.ndarray:
+    # Inverse-CDF on one uniform draw per sample; cheaper than Generator.choice with p
+    return np.searchsorted(np.cumsum(p), rng.random(size), side="right").clip(max=len(p) - 1)
+
+
+def simulate_metrics(
+    building_width: float,
+    operating_hours: float,
+    price: float,
+    residential: float,
+    road: float,
+    area_sq_m: float,
+    population_density: ArrayLike = GLOBAL_AVERAGE_DENSITY,
+    competitor: ArrayLike = 0.5,
+    samples: int = 10_000,
+    seed: Optional[int] = None,
+    monthly_cost: Optional[float] = None,
+    junction_count: int = len(DEFAULT_JUNCTIONS),
+    traffic_hours: Optional[float] = None,
+    cglp_density: float = GLOBAL_AVERAGE_DENSITY,
+) -> Dict[str, Any]:
+    """
+    Revenue percentiles, break-even probability and expected risk over
+    `samples` draws. `monthly_cost` (fixed plus hourly costs, per month)
+    enables `breakEvenProbability`.
+    """
+    start = time.perf_counter()
+    if seed is None:
+        seed = int(stable_hash(
+            building_width, operating_hours, price, residential, road, area_sq_m,
+            population_density, competitor, samples, junction_count, traffic_hours, cglp_density,
+        )[:8], 16)
+    rng = np.random.default_rng(seed)
+
+    weather_idx = _categorical(rng, _WEATHER_P, samples)
+    junctions = _JUNCTION_VIC[_categorical(rng, _JUNCTION_P, (samples, junction_count))]
+    # Mean-preserving log-normal: E[exp(N(mu, s))] = 1 when mu = -s^2/2
+    visitor_rate = VISITOR_RATE * rng.lognormal(-VISITOR_RATE_SIGMA ** 2 / 2, VISITOR_RATE_SIGMA, samples)
+    mean = PURCHASE_RATE / 100
+    purchase_rate = 100 * rng.beta(mean * PURCHASE_RATE_CONCENTRATION, (1 - mean) * PURCHASE_RATE_CONCENTRATION, samples)
+
+    m = compute_metrics(
+        building_width, operating_hours, price,
+        residential=residential,
+        road=road,
+        area_sq_m=area_sq_m,
+        population_density=population_density,
+        competitor=competitor,
+        weather_factor=_WEATHER_VIC[weather_idx],
+        traffic_factor=junctions.prod(axis=1),
+        visitor_rate=visitor_rate,
+        purchase_rate=purchase_rate,
+        traffic_hours=traffic_hours,
+        cglp_density=cglp_density,
+    )
+    sample_ms = (time.perf_counter() - start) * 1000
+
+    daily = m["dailyRevenue"]
+    p10, p50, p90 = np.percentile(daily, PERCENTILES)
+    mean_daily = float(daily.mean())
+    result = {
+        "samples": samples,
+        "seed": seed,
+        "dailyRevenue": {
+            "p10": round(p10), "p50": round(p50), "p90": round(p90),
+            "mean": round(mean_daily), "std": round(float(daily.std())),
+        },
+        "monthlyRevenue": {"p10": round(p10 * 30), "p50": round(p50 * 30), "p90": round(p90 * 30), "mean": round(mean_daily * 30)},
+        "tppd": {"p10": round(float(np.percentile(m["buyers"], 10))), "p50": round(float(np.median(m["buyers"])))},
+        # Expectation over the draws, so it does not move with a single weather roll
+        "riskScore": round(float(m["riskScore"].mean()), 3),
+        "locationScore": round(float(m["locationScore"].mean()), 2),
+        # How far a bad day (P10) falls below a typical one
+        "downside": round(1 - p10 / p50, 3) if p50 > 0 else None,
+        "weatherShare": {s: round(float(np.mean(weather_idx == i)), 3) for i, s in enumerate(WEATHER_STATES)},
+        "breakEvenProbability": None,
+        "timings": {"sample_ms": round(sample_ms, 2)},
+    }
+    if monthly_cost is not None:
+        result["monthlyCost"] = monthly_cost
+        result["breakEvenProbability"] = round(float(np.mean(m["monthlyRevenue"] >= monthly_cost)), 4)
+    result["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def simulate_analysis(analysis: Analysis, request: SimulationRequest) -> Dict[str, Any]:
+    """Monte Carlo over a saved analysis, reusing its stored vision result and geometry"""
+    data = analysis.data or {}
+    area = (analysis.gemini_analysis or {}).get("area_distribution")
+    params = data.get("business_params")
+    metadata = data.get("screenshot_metadata")
+    if not area or not params or not metadata:
+        raise ValidationError("Analysis has no stored area distribution, business params and screenshot geometry to simulate")
+
+    try:
+        bw, oh, price = (float(params[name]) for name in ("buildingWidth", "operatingHours", "productPrice"))
+        _, _, area_sq_m = screenshot_area(metadata)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValidationError(f"Stored analysis is missing simulation inputs: {e}")
+
+    has_costs = request.monthlyCost is not None or request.hourlyCost > 0
+    monthly_cost = (request.monthlyCost or 0.0) + request.hourlyCost * oh * 30 if has_costs else None
+    stored = data.get("metrics") or {}
+
+    result = simulate_metrics(
+        bw, oh, price,
+        residential=area["residential"],
+        road=area["road"],
+        area_sq_m=area_sq_m,
+        population_density=area.get("estimated_population_density", GLOBAL_AVERAGE_DENSITY),
+        competitor=stored.get("competitorFactor", competitor_factor(area.get("competitor_density_estimate"))),
+        samples=request.samples,
+        seed=request.seed,
+        monthly_cost=monthly_cost,
+        traffic_hours=float(business_traffic_hours(params, area["residential"], area["road"])),
+        cglp_density=stored.get("cglpDensity", GLOBAL_AVERAGE_DENSITY),
+    )
+    return {"analysis_id": analysis.id, **result}
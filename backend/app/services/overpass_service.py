@@ -0,0 +1,188 @@
+"""
+OpenStreetMap competitors through Overpass, cached per geohash tile.
+
+The browser used to query Overpass directly for every scan. Here the backend
+answers `around:` queries from geohash tiles (OVERPASS_TILE_PRECISION) cached
+per tag filter: the tiles covering the circle are looked up, only the missing
+ones are fetched upstream - one bbox query over their union, with failover
+across OVERPASS_URLS on a pooled client - and the merged elements are cut to
+the requested radius. Any radius around any point in an already visited
+district is served without an upstream call.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.core.cache import TieredCache, stable_hash
+from app.core.config import settings
+from app.core.exceptions import ExternalServiceError, ValidationError
+from app.core.geo import METERS_PER_DEGREE_LAT, geohash_bbox, geohash_cover, geohash_encode, haversine_m
+from app.core.singleflight import get_singleflight
+
+DEFAULT_FILTER = '["amenity"~"cafe"]'
+# One or more `["key"]` / `["key"op"value"]` clauses; nothing else reaches the query
+_FILTER_RE = re.compile(r'^(\[\s*"[\w:.-]+"\s*(?:(?:=|!=|~|!~)\s*"[^"\[\]\\;]*"\s*)?\])+$')
+# Tag used as the place type, in order of preference (matches the frontend's labels)
+TYPE_TAGS = ("amenity", "shop", "leisure", "tourism", "office")
+
+overpass_cache = TieredCache(
+    "overpass_tiles",
+    max_entries=settings.OVERPASS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.OVERPASS_CACHE_TTL_SECONDS,
+)
+overpass_flight = get_singleflight("overpass")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_overpass_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=settings.OVERPASS_TIMEOUT,
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+            headers={"User-Agent": settings.osm_user_agent},
+        )
+    return _client
+
+
+async def close_overpass_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def _element(el: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Compact cached form of an Overpass node or way (`out center`)"""
+    lat = el.get("lat", (el.get("center") or {}).get("lat"))
+    lng = el.get("lon", (el.get("center") or {}).get("lon"))
+    if lat is None or lng is None:
+        return None
+    tags = el.get("tags") or {}
+    kind = next((tags[t] for t in TYPE_TAGS if t in tags), "business")
+    return {
+        "id": f"{el.get('type', 'node')}/{el.get('id')}",
+        "lat": lat,
+        "lng": lng,
+        "name": tags.get("name") or tags.get("brand"),
+        "type": kind,
+        "street": tags.get("addr:street"),
+    }
+
+
+def _query(osm_filter: str, bbox) -> str:
+    s, w, n, e = bbox
+    box = f"({s:.7f},{w:.7f},{n:.7f},{e:.7f})"
+    timeout = int(settings.OVERPASS_TIMEOUT)
+    return f"[out:json][timeout:{timeout}];(node{osm_filter}{box};way{osm_filter}{box};);out center;"
+
+
+async def _fetch(osm_filter: str, bbox) -> List[Dict[str, Any]]:
+    """Elements in `bbox`, trying each Overpass server in turn"""
+    query = _query(osm_filter, bbox)
+    errors = []
+    for url in settings.overpass_urls_list:
+        try:
+            res = await get_overpass_client().post(url, data={"data": query})
+            res.raise_for_status()
+            return res.json().get("elements", [])
+        except Exception as e:
+            errors.append(f"{url}: {e}")
+    raise ExternalServiceError(f"Overpass unavailable ({'; '.join(errors) or 'no servers configured'})")
+
+
+async def _fill_tiles(osm_filter: str, filter_key: str, tiles: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch the union bbox of `tiles` once and cache every tile, empty ones included"""
+    boxes = np.array([geohash_bbox(t) for t in tiles])
+    bbox = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+    start = time.perf_counter()
+    elements = await _fetch(osm_filter, bbox)
+    overpass_cache.record_compute(time.perf_counter() - start)
+
+    wanted = {t: [] for t in tiles}
+    precision = len(tiles[0])
+    for el in elements:
+        item = _element(el)
+        if item is not None:
+            tile = geohash_encode(item["lat"], item["lng"], precision)
+            if tile in wanted:
+                wanted[tile].append(item)
+    fetched_at = time.time()
+    await asyncio.gather(*(
+        overpass_cache.set(f"{filter_key}:{tile}", {"elements": items, "fetched_at": fetched_at})
+        for tile, items in wanted.items()
+    ))
+    return wanted
+
+
+def _place(item: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    """Frontend shape (lat, lng, name, vicinity) plus id, type and distance"""
+    name = item["name"] or f"Unnamed {item['type'].replace('_', ' ').title()}"
+    vicinity = f"{item['street']} ({item['type']})" if item["street"] else item["type"]
+    return {
+        "id": item["id"],
+        "name": name,
+        "lat": item["lat"],
+        "lng": item["lng"],
+        "vicinity": vicinity,
+        "type": item["type"],
+        "distance_m": round(float(distance)),
+    }
+
+
+async def osm_competitors(lat: float, lng: float, radius: int = 1000, osm_filter: str = DEFAULT_FILTER) -> Dict[str, Any]:
+    """
+    OSM features matching `osm_filter` within `radius` metres, nearest first.
+    Upstream failure with part of the area cached returns the cached part
+    with `complete: False`; with nothing cached it raises.
+    """
+    osm_filter = osm_filter.strip()
+    if not _FILTER_RE.match(osm_filter):
+        raise ValidationError('filter must be Overpass tag clauses such as ["amenity"~"cafe|bar"]')
+    if not 0 < radius <= settings.OVERPASS_MAX_RADIUS_M:
+        raise ValidationError(f"radius must be between 1 and {settings.OVERPASS_MAX_RADIUS_M} m")
+
+    start = time.perf_counter()
+    d_lat = radius / METERS_PER_DEGREE_LAT
+    d_lng = d_lat / max(np.cos(np.radians(lat)), 0.01)
+    tiles = geohash_cover(lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng, settings.OVERPASS_TILE_PRECISION)
+    filter_key = stable_hash(osm_filter)[:12]
+
+    entries = await asyncio.gather(*(overpass_cache.get(f"{filter_key}:{tile}") for tile in tiles))
+    found = {tile: entry["elements"] for tile, entry in zip(tiles, entries) if entry is not None}
+    missing = [t for t in tiles if t not in found]
+
+    complete = True
+    if missing:
+        try:
+            # Same filter and tile set = one upstream query for concurrent scans of the same spot
+            fetched = await overpass_flight.do(
+                (filter_key, tuple(missing)), lambda: _fill_tiles(osm_filter, filter_key, missing)
+            )
+            found.update(fetched)
+        except ExternalServiceError:
+            if not found:
+                raise
+            complete = False
+
+    items = {item["id"]: item for elements in found.values() for item in elements}
+    places = []
+    if items:
+        values = list(items.values())
+        coords = np.array([(v["lat"], v["lng"]) for v in values])
+        dist = haversine_m(lat, lng, coords[:, 0], coords[:, 1])
+        order = np.argsort(dist, kind="stable")
+        places = [_place(values[i], dist[i]) for i in order if dist[i] <= radius]
+
+    return {
+        "places": places,
+        "count": len(places),
+        "complete": complete,
+        "tiles": {"total": len(tiles), "cached": len(tiles) - len(missing), "fetched": len(missing) if complete else 0},
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
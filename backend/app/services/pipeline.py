@@ -0,0 +1,152 @@
+"""
+Small async stage-DAG executor.
+
+A pipeline is a list of named stages, each declaring the stages it depends on.
+Every stage starts as soon as its dependencies have finished, so independent
+work (geocoding, weather, web search...) overlaps instead of running in
+sequence. Stages receive their dependencies' results as keyword arguments plus
+a per-run `PipelineContext` for request inputs and memoised shared calls.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+StageFunc = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class Stage:
+    name: str
+    func: StageFunc
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class StageEvent:
+    """Emitted when a stage finishes"""
+    name: str
+    result: Any
+    start_ms: float
+    duration_ms: float
+
+
+@dataclass
+class PipelineRun:
+    results: Dict[str, Any]
+    timings: Dict[str, Dict[str, float]]
+    total_ms: float = 0.0
+
+
+class PipelineContext:
+    """Per-run inputs plus memoisation of shared sub-calls (e.g. geocoding the same point twice)"""
+
+    def __init__(self, inputs: Dict[str, Any]):
+        self.inputs = inputs
+        self._memo: Dict[Hashable, asyncio.Future] = {}
+
+    async def memo(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `factory()` once per key within this run; concurrent callers share the result"""
+        task = self._memo.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._memo[key] = task
+        # Shield so one cancelled caller doesn't cancel the shared call for the others
+        return await asyncio.shield(task)
+
+    def close(self):
+        for task in self._memo.values():
+            if not task.done():
+                task.cancel()
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown or later stage '{dep}'")
+            self.stages[stage.name] = stage
+
+    def _required(self, targets: Optional[Iterable[str]]) -> Set[str]:
+        """Stages needed to produce `targets` (all stages when None)"""
+        if targets is None:
+            return set(self.stages)
+        needed: Set[str] = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].depends_on)
+        return needed
+
+    async def stream(self, targets: Optional[Iterable[str]] = None, **inputs: Any) -> AsyncIterator[StageEvent]:
+        """
+        Run the pipeline, yielding a `StageEvent` as each stage completes.
+
+        Closing the generator early (e.g. the client disconnected) cancels every
+        stage still in flight.
+        """
+        ctx = PipelineContext(inputs)
+        required = self._required(targets)
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        t0 = time.perf_counter()
+
+        async def run_stage(stage: Stage) -> StageEvent:
+            start = time.perf_counter()
+            kwargs = {dep: results[dep] for dep in stage.depends_on}
+            try:
+                result = await stage.func(ctx, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                raise
+            end = time.perf_counter()
+            return StageEvent(stage.name, result, (start - t0) * 1000, (end - start) * 1000)
+
+        def launch_ready() -> Set[asyncio.Task]:
+            launched = set()
+            for name in required:
+                stage = self.stages[name]
+                if name not in tasks and all(dep in results for dep in stage.depends_on):
+                    tasks[name] = asyncio.create_task(run_stage(stage))
+                    launched.add(tasks[name])
+            return launched
+
+        pending = launch_ready()
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Preserve declaration order among stages that finished together
+                events = sorted((task.result() for task in done), key=lambda e: list(self.stages).index(e.name))
+                for event in events:
+                    results[event.name] = event.result
+                for event in events:
+                    yield event
+                pending |= launch_ready()
+        finally:
+            for task in pending:
+                task.cancel()
+            ctx.close()
+
+    async def run(self, targets: Optional[Iterable[str]] = None, **inputs: Any) -> PipelineRun:
+        """Run to completion and return all results with per-stage timings"""
+        t0 = time.perf_counter()
+        run = PipelineRun(results={}, timings={})
+        async for event in self.stream(targets, **inputs):
+            run.results[event.name] = event.result
+            run.timings[event.name] = {
+                "start_ms": round(event.start_ms, 1),
+                "duration_ms": round(event.duration_ms, 1),
+            }
+        run.total_ms = round((time.perf_counter() - t0) * 1000, 1)
+        return run
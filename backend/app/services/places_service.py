@@ -1,53 +1,143 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import AsyncIterator, List, Dict, Any, Optional
 import httpx
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.singleflight import singleflight
+from app.services.places_store import PAGE_SIZE, places_store
+
+# Nearby Search stops after three pages, with or without more places
+MAX_RESULTS = 3 * PAGE_SIZE
+
+
+def _nearby_key(self, lat: float, lng: float, radius: int = 1000, keyword: str = "food", type: str = None, limit: int = PAGE_SIZE):
+    return (round(float(lat), 6), round(float(lng), 6), radius, (keyword or "").strip().lower(), type, limit)
 
 class PlacesService:
     BASE_URL = "https://maps.googleapis.com/maps/api/place"
 
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=settings.PLACES_TIMEOUT)
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @singleflight("places_nearby", key=_nearby_key)
     async def search_nearby(
         self, 
         lat: float, 
         lng: float, 
         radius: int = 1000, 
         keyword: str = "food",
-        type: str = None
+        type: str = None,
+        limit: int = PAGE_SIZE
     ) -> List[Dict[str, Any]]:
         """
-        Search for nearby places using Google Places API
+        Search for nearby places using Google Places API.
+        The default `limit` reads the first page only; see `iter_nearby`.
+        """
+        return [place async for place in self.iter_nearby(lat, lng, radius, keyword, type, limit)]
+
+    async def _next_page(self, token: str) -> Dict[str, Any]:
+        """A `next_page_token` page; the token answers INVALID_REQUEST until Google activates it"""
+        await asyncio.sleep(settings.PLACES_PAGE_TOKEN_DELAY)
+        for attempt in range(settings.PLACES_PAGE_TOKEN_RETRIES + 1):
+            response = await self.get_client().get(
+                f"{self.BASE_URL}/nearbysearch/json",
+                params={"pagetoken": token, "key": settings.GOOGLE_MAPS_API_KEY},
+            )
+            data = response.json()
+            if data.get("status") != "INVALID_REQUEST" or attempt == settings.PLACES_PAGE_TOKEN_RETRIES:
+                return data
+            await asyncio.sleep(0.5 * (attempt + 1))
+        return data
+
+    async def iter_nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius: int = 1000,
+        keyword: str = "food",
+        type: str = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
+        Places as each Nearby Search page arrives, following `next_page_token`
+        up to `limit` places (the API's 60 at most). Stopping early skips the
+        remaining pages. Queries inside an earlier complete search are
+        answered from `places_store`.
+        """
+        limit = MAX_RESULTS if limit is None else min(limit, MAX_RESULTS)
         if not settings.GOOGLE_MAPS_API_KEY:
             # Return dummy data if no key is present for dev/demo purposes 
             # or raise error if strict. Let's return dummy for hackathon safety.
-            return self._get_dummy_competitors(lat, lng)
-
-        async with httpx.AsyncClient() as client:
-            params = {
-                "location": f"{lat},{lng}",
-                "radius": radius,
-                "key": settings.GOOGLE_MAPS_API_KEY
-            }
-            if keyword:
-                params["keyword"] = keyword
-            if type:
-                params["type"] = type
+            for place in self._get_dummy_competitors(lat, lng)[:limit]:
+                yield place
+            return
+
+        local = places_store.lookup(lat, lng, radius, keyword, type)
+        if local is not None:
+            for place in local[:limit]:
+                yield place
+            return
+
+        params = {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "key": settings.GOOGLE_MAPS_API_KEY
+        }
+        if keyword:
+            params["keyword"] = keyword
+        if type:
+            params["type"] = type
 
+        places: List[Dict[str, Any]] = []
+        complete = False
+        try:
             try:
-                response = await client.get(f"{self.BASE_URL}/nearbysearch/json", params=params)
+                response = await self.get_client().get(f"{self.BASE_URL}/nearbysearch/json", params=params)
                 data = response.json()
-                
+            except Exception as e:
+                print(f"Places Service Exception: {e}")
+                data = {"status": "REQUEST_FAILED", "error_message": str(e)}
+
+            while True:
                 if data.get("status") not in ["OK", "ZERO_RESULTS"]:
                     print(f"Places API Error: {data.get('status')} - {data.get('error_message')}")
-                    # Fallback to dummy if API fails (e.g. quota, invalid key)
-                    return self._get_dummy_competitors(lat, lng)
-                
-                results = data.get("results", [])
-                return self._format_places(results)
+                    if not places:
+                        # Fallback to dummy if API fails (e.g. quota, invalid key)
+                        for place in self._get_dummy_competitors(lat, lng)[:limit]:
+                            yield place
+                    return
 
-            except Exception as e:
-                print(f"Places Service Exception: {e}")
-                return self._get_dummy_competitors(lat, lng)
+                for place in self._format_places(data.get("results", [])):
+                    if len(places) >= limit:
+                        return
+                    places.append(place)
+                    yield place
+
+                token = data.get("next_page_token")
+                if not token:
+                    # The last page; short of the API cap it covers the whole circle
+                    complete = len(places) < MAX_RESULTS
+                    return
+                if len(places) >= limit:
+                    return
+                try:
+                    data = await self._next_page(token)
+                except Exception as e:
+                    print(f"Places Service Exception: {e}")
+                    return
+        finally:
+            if places:
+                places_store.add(lat, lng, radius, keyword, type, places, complete=complete)
 
     def _format_places(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         formatted = []
@@ -0,0 +1,169 @@
+"""
+Local spatial store for Google Places Nearby Search results.
+
+Every place a nearby search returns is kept with its fetch time on a fixed
+lat/lng lattice (GRID_DEG cells), per query filter (keyword + type), along
+with the circle that was searched. A later `(lat, lng, radius)` query that
+lies inside one fresh, complete earlier circle for the same filter is
+answered from the lattice: a handful of cell lookups and one vectorised
+distance filter, no upstream call.
+
+A circle only counts as coverage when its search was complete (fewer than a
+full page, or every page followed); a capped first page says nothing about
+the places beyond it. Entries expire after PLACES_STORE_TTL_SECONDS.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geo import METERS_PER_DEGREE_LAT, haversine_m
+
+# ~550 m lattice cells; a 1 km query touches about 25 of them
+GRID_DEG = 0.005
+# Results per Nearby Search page; a full page may have more behind it
+PAGE_SIZE = 20
+
+Cell = Tuple[int, int]
+
+
+def filter_key(keyword: Optional[str], type: Optional[str]) -> Tuple[str, str]:
+    return (keyword or "").strip().lower(), type or ""
+
+
+def _cells(lat: float, lng: float, radius: float) -> List[Cell]:
+    d_lat = radius / METERS_PER_DEGREE_LAT
+    d_lng = d_lat / max(math.cos(math.radians(lat)), 0.01)
+    rows = range(math.floor((lat - d_lat) / GRID_DEG), math.floor((lat + d_lat) / GRID_DEG) + 1)
+    cols = range(math.floor((lng - d_lng) / GRID_DEG), math.floor((lng + d_lng) / GRID_DEG) + 1)
+    return [(r, c) for r in rows for c in cols]
+
+
+class _Layer:
+    """Searched circles and lattice membership for one query filter"""
+
+    def __init__(self):
+        self.circles: List[Tuple[float, float, float, float]] = []  # lat, lng, radius, fetched_at
+        self._circle_array: Optional[np.ndarray] = None
+        self.cells: Dict[Cell, Set[str]] = {}
+
+    def add_circle(self, lat: float, lng: float, radius: float, fetched_at: float, cutoff: float):
+        self.circles = [c for c in self.circles if c[3] >= cutoff][-(settings.PLACES_STORE_MAX_CIRCLES - 1):]
+        self.circles.append((lat, lng, radius, fetched_at))
+        self._circle_array = None
+
+    def covers(self, lat: float, lng: float, radius: float, cutoff: float) -> bool:
+        if not self.circles:
+            return False
+        if self._circle_array is None:
+            self._circle_array = np.array(self.circles)
+        c = self._circle_array
+        inside = haversine_m(lat, lng, c[:, 0], c[:, 1]) + radius <= c[:, 2]
+        return bool(np.any(inside & (c[:, 3] >= cutoff)))
+
+
+class PlacesStore:
+    def __init__(self):
+        self._places: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._layers: Dict[Tuple[str, str], _Layer] = {}
+        self.queries = 0
+        self.local = 0
+
+    @property
+    def _cutoff(self) -> float:
+        return time.time() - settings.PLACES_STORE_TTL_SECONDS
+
+    def lookup(self, lat: float, lng: float, radius: float, keyword: Optional[str], type: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Places within `radius`, nearest first, if earlier searches fully cover the query; else None"""
+        self.queries += 1
+        cutoff = self._cutoff
+        layer = self._layers.get(filter_key(keyword, type))
+        if layer is None or not layer.covers(lat, lng, radius, cutoff):
+            return None
+
+        ids = [
+            pid
+            for cell in _cells(lat, lng, radius)
+            for pid in layer.cells.get(cell, ())
+            if self._fetched_at.get(pid, 0.0) >= cutoff
+        ]
+        self.local += 1
+        if not ids:
+            return []
+        places = [self._places[pid] for pid in ids]
+        coords = np.array([(p["lat"], p["lng"]) for p in places])
+        dist = haversine_m(lat, lng, coords[:, 0], coords[:, 1])
+        return [dict(places[i]) for i in np.argsort(dist, kind="stable") if dist[i] <= radius]
+
+    def add(
+        self,
+        lat: float,
+        lng: float,
+        radius: float,
+        keyword: Optional[str],
+        type: Optional[str],
+        places: List[Dict[str, Any]],
+        complete: bool,
+    ):
+        """Keep `places` from one search; `complete` searches also become coverage for later queries"""
+        now = time.time()
+        cutoff = now - settings.PLACES_STORE_TTL_SECONDS
+        layer = self._layers.setdefault(filter_key(keyword, type), _Layer())
+        returned = {p["id"] for p in places if p.get("id")}
+
+        if complete:
+            # Places this filter used to return inside the circle but no longer does have closed or moved
+            for cell in _cells(lat, lng, radius):
+                members = layer.cells.get(cell)
+                if not members:
+                    continue
+                for pid in [pid for pid in members if pid not in returned and pid in self._places]:
+                    p = self._places[pid]
+                    if haversine_m(lat, lng, p["lat"], p["lng"]) <= radius:
+                        members.discard(pid)
+            layer.add_circle(lat, lng, radius, now, cutoff)
+
+        for place in places:
+            pid = place.get("id")
+            if not pid:
+                continue
+            self._places[pid] = place
+            self._fetched_at[pid] = now
+            layer.cells.setdefault((math.floor(place["lat"] / GRID_DEG), math.floor(place["lng"] / GRID_DEG)), set()).add(pid)
+
+        if len(self._places) > settings.PLACES_STORE_MAX_PLACES:
+            self.prune()
+
+    def prune(self):
+        """Drop expired places and circles; if still over the limit, start over"""
+        cutoff = self._cutoff
+        expired = {pid for pid, t in self._fetched_at.items() if t < cutoff}
+        for pid in expired:
+            del self._places[pid], self._fetched_at[pid]
+        for layer in self._layers.values():
+            layer.circles = [c for c in layer.circles if c[3] >= cutoff]
+            layer._circle_array = None
+            for members in layer.cells.values():
+                members -= expired
+        if len(self._places) > settings.PLACES_STORE_MAX_PLACES:
+            print(f"Places store over {settings.PLACES_STORE_MAX_PLACES} fresh places, clearing")
+            self._places.clear()
+            self._fetched_at.clear()
+            self._layers.clear()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "places": len(self._places),
+            "filters": len(self._layers),
+            "circles": sum(len(layer.circles) for layer in self._layers.values()),
+            "queries": self.queries,
+            "served_locally": self.local,
+            "local_share": round(self.local / self.queries, 4) if self.queries else 0.0,
+            "ttl_seconds": settings.PLACES_STORE_TTL_SECONDS,
+        }
+
+
+places_store = PlacesStore()
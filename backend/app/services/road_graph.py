@@ -0,0 +1,265 @@
+"""
+Offline road network for junction-aware traffic factors.
+
+An OSM extract (`.osm` XML, read once with `iterparse`) is compiled into a
+compact array-backed graph: node coordinates projected to local metres, a
+CSR adjacency (`indptr` / `indices`) with per-edge length and road class, and
+a `cKDTree` over the nodes. The compiled arrays can be saved as `.npz` and
+loaded back without re-parsing.
+
+For a site, the nearest node is found through the tree, then every street
+leaving it is followed outwards, straight ahead at each junction, and the
+junctions met on the way are typed for `junction_probability`:
+
+* `B` - a bend of more than `TURN_DEGREES` on a through street
+* `P` - a T-junction (three ways)
+* `JK` - a crossing of small roads (four or more ways)
+* `M` - a junction passed along a main road
+
+A street that ends in a dead end brings no through traffic and is dropped.
+A path that runs out of APPROACH_METERS (or loops back) before meeting
+MAX_JUNCTIONS junctions is padded with `PAD_JUNCTION`, the type that lets
+the fewest pedestrians through, so a site on a cul-de-sac never outscores
+one with real junctions all around it.
+
+The traffic factor of a site is the mean `probabilistic_traffic` over its
+remaining approach paths. Results are memoised per node.
+"""
+import functools
+import math
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+from app.core.cache import stable_hash
+from app.core.config import settings
+from app.core.geo import METERS_PER_DEGREE_LAT
+from app.services.traffic_probability import DEFAULT_JUNCTIONS, JUNCTION_FACTORS, probabilistic_traffic
+
+MAIN_ROADS = {
+    "motorway", "trunk", "primary", "secondary", "tertiary",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+}
+# `highway=*` values that are not (yet) usable ways
+IGNORED_HIGHWAYS = {"proposed", "construction", "abandoned", "platform", "raceway", "bus_stop"}
+
+# A site further than this from any node is outside the extract
+SNAP_METERS = 150.0
+# How far out an approach path is followed
+APPROACH_METERS = 400.0
+# Junctions that matter per approach path (the default chain has three)
+MAX_JUNCTIONS = len(DEFAULT_JUNCTIONS)
+# Fills approach paths that met fewer than MAX_JUNCTIONS junctions
+PAD_JUNCTION = min(JUNCTION_FACTORS, key=JUNCTION_FACTORS.get)
+TURN_DEGREES = 45.0
+TURN_COS = math.cos(math.radians(TURN_DEGREES))
+
+
+class RoadGraph:
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lng: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        length: np.ndarray,
+        main: np.ndarray,
+    ):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.length = np.asarray(length, dtype=np.float32)
+        self.main = np.asarray(main, dtype=bool)
+
+        # Equirectangular projection around the extract's mean latitude; fine at city scale
+        self.lat0 = float(self.lat.mean()) if len(self.lat) else 0.0
+        self._kx = METERS_PER_DEGREE_LAT * math.cos(math.radians(self.lat0))
+        self.xy = np.column_stack([self.lng * self._kx, self.lat * METERS_PER_DEGREE_LAT])
+        self.degree = np.diff(self.indptr)
+        self.tree = cKDTree(self.xy)
+        self.junction_chains = functools.lru_cache(maxsize=65536)(self._junction_chains)
+        # Identifies this compiled extract in cache keys derived from node indices
+        self.signature = stable_hash(self.nodes, self.edges, float(self.lat.sum()), float(self.lng.sum()))[:16]
+        self._csr: Optional[csr_matrix] = None
+
+    @property
+    def nodes(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def csr(self) -> csr_matrix:
+        """Edge lengths as a sparse matrix over the same CSR arrays, for `scipy.sparse.csgraph`"""
+        if self._csr is None:
+            self._csr = csr_matrix((self.length, self.indices, self.indptr), shape=(self.nodes, self.nodes))
+        return self._csr
+
+    @classmethod
+    def from_edges(cls, lat: np.ndarray, lng: np.ndarray, u: np.ndarray, v: np.ndarray, main: np.ndarray) -> "RoadGraph":
+        """Build the CSR graph from undirected edges (u, v) between node indices"""
+        lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+        u, v, main = np.asarray(u), np.asarray(v), np.asarray(main, dtype=bool)
+        keep = u != v
+        src = np.concatenate([u[keep], v[keep]])
+        dst = np.concatenate([v[keep], u[keep]])
+        cls_main = np.concatenate([main[keep], main[keep]])
+        # Sorted by (src, dst); ways sharing a segment would otherwise inflate node degrees
+        _, first = np.unique(np.column_stack([src, dst]), axis=0, return_index=True)
+        src, dst, cls_main = src[first], dst[first], cls_main[first]
+
+        kx = METERS_PER_DEGREE_LAT * math.cos(math.radians(float(lat.mean()) if len(lat) else 0.0))
+        length = np.hypot((lng[dst] - lng[src]) * kx, (lat[dst] - lat[src]) * METERS_PER_DEGREE_LAT)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(lat)))])
+        return cls(lat, lng, indptr, dst, length, cls_main)
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """Compile an OSM XML extract: two streaming passes, ways first, then only the nodes they use"""
+        ways: List[Tuple[List[int], bool]] = []
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                highway = tags.get("highway")
+                if highway and highway not in IGNORED_HIGHWAYS:
+                    refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    if len(refs) > 1:
+                        ways.append((refs, highway in MAIN_ROADS))
+            if elem.tag in ("node", "way", "relation"):
+                elem.clear()
+
+        wanted = {ref for refs, _ in ways for ref in refs}
+        index: Dict[int, int] = {}
+        lat: List[float] = []
+        lng: List[float] = []
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                node_id = int(elem.get("id"))
+                if node_id in wanted:
+                    index[node_id] = len(lat)
+                    lat.append(float(elem.get("lat")))
+                    lng.append(float(elem.get("lon")))
+            if elem.tag in ("node", "way", "relation"):
+                elem.clear()
+
+        u: List[int] = []
+        v: List[int] = []
+        main: List[bool] = []
+        for refs, is_main in ways:
+            for a, b in zip(refs, refs[1:]):
+                # Ways clipped by the extract boundary reference nodes it doesn't contain
+                if a in index and b in index:
+                    u.append(index[a])
+                    v.append(index[b])
+                    main.append(is_main)
+        return cls.from_edges(np.array(lat), np.array(lng), np.array(u, dtype=np.int64), np.array(v, dtype=np.int64), np.array(main))
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        if path.endswith(".npz"):
+            data = np.load(path)
+            return cls(data["lat"], data["lng"], data["indptr"], data["indices"], data["length"], data["main"])
+        return cls.from_osm(path)
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path, lat=self.lat, lng=self.lng, indptr=self.indptr,
+            indices=self.indices, length=self.length, main=self.main,
+        )
+
+    def nearest_node(self, lat: float, lng: float) -> Optional[int]:
+        dist, node = self.tree.query((lng * self._kx, lat * METERS_PER_DEGREE_LAT))
+        return int(node) if dist <= SNAP_METERS else None
+
+    def _walk(self, start: int, first_edge: int) -> Optional[List[str]]:
+        """
+        Junction types met following a street out of `start`, straight on at
+        each junction, padded to MAX_JUNCTIONS with PAD_JUNCTION; None when
+        the street is a dead end
+        """
+        chain: List[str] = []
+        prev, node = start, int(self.indices[first_edge])
+        main = bool(self.main[first_edge])
+        travelled = float(self.length[first_edge])
+        seen = {start}
+        while travelled <= APPROACH_METERS and len(chain) < MAX_JUNCTIONS and node not in seen:
+            seen.add(node)
+            lo, hi = int(self.indptr[node]), int(self.indptr[node + 1])
+            neighbours = self.indices[lo:hi]
+            onward = np.flatnonzero(neighbours != prev)
+            if not len(onward):
+                return None  # dead end
+            # Straightest continuation: largest cosine between the heading and each onward street
+            heading = self.xy[node] - self.xy[prev]
+            out = self.xy[neighbours[onward]] - self.xy[node]
+            norms = np.hypot(out[:, 0], out[:, 1]) * math.hypot(heading[0], heading[1])
+            cos = (out @ heading) / np.maximum(norms, 1e-9)
+            k = int(cos.argmax())
+            edge = lo + int(onward[k])
+            if hi - lo == 2:
+                if cos[k] < TURN_COS:
+                    chain.append("B")
+            elif main and self.main[edge]:
+                chain.append("M")
+            else:
+                chain.append("P" if hi - lo == 3 else "JK")
+            prev, node = node, int(self.indices[edge])
+            main = bool(self.main[edge])
+            travelled += float(self.length[edge])
+        return chain + [PAD_JUNCTION] * (MAX_JUNCTIONS - len(chain))
+
+    def _junction_chains(self, node: int) -> Tuple[Tuple[str, ...], ...]:
+        walks = (self._walk(node, e) for e in range(self.indptr[node], self.indptr[node + 1]))
+        return tuple(tuple(chain) for chain in walks if chain is not None)
+
+    def site_junctions(self, lat: float, lng: float) -> Optional[List[List[str]]]:
+        """
+        Junction chain of every approach path to the site that is not a dead
+        end; None outside the extract
+        """
+        node = self.nearest_node(lat, lng)
+        if node is None or self.degree[node] == 0:
+            return None
+        return [list(chain) for chain in self.junction_chains(node)]
+
+
+# Loaded once at startup (see `load_road_graph`); None when no extract is configured
+road_graph: Optional[RoadGraph] = None
+
+
+def load_road_graph() -> Optional[RoadGraph]:
+    """Blocking load of ROAD_GRAPH_PATH; call from a worker thread"""
+    global road_graph
+    if road_graph is None and settings.ROAD_GRAPH_PATH:
+        start = time.perf_counter()
+        try:
+            road_graph = RoadGraph.load(settings.ROAD_GRAPH_PATH)
+            print(f"Road graph loaded: {road_graph.nodes} nodes, {road_graph.edges} edges in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"Road graph load failed ({settings.ROAD_GRAPH_PATH}): {e}")
+    return road_graph
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    return road_graph
+
+
+def site_traffic(lat: Optional[float], lng: Optional[float]) -> Tuple[float, Optional[List[List[str]]]]:
+    """
+    (traffic factor, approach junction chains) for a site; falls back to
+    `DEFAULT_JUNCTIONS` when there is no graph, the site is outside it or
+    every approach is a dead end.
+    """
+    graph = get_road_graph()
+    if graph is not None and lat is not None and lng is not None:
+        chains = graph.site_junctions(float(lat), float(lng))
+        if chains:
+            return float(np.mean([probabilistic_traffic(1.0, chain) for chain in chains])), chains
+    return probabilistic_traffic(1.0, DEFAULT_JUNCTIONS), None
@@ -0,0 +1,132 @@
+"""
+What-if sweeps over a saved analysis.
+
+Besides `business_params`, the metrics only depend on what the analysis
+document already stores: the Gemini area distribution, the screenshot
+geometry and the weather that was used. A grid over building width,
+operating hours and price is therefore one `compute_metrics` call, with no
+vision, geocode or weather request.
+"""
+import math
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.core.exceptions import ValidationError
+from app.schemas.schemas import Analysis, SweepAxis, SweepRequest
+from app.services.metrics_engine import GLOBAL_AVERAGE_DENSITY, competitor_factor, compute_metrics, screenshot_area
+from app.services.traffic_probability import DEFAULT_JUNCTIONS, business_traffic_hours, probabilistic_traffic
+from app.services.weather_probability import WEATHER_VIC
+
+SWEEP_AXES = ("buildingWidth", "operatingHours", "productPrice")
+MAX_SWEEP_POINTS = 50_000
+
+# Engine output -> response name, decimals
+GRID_METRICS = {
+    "monthlyRevenue": ("monthlyRevenue", 0),
+    "dailyRevenue": ("dailyRevenue", 0),
+    "buyers": ("tppd", 0),
+    "apt": ("apt", 0),
+    "locationScore": ("locationScore", 2),
+    "riskScore": ("riskScore", 3),
+}
+
+
+def _axis_values(axis: Optional[SweepAxis], stored: float) -> np.ndarray:
+    if axis is None:
+        return np.array([stored], dtype=np.float64)
+    if axis.values is not None:
+        return np.asarray(axis.values, dtype=np.float64)
+    return np.linspace(axis.start, axis.stop, axis.steps)
+
+
+def _rounded(values: np.ndarray, decimals: int) -> Any:
+    return np.round(values, decimals).tolist()
+
+
+def sweep_analysis(analysis: Analysis, request: SweepRequest) -> Dict[str, Any]:
+    """Metric grid over the requested `business_params` axes, plus break-even and optimum markers"""
+    start = time.perf_counter()
+    data = analysis.data or {}
+    area = (analysis.gemini_analysis or {}).get("area_distribution")
+    params = data.get("business_params")
+    metadata = data.get("screenshot_metadata")
+    if not area or not params or not metadata:
+        raise ValidationError("Analysis has no stored area distribution, business params and screenshot geometry to sweep")
+
+    try:
+        axes = {name: _axis_values(getattr(request, name), float(params[name])) for name in SWEEP_AXES}
+        _, _, area_sq_m = screenshot_area(metadata)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValidationError(f"Stored analysis is missing sweep inputs: {e}")
+
+    shape = tuple(len(values) for values in axes.values())
+    if math.prod(shape) > MAX_SWEEP_POINTS:
+        raise ValidationError(f"Sweep grid has {math.prod(shape)} points, limit is {MAX_SWEEP_POINTS}")
+
+    # Sparse open grid: each axis keeps its own dimension and broadcasting fills the rest
+    bw, oh, price = np.meshgrid(*axes.values(), indexing="ij", sparse=True)
+    stored = data.get("metrics") or {}
+    weather = stored.get("weatherUsed")
+    m = compute_metrics(
+        bw, oh, price,
+        residential=area["residential"],
+        road=area["road"],
+        area_sq_m=area_sq_m,
+        population_density=area.get("estimated_population_density", GLOBAL_AVERAGE_DENSITY),
+        competitor=stored.get("competitorFactor", competitor_factor(area.get("competitor_density_estimate"))),
+        weather_factor=stored.get("weatherFactor", WEATHER_VIC.get(weather, 1.0)),
+        traffic_factor=stored.get("trafficFactor", probabilistic_traffic(1.0, DEFAULT_JUNCTIONS)),
+        # Cumulative profile lookups, so the hours axis costs nothing extra
+        traffic_hours=business_traffic_hours(params, area["residential"], area["road"], operating_hours=oh),
+        cglp_density=stored.get("cglpDensity", GLOBAL_AVERAGE_DENSITY),
+    )
+
+    grid = {
+        out_name: _rounded(np.broadcast_to(m[name], shape), decimals)
+        for name, (out_name, decimals) in GRID_METRICS.items()
+    }
+
+    has_costs = request.monthlyCost is not None or request.hourlyCost > 0
+    monthly_cost = (request.monthlyCost or 0.0) + request.hourlyCost * oh * 30
+    profit = np.broadcast_to(m["monthlyRevenue"] - monthly_cost, shape)
+
+    break_even = None
+    if has_costs:
+        grid["monthlyProfit"] = _rounded(profit, 0)
+        # Revenue is linear in price, so the break-even price per (width, hours) is closed-form
+        monthly_buyers = np.broadcast_to(m["buyers"] * 30, shape[:2] + (1,))[..., 0]
+        cost = np.broadcast_to(monthly_cost, shape[:2] + (1,))[..., 0]
+        with np.errstate(divide="ignore"):
+            price_be = np.where(monthly_buyers > 0, cost / monthly_buyers, np.inf)
+        break_even = {
+            "monthlyCost": request.monthlyCost or 0.0,
+            "hourlyCost": request.hourlyCost,
+            "profitableShare": round(float((profit >= 0).mean()), 4),
+            # Rows: buildingWidth, columns: operatingHours; null = no buyers at any price
+            "productPrice": [[None if math.isinf(v) else round(v) for v in row] for row in price_be.tolist()],
+        }
+
+    objective = profit if request.objective == "monthlyProfit" else np.broadcast_to(m[request.objective], shape)
+    idx = np.unravel_index(int(np.argmax(objective)), shape)
+    optimum = {
+        "objective": request.objective,
+        "value": round(float(objective[idx]), 2),
+        "params": {name: float(values[i]) for (name, values), i in zip(axes.items(), idx)},
+        "metrics": {
+            out_name: round(float(np.broadcast_to(m[name], shape)[idx]), decimals)
+            for name, (out_name, decimals) in GRID_METRICS.items()
+        },
+    }
+
+    return {
+        "analysis_id": analysis.id,
+        "axes": {name: values.tolist() for name, values in axes.items()},
+        "shape": list(shape),
+        "grid": grid,
+        "breakEven": break_even,
+        "optimum": optimum,
+        "weatherUsed": weather,
+        "timings": {"compute_ms": round((time.perf_counter() - start) * 1000, 2)},
+    }
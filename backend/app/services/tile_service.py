@@ -0,0 +1,144 @@
+"""
+Server-side map tiles for areas the user never screenshotted (heatmap cells).
+
+Tiles come from `MAP_TILE_URL` over one pooled client that identifies itself
+with `MAP_TILE_USER_AGENT`; with either unset, `require_source` refuses the
+job up front rather than falling back to a public tile server. Raw tiles are
+kept in a small LRU because neighbouring cells share them, and single-flight
+stops concurrent cells fetching the same tile twice.
+"""
+import asyncio
+import io
+import math
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import httpx
+from PIL import Image
+
+from app.core.config import settings
+from app.core.exceptions import ExternalServiceError
+from app.core.geo import TILE_SIZE, meters_per_pixel, to_global_pixel
+from app.core.singleflight import get_singleflight
+
+
+NOT_CONFIGURED = (
+    "Map tiles are not configured: set MAP_TILE_URL to a self-hosted or commercial tile server "
+    "and MAP_TILE_USER_AGENT to the app name with contact details"
+)
+
+
+class TileService:
+    def __init__(
+        self,
+        url_template: Optional[str] = None,
+        max_zoom: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        cache_tiles: Optional[int] = None,
+        user_agent: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url_template = url_template or settings.MAP_TILE_URL
+        self.max_zoom = max_zoom or settings.MAP_TILE_MAX_ZOOM
+        self.max_connections = max_connections or settings.MAP_TILE_MAX_CONNECTIONS
+        self.cache_tiles = cache_tiles or settings.MAP_TILE_CACHE_TILES
+        self.user_agent = user_agent or settings.MAP_TILE_USER_AGENT
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tiles: "OrderedDict[Tuple[int, int, int], bytes]" = OrderedDict()
+        self._flight = get_singleflight("map_tiles")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=settings.MAP_TILE_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"User-Agent": self.user_agent},
+                transport=self._transport,
+            )
+        return self._client
+
+    @property
+    def configured(self) -> bool:
+        """A tile server and a User-Agent with contact details are set"""
+        return bool(self.url_template and self.user_agent)
+
+    def require_source(self):
+        if not self.configured:
+            raise ExternalServiceError(NOT_CONFIGURED)
+
+    async def fetch_tile(self, z: int, x: int, y: int) -> bytes:
+        key = (z, x, y)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        return await self._flight.do((self.url_template, *key), lambda: self._download(z, x, y))
+
+    async def _download(self, z: int, x: int, y: int) -> bytes:
+        self.require_source()
+        url = self.url_template.format(z=z, x=x % (2 ** z), y=y)
+        try:
+            resp = await self.client.get(url)
+        except httpx.HTTPError as e:
+            raise ExternalServiceError(f"Tile request failed: {e}")
+        if resp.status_code != 200:
+            raise ExternalServiceError(f"Tile server error {resp.status_code} for {z}/{x}/{y}")
+
+        self._tiles[(z, x, y)] = resp.content
+        while len(self._tiles) > self.cache_tiles:
+            self._tiles.popitem(last=False)
+        return resp.content
+
+    def zoom_for(self, lat: float, size_m: float) -> int:
+        """Highest zoom (<= max_zoom) at which `size_m` fits in one tile's worth of pixels"""
+        zoom = self.max_zoom
+        while zoom > 0 and size_m / meters_per_pixel(lat, zoom) > TILE_SIZE:
+            zoom -= 1
+        return zoom
+
+    async def render_area(self, lat: float, lng: float, size_m: float) -> Image.Image:
+        """A square image of `size_m` metres centred on (lat, lng), stitched from at most 2x2 tiles"""
+        zoom = self.zoom_for(lat, size_m)
+        cx, cy = to_global_pixel(lat, lng, zoom)
+        half = size_m / meters_per_pixel(lat, zoom) / 2
+        x0, y0, x1, y1 = cx - half, cy - half, cx + half, cy + half
+
+        tx0, ty0 = math.floor(x0 / TILE_SIZE), math.floor(y0 / TILE_SIZE)
+        tx1, ty1 = math.floor((x1 - 1e-9) / TILE_SIZE), math.floor((y1 - 1e-9) / TILE_SIZE)
+        coords = [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+        tiles = await asyncio.gather(*(self.fetch_tile(zoom, tx, ty) for tx, ty in coords))
+
+        def stitch() -> Image.Image:
+            canvas = Image.new("RGB", ((tx1 - tx0 + 1) * TILE_SIZE, (ty1 - ty0 + 1) * TILE_SIZE))
+            for (tx, ty), data in zip(coords, tiles):
+                canvas.paste(Image.open(io.BytesIO(data)).convert("RGB"), ((tx - tx0) * TILE_SIZE, (ty - ty0) * TILE_SIZE))
+            left, top = x0 - tx0 * TILE_SIZE, y0 - ty0 * TILE_SIZE
+            return canvas.crop((round(left), round(top), round(left + 2 * half), round(top + 2 * half)))
+
+        return await asyncio.to_thread(stitch)
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# Lazy singleton shared by every service in the worker
+tile_service: Optional[TileService] = None
+
+
+def get_tile_service() -> TileService:
+    global tile_service
+    if tile_service is None:
+        tile_service = TileService()
+    return tile_service
+
+
+async def close_tile_service():
+    if tile_service is not None:
+        await tile_service.close()
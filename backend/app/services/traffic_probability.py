@@ -1,14 +1,28 @@
-from typing import List
+import functools
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Turn, T-junction, turn: the junction sequence assumed when no road data is available
+DEFAULT_JUNCTIONS = ["B", "P", "B"]
+
+# Share of each passing pedestrian who continues past a junction of this type
+JUNCTION_FACTORS = {
+    "B": 0.5,      # Turn
+    "P": 1/3,      # T-junction
+    "JK": 0.4,     # small road
+    "M": 0.8,      # main road (also the default for unknown types)
+}
+
+# Prior mix of junction types used when sampling unknown road layouts
+JUNCTION_MIX = {"B": 0.4, "P": 0.3, "JK": 0.2, "M": 0.1}
 
 def junction_probability(junction_type: str) -> float:
-    if junction_type == "B":      # Turn
-        return 0.5
-    elif junction_type == "P":    # T-junction
-        return 1/3
-    elif junction_type == "JK":   # small road
-        return 0.4
-    else:                         # main road default
-        return 0.8
+    return JUNCTION_FACTORS.get(junction_type, JUNCTION_FACTORS["M"])
 
 
 def probabilistic_traffic(initial_traffic: float, junctions: List[str]) -> float:
@@ -17,3 +31,87 @@ def probabilistic_traffic(initial_traffic: float, junctions: List[str]) -> float
         prob *= junction_probability(j)
 
     return initial_traffic * prob
+
+
+DEFAULT_OPENING_HOUR = 8
+DEFAULT_PROFILES_PATH = Path(__file__).resolve().parent.parent / "data" / "traffic_profiles.json"
+
+
+class TrafficProfiles:
+    """
+    Hourly pedestrian-intensity curves per area type.
+
+    Each curve is rescaled to a 24h mean of 1, so a flat curve reproduces the
+    old `operatingHours * 3600`. The curves are precomputed into cumulative
+    arrays: the traffic-hours of any opening window (fractional hours and
+    windows past midnight included) are two lookups, for scalars or arrays.
+    """
+
+    def __init__(self, profiles: Dict[str, List[float]]):
+        self.types = [name for name in profiles if not name.startswith("_")]
+        curves = np.array([profiles[name] for name in self.types], dtype=np.float64)
+        if curves.ndim != 2 or curves.shape[1] != 24 or (curves < 0).any() or (curves.sum(axis=1) <= 0).any():
+            raise ValueError("Traffic profiles need 24 non-negative hourly values per area type")
+        self.curves = curves / curves.mean(axis=1, keepdims=True)
+        # cumulative[t, h] = traffic-hours from midnight to hour h (h = 0..24)
+        self.cumulative = np.concatenate([np.zeros((len(self.types), 1)), np.cumsum(self.curves, axis=1)], axis=1)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "TrafficProfiles":
+        with open(path or DEFAULT_PROFILES_PATH) as f:
+            return cls(json.load(f))
+
+    def index(self, area_type: str) -> int:
+        try:
+            return self.types.index(area_type)
+        except ValueError:
+            raise ValueError(f"Unknown area type '{area_type}', expected one of {self.types}")
+
+    def classify(self, residential: Any, road: Any) -> np.ndarray:
+        """Area-type index per scenario from the land-cover shares (percentages)"""
+        residential = np.asarray(residential, dtype=np.float64)
+        road = np.asarray(road, dtype=np.float64)
+        return np.where(
+            residential >= 50, self.index("residential"),
+            np.where(road >= 25, self.index("commercial"), self.index("mixed")),
+        )
+
+    def _since_midnight(self, t: np.ndarray, idx: np.ndarray) -> np.ndarray:
+        day, rem = np.divmod(t, 24.0)
+        hour = np.minimum(rem.astype(np.int64), 23)
+        return day * self.cumulative[idx, 24] + self.cumulative[idx, hour] + (rem - hour) * self.curves[idx, hour]
+
+    def traffic_hours(self, opening_hour: Any, operating_hours: Any, idx: Any) -> np.ndarray:
+        """Profile-weighted hours of [opening_hour, opening_hour + operating_hours)"""
+        opening = np.mod(np.asarray(opening_hour, dtype=np.float64), 24.0)
+        hours = np.clip(np.asarray(operating_hours, dtype=np.float64), 0.0, 24.0)
+        idx = np.asarray(idx, dtype=np.int64)
+        return self._since_midnight(opening + hours, idx) - self._since_midnight(opening, idx)
+
+
+@functools.lru_cache(maxsize=1)
+def get_traffic_profiles() -> TrafficProfiles:
+    return TrafficProfiles.load(settings.TRAFFIC_PROFILES_PATH or None)
+
+
+def business_window(params: Dict[str, Any]) -> Tuple[float, float]:
+    """(opening hour, operating hours) from `openingHour` (default 08:00) and `closingHour` or `operatingHours`"""
+    opening = float(params.get("openingHour", DEFAULT_OPENING_HOUR))
+    if params.get("closingHour") is not None:
+        return opening, (float(params["closingHour"]) - opening) % 24 or 24.0
+    return opening, float(params["operatingHours"])
+
+
+def business_traffic_hours(params: Dict[str, Any], residential: Any, road: Any, operating_hours: Any = None) -> np.ndarray:
+    """
+    Traffic-hours of the business' opening window; `areaType` overrides the
+    type inferred from land cover, `operating_hours` replaces the stored
+    window length (e.g. a sweep axis).
+    """
+    profiles = get_traffic_profiles()
+    opening, hours = business_window(params)
+    if operating_hours is not None:
+        hours = operating_hours
+    area_type = params.get("areaType")
+    idx = profiles.index(area_type) if area_type else profiles.classify(residential, road)
+    return profiles.traffic_hours(opening, hours, idx)
@@ -0,0 +1,38 @@
+"""
+Content-addressed cache for Gemini vision results.
+
+Entries are keyed on the decoded screenshot bytes plus the map geometry that
+determines what the pixels mean (center, scale, zoom). `business_params` are
+deliberately excluded: they only feed `calculate_business_metrics`, so a user
+re-running the same screenshot with a different price is a cache hit.
+"""
+from typing import Any, Dict, Optional
+
+from app.core.cache import TieredCache, stable_hash
+from app.core.config import settings
+from app.core.singleflight import get_singleflight
+
+vision_cache = TieredCache(
+    "vision",
+    max_entries=settings.VISION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.VISION_CACHE_TTL_SECONDS,
+)
+
+# Identical screenshots analysed concurrently (double clicks, shared links) share one Gemini call
+vision_flight = get_singleflight("gemini_vision")
+
+
+def vision_cache_key(image_bytes: bytes, metadata: Dict[str, Any]) -> str:
+    center = metadata.get("center") or {}
+
+    def _round(value: Optional[float], digits: int) -> Optional[float]:
+        return round(float(value), digits) if value is not None else None
+
+    geometry = {
+        "lat": _round(center.get("lat"), 6),
+        "lng": _round(center.get("lng"), 6),
+        "scale": _round(metadata.get("scale"), 6),
+        # The frontend sends `zoomLevel`; accept either spelling
+        "zoom": metadata.get("zoom", metadata.get("zoomLevel")),
+    }
+    return stable_hash(image_bytes, geometry)
@@ -1,5 +1,17 @@
+import asyncio
 import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
 import httpx
+import numpy as np
+
+from app.core.cache import TieredCache
+from app.core.config import settings
+from app.core.geo import geohash_encode
+from app.core.singleflight import get_singleflight
+from app.services.traffic_probability import DEFAULT_OPENING_HOUR
 
 WEATHER_VIC = {
     "clear": 1.0,
@@ -21,39 +33,212 @@ def get_wmo_weather_state(wmo_code: int) -> str:
     if wmo_code <= 82: return "heavy_rain"  # 80-82: Showers
     return "storm"                          # 95+: Thunderstorm
 
-def get_real_weather(lat: float, lng: float) -> str:
-    """Fetch real-time weather from Open-Meteo (No API Key required)"""
+# Upper WMO code of each state, the cut points of get_wmo_weather_state
+_WMO_BOUNDS = np.array([1, 3, 65, 82])
+_WMO_VIC = np.array([WEATHER_VIC[s] for s in ("clear", "cloudy", "light_rain", "heavy_rain", "storm")])
+
+def wmo_factors(codes) -> np.ndarray:
+    """Vectorised get_wmo_weather_state -> WEATHER_VIC over an array of WMO codes"""
+    return _WMO_VIC[np.searchsorted(_WMO_BOUNDS, np.asarray(codes), side="left")]
+
+def random_weather() -> str:
+    """Climatological draw, used only when neither the cache nor Open-Meteo can answer"""
+    return random.choices(WEATHER_STATES, WEATHER_PROBS)[0]
+
+# Shared across workers through the Mongo tier; past its hour an entry is still served while it refreshes
+weather_cache = TieredCache(
+    "weather",
+    max_entries=settings.WEATHER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.WEATHER_STALE_SECONDS,
+)
+weather_flight = get_singleflight("weather")
+# Strong references to stale-while-revalidate refreshes until they finish
+_refreshes: Set[asyncio.Task] = set()
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_weather_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=settings.WEATHER_TIMEOUT)
+    return _client
+
+async def close_weather_client():
+    global _client
+    for task in list(_refreshes):
+        task.cancel()
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+async def get_real_weather(lat: float, lng: float) -> Optional[str]:
+    """Current weather from Open-Meteo (No API Key required); None when the upstream is unavailable"""
+    params = {"latitude": lat, "longitude": lng, "current_weather": "true"}
     try:
-        url = "https://api.open-meteo.com/v1/forecast"
+        resp = await get_weather_client().get(settings.OPEN_METEO_URL, params=params)
+        if resp.status_code == 200:
+            weather_code = resp.json().get("current_weather", {}).get("weathercode", 0)
+            return get_wmo_weather_state(weather_code)
+        print(f"Weather API failed: HTTP {resp.status_code}")
+    except Exception as e:
+        print(f"Weather API failed: {e}")
+    return None
+
+def _current_hour() -> int:
+    return int(time.time() // 3600)
+
+def weather_key(lat: float, lng: float) -> str:
+    return geohash_encode(float(lat), float(lng), settings.WEATHER_GEOHASH_PRECISION)
+
+async def _refresh(key: str, lat: float, lng: float) -> Optional[str]:
+    """Fetch the cell's weather and store it for the current hour; concurrent refreshes share one call"""
+    async def fetch() -> Optional[str]:
+        start = time.perf_counter()
+        weather = await get_real_weather(lat, lng)
+        weather_cache.record_compute(time.perf_counter() - start)
+        if weather is not None:
+            await weather_cache.set(key, {"weather": weather, "hour": _current_hour(), "fetched_at": time.time()})
+        return weather
+
+    return await weather_flight.do(key, fetch)
+
+async def get_weather(lat: float = None, lng: float = None) -> str:
+    """
+    Weather state for the geohash cell around (lat, lng).
+
+    Fresh entries are from the current hour. An older entry (within
+    WEATHER_STALE_SECONDS) is returned immediately while a background refresh
+    replaces it. Without any entry Open-Meteo is awaited, and only if that
+    fails too is the state drawn at random.
+    """
+    if not (lat and lng):
+        return random_weather()
+
+    key = weather_key(lat, lng)
+    entry = await weather_cache.get(key)
+    if entry is not None:
+        if entry.get("hour") != _current_hour():
+            task = asyncio.create_task(_refresh(key, lat, lng))
+            _refreshes.add(task)
+            task.add_done_callback(_refreshes.discard)
+        return entry["weather"]
+
+    weather = await _refresh(key, lat, lng)
+    return weather if weather is not None else random_weather()
+
+forecast_cache = TieredCache(
+    "weather_forecast",
+    max_entries=settings.WEATHER_CACHE_MAX_ENTRIES,
+    ttl_seconds=24 * 3600,
+)
+forecast_flight = get_singleflight("weather_forecast")
+
+async def get_hourly_forecast(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """
+    Hourly WMO codes for the cell from local midnight of the day it was
+    fetched, WEATHER_FORECAST_DAYS long, with the site's UTC offset. One
+    upstream fetch per cell per (UTC) day, so the series can start a local day
+    early; see `local_day_index`. None when unavailable.
+    """
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    key = f"{weather_key(lat, lng)}:{day}:{settings.WEATHER_FORECAST_DAYS}"
+
+    async def fetch() -> Optional[Dict[str, Any]]:
         params = {
             "latitude": lat,
             "longitude": lng,
-            "current_weather": "true"
+            "hourly": "weathercode",
+            "forecast_days": settings.WEATHER_FORECAST_DAYS,
+            "timezone": "auto",  # hour 0 is local midnight, so opening hours index directly
         }
-        # synchronous call for simplicity in this synchronous logic flow, 
-        # but optimally should be async. Since this is called by async servicer, 
-        # we'll use httpx.get but we need to run it synchronously or change logic to async.
-        # Given this file is imported as valid python module, let's keep it sync for compatibility, 
-        # or use httpx inside a wrapper. 
-        # Actually Open-Meteo is fast. Let's use standard requests or httpx.Client().
-        
-        with httpx.Client(timeout=3.0) as client:
-            resp = client.get(url, params=params)
-            if resp.status_code == 200:
-                data = resp.json()
-                weather_code = data.get("current_weather", {}).get("weathercode", 0)
-                return get_wmo_weather_state(weather_code)
-    except Exception as e:
-        print(f"Weather API failed: {e}, using fallback.")
-    
-    return random.choices(WEATHER_STATES, WEATHER_PROBS)[0]
+        try:
+            resp = await get_weather_client().get(settings.OPEN_METEO_URL, params=params)
+            if resp.status_code != 200:
+                print(f"Weather forecast failed: HTTP {resp.status_code}")
+                return None
+            data = resp.json()
+            hourly = data.get("hourly", {})
+        except Exception as e:
+            print(f"Weather forecast failed: {e}")
+            return None
+        codes = [0 if c is None else int(c) for c in hourly.get("weathercode", [])]
+        if not codes:
+            return None
+        times = hourly.get("time") or [None]
+        return {"start": times[0], "codes": codes, "utc_offset_seconds": int(data.get("utc_offset_seconds") or 0)}
+
+    async def load() -> Optional[Dict[str, Any]]:
+        value, _ = await forecast_cache.get_or_compute(key, fetch, cacheable=lambda v: v is not None)
+        return value
+
+    return await forecast_flight.do(key, load)
+
+def local_day_index(forecast: Dict[str, Any], now: Optional[float] = None) -> int:
+    """
+    Index of the site's current local day in a forecast series: a series
+    cached earlier in the UTC day can start on what is now yesterday locally
+    """
+    try:
+        start = datetime.fromisoformat(forecast["start"]).date()
+    except (KeyError, TypeError, ValueError):
+        return 0
+    offset = forecast.get("utc_offset_seconds") or 0
+    today = datetime.fromtimestamp((time.time() if now is None else now) + offset, timezone.utc).date()
+    return max((today - start).days, 0)
+
+def window_factors(codes, opening_hour: float, hours: float, days: int) -> np.ndarray:
+    """
+    Mean weather multiplier over [opening_hour, opening_hour + hours) on each of
+    `days` days of an hourly series starting at local midnight. A partial last
+    hour is weighted by its fraction; days the series doesn't cover are dropped.
+    """
+    vic = wmo_factors(codes)
+    hours = min(max(float(hours), 0.0), 24.0)
+    slots = np.arange(int(np.ceil(hours)))
+    weights = np.clip(hours - slots, 0.0, 1.0)
+    if not weights.sum():
+        return np.ones(0)
+    idx = np.arange(days)[:, None] * 24 + int(opening_hour) % 24 + slots[None, :]
+    idx = idx[idx[:, -1] < len(vic)]
+    return (vic[idx] * weights).sum(axis=1) / weights.sum()
+
+async def get_weather_outlook(
+    lat: float,
+    lng: float,
+    operating_hours: float,
+    opening_hour: float = DEFAULT_OPENING_HOUR,
+    days: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Expected traffic multiplier from the hourly forecast over the operating
+    window: today's, and the mean over `days` (the multi-day horizon used for
+    monthly estimates). None when no forecast is available.
+    """
+    if not (lat and lng):
+        return None
+    forecast = await get_hourly_forecast(lat, lng)
+    if forecast is None:
+        return None
+    days = min(days or settings.WEATHER_FORECAST_DAYS, settings.WEATHER_FORECAST_DAYS)
+    # Days that have already passed locally are not part of the outlook
+    skip = local_day_index(forecast)
+    per_day = window_factors(forecast["codes"][skip * 24:], opening_hour, operating_hours, days)
+    if not len(per_day):
+        return None
+    return {
+        "factor": round(float(per_day.mean()), 4),
+        "today": round(float(per_day[0]), 4),
+        "daily": np.round(per_day, 4).tolist(),
+        "days": len(per_day),
+        "window": [int(opening_hour) % 24, round(int(opening_hour) % 24 + float(operating_hours), 2)],
+        "start": forecast["start"],
+        "dayOffset": skip,
+    }
+
+def apply_weather_to_apt(apt: float, weather: str = None) -> tuple:
+    # Callers on the async path pass the state from `get_weather`; this is only the offline default
+    if weather is None:
+        weather = random_weather()
 
-def apply_weather_to_apt(apt: float, lat: float = None, lng: float = None) -> tuple:
-    if lat and lng:
-        weather = get_real_weather(lat, lng)
-    else:
-        # Fallback to random if no coordinates provided
-        weather = random.choices(WEATHER_STATES, WEATHER_PROBS)[0]
-    
     vic = WEATHER_VIC.get(weather, 1.0)
     return apt * vic, weather
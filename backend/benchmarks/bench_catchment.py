@@ -0,0 +1,60 @@
+"""
+Walking-isochrone latency on the offline road graph.
+
+    cd backend && python -m benchmarks.bench_catchment [--blocks 120] [--sites 200]
+
+Random sites in a synthetic city (see `synthetic_data.write_synthetic_osm`)
+get their 5/10/15-minute isochrones cold (bounded Dijkstra + area raster) and
+then again from the in-process isochrone cache.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services import catchment, road_graph
+from app.services.road_graph import RoadGraph
+from benchmarks.synthetic_data import write_synthetic_osm
+
+CENTER = (-6.2, 106.82)
+
+
+async def run(points: np.ndarray) -> list:
+    return [await catchment.get_catchment(lat, lng) for lat, lng in points]
+
+
+def main(blocks: int, sites: int):
+    # In-process tier only; the Mongo tier would dominate the warm numbers
+    catchment.isochrone_cache._repository = None
+    with tempfile.TemporaryDirectory() as tmp:
+        osm = os.path.join(tmp, "city.osm")
+        write_synthetic_osm(osm, CENTER, blocks=blocks)
+        road_graph.road_graph = RoadGraph.from_osm(osm)
+    print(f"graph: {road_graph.road_graph.nodes:,} nodes, {road_graph.road_graph.edges:,} directed edges")
+
+    rng = np.random.default_rng(0)
+    span = blocks * 90 / 111_320 * 0.45
+    points = np.column_stack([CENTER[0] + rng.uniform(-span, span, sites), CENTER[1] + rng.uniform(-span, span, sites)])
+
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        results = asyncio.run(run(points))
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {elapsed / sites * 1000:7.2f} ms/site")
+
+    results = [r for r in results if r]
+    for i, minutes in enumerate(catchment.ISOCHRONE_MINUTES):
+        areas = np.array([r["isochrones"][i]["areaSqM"] for r in results]) / 1e6
+        nodes = np.array([r["isochrones"][i]["nodes"] for r in results])
+        print(f"{minutes:2d} min: area median {np.median(areas):.2f} km2 (P10 {np.percentile(areas, 10):.2f}), median {np.median(nodes):.0f} nodes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=120)
+    parser.add_argument("--sites", type=int, default=200)
+    args = parser.parse_args()
+    main(args.blocks, args.sites)
@@ -0,0 +1,67 @@
+"""
+Competitor analytics latency and how the Huff factor compares with the old
+categorical estimate.
+
+    cd backend && python -m benchmarks.bench_competitor_analytics [--competitors 10000] [--sites 50]
+
+Competitors are scattered around a city centre (denser towards the middle,
+Places-shaped dicts with ratings and review counts); every site builds its
+KD-tree and reads nearest distances, ring densities and the Huff share.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.competitor_analytics import CompetitorField, site_competition
+from app.services.metrics_engine import COMPETITOR_FACTORS
+
+CENTER = (-6.2, 106.82)
+
+
+def synthetic_places(rng: np.random.Generator, n: int, spread_deg: float = 0.03) -> list:
+    lat = CENTER[0] + rng.normal(0, spread_deg, n)
+    lng = CENTER[1] + rng.normal(0, spread_deg, n)
+    rating = np.round(rng.uniform(3.0, 5.0, n), 1)
+    reviews = rng.lognormal(4, 1.2, n).astype(int)
+    return [
+        {"id": f"p{i}", "lat": float(lat[i]), "lng": float(lng[i]), "rating": float(rating[i]), "user_ratings_total": int(reviews[i])}
+        for i in range(n)
+    ]
+
+
+def main(competitors: int, sites: int):
+    rng = np.random.default_rng(0)
+    places = synthetic_places(rng, competitors)
+    points = np.column_stack([CENTER[0] + rng.uniform(-0.06, 0.06, sites), CENTER[1] + rng.uniform(-0.06, 0.06, sites)])
+
+    site_competition(*points[0], places)  # warm-up
+    start = time.perf_counter()
+    results = [site_competition(lat, lng, places) for lat, lng in points]
+    elapsed = (time.perf_counter() - start) / sites
+    inner = np.array([r["elapsed_ms"] for r in results])
+    print(f"{competitors:,} competitors from dicts: {elapsed * 1000:.2f} ms/site (median {np.median(inner):.2f}, P95 {np.percentile(inner, 95):.2f})")
+
+    # Same figures from arrays: tree build + queries + Huff pass, without reading the dicts
+    rows = np.array([(p["lat"], p["lng"], p["rating"], p["user_ratings_total"]) for p in places])
+    start = time.perf_counter()
+    for lat, lng in points:
+        CompetitorField(lat, lng, rows[:, :2], rows[:, 2], rows[:, 3]).summary()
+    print(f"{competitors:,} competitors from arrays: {(time.perf_counter() - start) / sites * 1000:.2f} ms/site")
+
+    shares = np.array([r["huffShare"] for r in results])
+    factors = np.array([r["factor"] for r in results])
+    within = np.array([r["rings"][-1]["count"] for r in results])
+    print(f"Huff share: median {np.median(shares):.3f} (P10 {np.percentile(shares, 10):.3f}, P90 {np.percentile(shares, 90):.3f})")
+    print(f"factor: median {np.median(factors):.3f}, range {factors.min():.3f}-{factors.max():.3f} (categorical: {sorted(set(COMPETITOR_FACTORS.values()))})")
+    for label, mask in (("<5", within < 5), ("5-49", (within >= 5) & (within < 50)), ("50+", within >= 50)):
+        if mask.any():
+            print(f"  {label:>4} within 1 km: {mask.sum():3d} sites, factor median {np.median(factors[mask]):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--competitors", type=int, default=10000)
+    parser.add_argument("--sites", type=int, default=50)
+    args = parser.parse_args()
+    main(args.competitors, args.sites)
@@ -0,0 +1,67 @@
+"""
+Batch competitor-impact simulation latency.
+
+    cd backend && python -m benchmarks.bench_competitor_impact [--competitors 60]
+
+A site with `--competitors` existing Places competitors (see
+`bench_competitor_analytics.synthetic_places`) gets growing batches of
+hypothetical rivals on a distance x bearing x type grid; each batch is one
+Huff pass and one `compute_metrics` call. Runs twice to show the numbers do
+not move between calls.
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from app.services.competitor_analytics import CompetitorField
+from app.services.competitor_impact import BRAND_PROFILES, simulate_impact
+from benchmarks.bench_competitor_analytics import CENTER, synthetic_places
+
+INPUTS = {
+    "building_width": 10.0,
+    "operating_hours": 12.0,
+    "price": 25_000.0,
+    "residential": 45.0,
+    "road": 18.0,
+    "area_sq_m": 500_000.0,
+    "population_density": 9000.0,
+    "competitor": 0.6,
+    "weather_factor": 1.0,
+    "traffic_factor": 0.9,
+    "traffic_hours": 10.0,
+    "catchment_sq_m": None,
+    "cglp_density": None,
+}
+
+
+def main(competitors: int):
+    places = synthetic_places(np.random.default_rng(0), competitors, spread_deg=0.006)
+    field = CompetitorField.from_places(*CENTER, places)
+    grid = [
+        {"type": t, "distance_m": float(d), "bearing_deg": float(b)}
+        for d, b, t in itertools.product(np.linspace(25, 1500, 25), range(0, 360, 18), BRAND_PROFILES)
+    ]
+    print(f"{field.count} existing competitors, {len(field.demand)} demand points")
+
+    for size in (1, 10, 100, 500):
+        batch = grid[:size]
+        runs = max(1, 200 // size)
+        start = time.perf_counter()
+        for _ in range(runs):
+            result = simulate_impact(field, INPUTS, batch)
+        elapsed = (time.perf_counter() - start) / runs
+        print(f"batch {size:4d}: {elapsed * 1000:7.2f} ms ({elapsed / size * 1e6:7.1f} us/hypothetical)")
+
+    again = simulate_impact(field, INPUTS, batch)
+    print(f"repeat identical: {again == result}")
+    worst = min(result["results"], key=lambda r: r["revenueDelta"])
+    print(f"worst of {len(batch)}: {worst['type']} at {worst['distanceM']:.0f} m -> revenue {worst['revenueDeltaPct']}%, score {worst['scoreDelta']}, risk +{worst['riskDelta']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--competitors", type=int, default=60)
+    args = parser.parse_args()
+    main(args.competitors)
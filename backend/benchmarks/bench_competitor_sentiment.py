@@ -0,0 +1,96 @@
+"""
+Batched competitor sentiment: chunking, concurrency and the per-place cache.
+
+    cd backend && python -m benchmarks.bench_competitor_sentiment [--places 120] [--latency 0.3]
+
+A fake Gemini server (fixed latency per call) answers each chunk with canned
+complaints / strengths / gaps per place id. The same batch runs cold, warm
+(every place cached) and with one place's reviews changed; the cold run's
+chunk reports show how far the calls overlapped.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import competitor_sentiment, llm_gateway
+from app.services.competitor_sentiment import analyze_sentiment_batch
+from app.services.llm_gateway import LLMGateway
+from benchmarks.fake_servers import create_fake_gemini_app, serve
+
+COMPLAINTS = ["Slow service", "slow service!", "Overpriced", "Small portions", "Rude staff", "No parking", "Noisy"]
+STRENGTHS = ["Great coffee", "Friendly staff", "Cozy interior", "Fast wifi", "Good value"]
+GAPS = ["Late-night hours", "Healthy options", "Delivery", "Workspace seating", "Kids menu"]
+WORDS = "coffee service staff price table wait music seat cake tea milk sugar clean busy quiet".split()
+
+
+def fake_reply(prompt: str) -> str:
+    places = {}
+    for place_id in re.findall(r'<place id="([^"]+)"', prompt):
+        h = sum(map(ord, place_id))
+        places[place_id] = {
+            "complaints": [COMPLAINTS[(h + i) % len(COMPLAINTS)] for i in range(2)],
+            "strengths": [STRENGTHS[(h + i) % len(STRENGTHS)] for i in range(2)],
+            "gaps": [GAPS[h % len(GAPS)]],
+        }
+    return json.dumps({"places": places})
+
+
+def synthetic_batch(rng: np.random.Generator, places: int) -> list:
+    return [
+        {
+            "place_id": f"place-{i}",
+            "name": f"Cafe {i}",
+            "reviews": [" ".join(rng.choice(WORDS, rng.integers(20, 60))) for _ in range(rng.integers(5, 40))],
+        }
+        for i in range(places)
+    ]
+
+
+async def run(batch: list, label: str):
+    start = time.perf_counter()
+    result = await analyze_sentiment_batch(batch)
+    wall = time.perf_counter() - start
+    chunks = result["chunks"]
+    model_s = sum(c["latency_ms"] for c in chunks) / 1000
+    print(
+        f"{label:>8}: {wall:6.2f} s wall, {len(chunks):3d} chunks ({model_s:6.2f} s of model time), "
+        f"cache {result['cache']['hits']} hit / {result['cache']['misses']} miss, tokens {result['tokens']}"
+    )
+    return result
+
+
+def main(places: int, latency: float):
+    competitor_sentiment.sentiment_cache._repository = None  # in-process tier only
+    batch = synthetic_batch(np.random.default_rng(0), places)
+    reviews = sum(len(p["reviews"]) for p in batch)
+    print(f"{places} places, {reviews} reviews, budget {settings.SENTIMENT_CHUNK_TOKENS} tokens/chunk, {settings.SENTIMENT_MAX_CONCURRENCY} in flight")
+
+    with serve(create_fake_gemini_app(latency=latency, reply_for=fake_reply)) as base:
+        llm_gateway.llm_gateway = LLMGateway(api_key="fake", base_url=base)
+
+        async def session():
+            cold = await run(batch, "cold")
+            await run(batch, "warm")
+            batch[0]["reviews"].append("new review about the long queue")
+            await run(batch, "1 edit")
+            await llm_gateway.llm_gateway.close()
+            return cold
+
+        cold = asyncio.run(session())
+
+    print(f"one call per place would be {places} sequential round trips (~{places * latency:.0f} s)")
+    print("top complaints:", [(c["text"], c["places"]) for c in cold["top_complaints"][:4]])
+    print(cold["summary_insight"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--places", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+    main(args.places, args.latency)
@@ -0,0 +1,72 @@
+"""
+Point and polygon query latency of the memory-mapped population raster.
+
+    cd backend && python -m benchmarks.bench_density_raster [--size 4000] [--queries 5000]
+
+A synthetic WorldPop-like GridFloat raster (see
+`synthetic_data.write_synthetic_population`) is opened with `numpy.memmap`
+and queried at random sites: the cell density under a point, the population
+of a screenshot-sized rectangle and of a ~1 km walking-catchment ring.
+Resident memory is reported before and after to show that only the touched
+pages are read.
+"""
+import argparse
+import math
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.density_raster import DensityRaster, screenshot_ring
+from benchmarks.synthetic_data import write_synthetic_population
+
+CENTER = (-6.2, 106.82)
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _timed(label: str, fn, sites: np.ndarray):
+    start = time.perf_counter()
+    values = [fn(lat, lng) for lat, lng in sites]
+    elapsed = time.perf_counter() - start
+    values = np.array([v for v in values if v is not None])
+    print(f"{label:<22} {elapsed / len(sites) * 1e6:8.1f} us/query   median {np.median(values):,.0f}")
+
+
+def main(size: int, queries: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "population.flt")
+        nbytes = write_synthetic_population(path, CENTER, size=size)
+        rss = _rss_mb()
+        start = time.perf_counter()
+        raster = DensityRaster.load(path)
+        print(f"raster: {size}x{size} cells, {nbytes / 1e6:.0f} MB; opened in {(time.perf_counter() - start) * 1e6:.0f} us")
+
+        rng = np.random.default_rng(0)
+        # Sites within ~10 km of the centre, where the synthetic city lives
+        span = min(size * raster.cell_deg * 0.4, 0.1)
+        sites = np.column_stack([CENTER[0] + rng.uniform(-span, span, queries), CENTER[1] + rng.uniform(-span, span, queries)])
+        angles = np.linspace(0, 2 * math.pi, 17)[:-1]
+
+        def catchment(lat, lng):
+            d_lat = 1000 / 111_320
+            ring = [[lat + d_lat * math.sin(a), lng + d_lat / math.cos(math.radians(lat)) * math.cos(a)] for a in angles]
+            return raster.population(ring)
+
+        for _ in ("cold", "warm"):
+            _timed("point density /km2", raster.density, sites)
+            _timed("screenshot population", lambda lat, lng: raster.population(screenshot_ring({"lat": lat, "lng": lng}, 313, 235)), sites)
+            _timed("1 km ring population", catchment, sites)
+        print(f"max RSS growth: {_rss_mb() - rss:.0f} MB (raster file {nbytes / 1e6:.0f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=4000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+    main(args.size, args.queries)
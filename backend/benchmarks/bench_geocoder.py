@@ -0,0 +1,55 @@
+"""
+Startup cost and lookup latency of the offline reverse geocoder.
+
+    cd backend && python -m benchmarks.bench_geocoder [--places 200000] [--queries 20000]
+
+Writes a GeoNames-format gazetteer (see `synthetic_data.write_synthetic_gazetteer`;
+`cities500.txt` has ~200k rows), loads it, and reports load time, array
+memory and process RSS growth, then single-point lookup latency.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.geocoder import Gazetteer
+from benchmarks.synthetic_data import write_synthetic_gazetteer
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux); 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return 0.0
+
+
+def main(places: int, queries: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "gazetteer.txt")
+        size = write_synthetic_gazetteer(path, places)
+        rss = _rss_mb()
+        gazetteer = Gazetteer.load(path)
+        grown = _rss_mb() - rss
+    print(f"file: {size / 1e6:.1f} MB, {gazetteer.places:,} populated places kept of {places:,} rows")
+    print(f"load: {gazetteer.load_seconds:.2f} s, arrays + tree {gazetteer.memory_bytes / 1e6:.1f} MB, RSS +{grown:.1f} MB")
+
+    rng = np.random.default_rng(1)
+    points = np.column_stack([rng.uniform(-50, 65, queries), rng.uniform(-180, 180, queries)])
+    for k in (1, 5):
+        start = time.perf_counter()
+        for lat, lng in points:
+            gazetteer.nearest(lat, lng, k=k, max_distance_m=50_000)
+        print(f"nearest k={k}: {(time.perf_counter() - start) / queries * 1e6:6.1f} us/query")
+    print("example:", gazetteer.nearest(-6.2, 106.82, k=1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--places", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    args = parser.parse_args()
+    main(args.places, args.queries)
@@ -0,0 +1,91 @@
+"""
+Cold vs. warm site-selection heatmap over a local tile server.
+
+    cd backend && python -m benchmarks.bench_heatmap [--cells-per-side 20] [--tile-latency 0.05] [--competitors 60]
+
+A square bbox around central Jakarta is screened with `stream_heatmap`
+against a synthetic OSM-styled tile server. The first run fetches and
+classifies every cell; the second is served from the per-cell cache. Weather
+is stubbed out, and the bbox's Places search returns `--competitors`
+synthetic competitors (0 = no Places data, the "medium" default).
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+import app.services.heatmap_service as heatmap_service
+from app.schemas.schemas import HeatmapRequest
+from app.services import tile_service
+from app.services.competitor_analytics import CompetitorField
+from benchmarks.bench_competitor_analytics import synthetic_places
+from benchmarks.fake_servers import create_fake_tile_app, serve
+
+CENTER = (-6.2, 106.82)
+CELL_M = 250
+PARAMS = {"buildingWidth": 10, "operatingHours": 12, "productPrice": 20000}
+
+
+async def _run(request: HeatmapRequest):
+    grid = heatmap_service.plan_heatmap(request)
+    start = time.perf_counter()
+    first = None
+    async for event in heatmap_service.stream_heatmap(grid, request):
+        if event["type"] == "cells" and first is None:
+            first = time.perf_counter() - start
+        if event["type"] == "done":
+            return time.perf_counter() - start, first, event
+
+
+async def main_async(cells_per_side: int, tile_latency: float, concurrency: int, competitors: int):
+    async def weather(lat, lng):
+        return "clear"
+
+    half_lat = cells_per_side * CELL_M / 111_320 / 2
+    half_lng = half_lat / 0.994
+    places = synthetic_places(np.random.default_rng(0), competitors, spread_deg=half_lat + 0.01)
+
+    async def competition(lat, lng, radius_m):
+        return CompetitorField.from_places(lat, lng, places) if places else None
+
+    heatmap_service.get_weather = weather
+    heatmap_service.area_field = competition
+    request = HeatmapRequest(
+        bbox={
+            "south": CENTER[0] - half_lat, "north": CENTER[0] + half_lat,
+            "west": CENTER[1] - half_lng, "east": CENTER[1] + half_lng,
+        },
+        cell_size_m=CELL_M,
+        business_params=PARAMS,
+        max_concurrency=concurrency,
+        budget_seconds=120,
+    )
+
+    app = create_fake_tile_app(latency=tile_latency)
+    with serve(app) as url:
+        # The bench server is local, so allow more than the public tile server's 2 connections
+        tile_service.tile_service = tile_service.TileService(url_template=url + "/{z}/{x}/{y}.png", max_connections=16, user_agent="finaya-bench")
+        print(f"{'run':<5} | {'cells':>5} | {'cached':>6} | {'first batch':>11} | {'total':>8} | {'cells/s':>8} | {'tile calls':>10}")
+        print("-" * 72)
+        for run in ("cold", "warm"):
+            calls_before = app.state.calls
+            total, first, done = await _run(request)
+            stats = done["stats"]
+            print(
+                f"{run:<5} | {stats['scored']:>5} | {stats['cached']:>6} | {first * 1000:>8.1f} ms | "
+                f"{total * 1000:>5.0f} ms | {stats['scored'] / total:>8.0f} | {app.state.calls - calls_before:>10}"
+            )
+        best = done["best"][0]
+        print(f"best cell ({best['lat']}, {best['lng']}): score {best['locationScore']}, revenue {best['monthlyRevenue']:,}, competitor factor {best['competitorFactor']}")
+        await tile_service.close_tile_service()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells-per-side", type=int, default=20)
+    parser.add_argument("--tile-latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--competitors", type=int, default=60)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.cells_per_side, args.tile_latency, args.concurrency, args.competitors))
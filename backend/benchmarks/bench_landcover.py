@@ -0,0 +1,79 @@
+"""
+Latency of the local land-cover classifier on synthetic screenshots.
+
+    cd backend && python -m benchmarks.bench_landcover [--repeat 50]
+
+Two 1600x1000 PNGs with known composition: an OSM-Carto-style street map
+(residential fill, a park, a white road grid) and a satellite-style image
+(vegetation strip, smooth asphalt band, blocky roofs). Reports the estimate
+next to the ground truth and the per-call latency including PNG decode.
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.landcover_classifier import classify_landcover
+
+W, H = 1600, 1000
+
+
+def _png(image: Image.Image) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def street_map() -> bytes:
+    image = Image.new("RGB", (W, H), (224, 223, 223))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, W * 0.3, H * 0.5], fill=(200, 250, 204))
+    for x in range(0, W, 160):
+        draw.rectangle([x, 0, x + 15, H], fill=(255, 255, 255))
+    draw.text((500, 500), "Jalan Sudirman", fill=(0, 0, 0))
+    return _png(image)
+
+
+def satellite() -> bytes:
+    rng = np.random.default_rng(0)
+    roofs = (rng.random((H // 10, W // 10, 3)) * [90, 60, 50] + [120, 80, 60]).astype(np.uint8)
+    pixels = np.array(Image.fromarray(roofs).resize((W, H), Image.NEAREST))
+    pixels[:, :400] = (np.array([60, 110, 50]) + rng.random((H, 400, 3)) * 10).astype(np.uint8)
+    pixels[400:480, :] = (128 + rng.random((80, W, 1)) * 4).astype(np.uint8)
+    return _png(Image.fromarray(pixels))
+
+
+CASES = {
+    # (residential, road, openSpace) by construction
+    "street map": (street_map, (76.5, 10.0, 13.5)),
+    "satellite": (satellite, (67.5, 7.5, 25.0)),
+}
+
+
+def main(repeat: int):
+    print(f"{'case':<11} | {'estimate (res/road/open)':>24} | {'truth':>17} | {'p50':>8} | {'p95':>8}")
+    print("-" * 80)
+    for name, (build, truth) in CASES.items():
+        data = build()
+        classify_landcover(data)  # warm-up
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            estimate = classify_landcover(data)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        est = f"{estimate.residential:.1f}/{estimate.road:.1f}/{estimate.openSpace:.1f}"
+        ref = "/".join(f"{v:.1f}" for v in truth)
+        print(
+            f"{name:<11} | {est:>24} | {ref:>17} | {statistics.median(latencies):>5.1f} ms | "
+            f"{latencies[int(len(latencies) * 0.95) - 1]:>5.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args().repeat)
@@ -0,0 +1,68 @@
+"""
+Throughput of the async LLM gateway vs. the previous blocking call pattern.
+
+    cd backend && python -m benchmarks.bench_llm_gateway [--latency 0.2] [--requests 64]
+
+Both variants hit a local fake Gemini server with a fixed per-call latency.
+The blocking variant reproduces the old code path (a synchronous HTTP call
+inside `async def`), which serialises every request on the worker's event loop.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.services.llm_gateway import LLMGateway, image_part
+from benchmarks.fake_servers import create_fake_gemini_app, serve
+
+FAKE_IMAGE = b"\x89PNG\r\n" + b"\x00" * 200_000
+
+
+async def _gateway_call(gateway: LLMGateway):
+    await gateway.generate(["Describe this map", image_part(FAKE_IMAGE)], temperature=0.1)
+
+
+async def _blocking_call(base_url: str):
+    # What `client.models.generate_content(...)` effectively did inside async handlers
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        client.post("/v1beta/models/fake:generateContent", json={"contents": []})
+
+
+async def _run(n_requests: int, concurrency: int, make_call) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await make_call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return time.perf_counter() - start
+
+
+async def main(latency: float, n_requests: int):
+    app = create_fake_gemini_app(latency=latency)
+    with serve(app) as base_url:
+        gateway = LLMGateway(api_key="bench", model="fake", base_url=base_url, max_concurrency=64, max_connections=64)
+        try:
+            print(f"fake model latency: {latency * 1000:.0f} ms, {n_requests} requests per run\n")
+            print(f"{'concurrency':>11} | {'blocking req/s':>14} | {'gateway req/s':>13} | speedup")
+            print("-" * 56)
+            for concurrency in (1, 2, 4, 8, 16, 32, 64):
+                blocking = await _run(n_requests, concurrency, lambda: _blocking_call(base_url))
+                pooled = await _run(n_requests, concurrency, lambda: _gateway_call(gateway))
+                print(
+                    f"{concurrency:>11} | {n_requests / blocking:>14.1f} | "
+                    f"{n_requests / pooled:>13.1f} | {blocking / pooled:>6.1f}x"
+                )
+        finally:
+            await gateway.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--requests", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.requests))
@@ -0,0 +1,77 @@
+"""
+Vision calls spent vs. answer quality of the nearby-location optimiser.
+
+    cd backend && python -m benchmarks.bench_location_optimizer [--radius 800] [--gemini-latency 0.5]
+
+Runs `optimize_location` around central Jakarta against a synthetic tile
+server and a fake Gemini endpoint, once per vision budget, each from a cold
+vision cache, then repeats the largest budget warm. Land-cover cells stay
+cached between runs, as they would in a worker. Weather is stubbed out and
+the radius' Places search returns 60 synthetic competitors.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+import app.services.location_optimizer as location_optimizer
+from app.services import llm_gateway, tile_service
+from app.services.competitor_analytics import CompetitorField
+from benchmarks.bench_competitor_analytics import synthetic_places
+from app.services.heatmap_service import cell_cache
+from app.services.vision_cache import vision_cache
+from benchmarks.fake_servers import create_fake_gemini_app, create_fake_tile_app, serve
+
+START = (-6.2, 106.82)
+PARAMS = {"buildingWidth": 10, "operatingHours": 12, "productPrice": 20000}
+
+
+async def main_async(radius: float, gemini_latency: float, budgets):
+    async def weather(lat, lng):
+        return "clear"
+
+    places = synthetic_places(np.random.default_rng(0), 60, spread_deg=0.01)
+
+    async def competition(lat, lng, radius_m):
+        return CompetitorField.from_places(lat, lng, places)
+
+    location_optimizer.get_weather = weather
+    location_optimizer.area_field = competition
+    # Memory tiers only: the bench must not depend on (or wait for) Mongo
+    vision_cache._repository = None
+    cell_cache._repository = None
+
+    tiles_app = create_fake_tile_app(latency=0.02)
+    gemini_app = create_fake_gemini_app(latency=gemini_latency)
+    with serve(tiles_app) as tiles_url, serve(gemini_app) as gemini_url:
+        tile_service.tile_service = tile_service.TileService(url_template=tiles_url + "/{z}/{x}/{y}.png", max_connections=16, user_agent="finaya-bench")
+        llm_gateway.llm_gateway = llm_gateway.LLMGateway(api_key="bench", base_url=gemini_url)
+
+        print(f"{'budget':>6} | {'run':<4} | {'vision':>6} | {'hits':>4} | {'cells':>5} | {'start':>5} | {'coarse':>6} | {'final':>5} | {'gain':>5} | {'basis':<6} | {'total':>8}")
+        print("-" * 92)
+        runs = [(b, "cold") for b in budgets] + [(budgets[-1], "warm")]
+        for budget, run in runs:
+            if run == "cold":
+                vision_cache._memory.clear()
+            start = time.perf_counter()
+            report = await location_optimizer.optimize_location(*START, PARAMS, radius_m=radius, max_vision_calls=budget)
+            total = time.perf_counter() - start
+            b, q = report["budget"], report["quality"]
+            print(
+                f"{budget:>6} | {run:<4} | {b['visionCalls']:>6} | {b['visionCacheHits']:>4} | {b['cellsScreened']:>5} | "
+                f"{q['startScore']:>5} | {q['coarseBestLocal']:>6} | {q['finalScore']:>5} | {q['scoreGain']:>5} | "
+                f"{q['basis']:<6} | {total * 1000:>5.0f} ms"
+            )
+        print(f"gemini calls: {gemini_app.state.calls}, tile calls: {tiles_app.state.calls}")
+        await tile_service.close_tile_service()
+        await llm_gateway.close_llm_gateway()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--radius", type=float, default=800)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 1, 3, 5])
+    args = parser.parse_args()
+    asyncio.run(main_async(args.radius, args.gemini_latency, args.budgets))
@@ -0,0 +1,66 @@
+"""
+Throughput of the vectorised metrics engine vs. the scalar per-scenario path.
+
+    cd backend && python -m benchmarks.bench_metrics_engine [--scenarios 1000000]
+
+Scenarios are random (building width, operating hours, price, residential %,
+road %, density, competitor factor, weather factor) draws over one screenshot
+area. The scalar baseline calls `compute_metrics` once per scenario, which is
+what looping over `calculate_business_metrics` costs minus the HTTP/weather
+plumbing.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.metrics_engine import compute_metrics, screenshot_area
+from app.services.weather_probability import WEATHER_VIC
+
+METADATA = {"width": 1600, "height": 1000, "scale": 1.2}
+
+
+def _scenarios(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    residential = rng.uniform(10, 80, n)
+    return {
+        "building_width": rng.uniform(2, 20, n),
+        "operating_hours": rng.integers(4, 24, n).astype(float),
+        "price": rng.uniform(5_000, 100_000, n),
+        "residential": residential,
+        "road": rng.uniform(5, 100 - residential),
+        "population_density": rng.uniform(500, 25_000, n),
+        "competitor": rng.choice([1.0, 0.6, 0.3], n),
+        "weather_factor": rng.choice(list(WEATHER_VIC.values()), n),
+    }
+
+
+def main(n: int, scalar_n: int):
+    _, _, area = screenshot_area(METADATA)
+
+    batch = _scenarios(n)
+    compute_metrics(area_sq_m=area, **{k: v[:1000] for k, v in batch.items()})  # warm-up
+    start = time.perf_counter()
+    out = compute_metrics(area_sq_m=area, **batch)
+    vec_s = time.perf_counter() - start
+
+    small = _scenarios(scalar_n, seed=1)
+    start = time.perf_counter()
+    for i in range(scalar_n):
+        compute_metrics(area_sq_m=area, **{k: v[i] for k, v in small.items()})
+    scalar_s = time.perf_counter() - start
+
+    vec_rate = n / vec_s
+    scalar_rate = scalar_n / scalar_s
+    print(f"vectorised: {n:>9,} scenarios in {vec_s * 1000:8.1f} ms -> {vec_rate:>13,.0f} scenarios/s")
+    print(f"scalar:     {scalar_n:>9,} scenarios in {scalar_s * 1000:8.1f} ms -> {scalar_rate:>13,.0f} scenarios/s")
+    print(f"speed-up: {vec_rate / scalar_rate:,.0f}x; median monthly revenue {np.median(out['monthlyRevenue']):,.0f}")
+    assert vec_rate >= 100_000, "vectorised engine below 100k scenarios/s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=int, default=1_000_000)
+    parser.add_argument("--scalar-scenarios", type=int, default=10_000)
+    args = parser.parse_args()
+    main(args.scenarios, args.scalar_scenarios)
@@ -0,0 +1,43 @@
+"""
+Latency and convergence of the Monte Carlo revenue distribution.
+
+    cd backend && python -m benchmarks.bench_monte_carlo [--repeat 5]
+
+For each sample count the best-of-N wall time of `simulate_metrics` is shown
+next to the spread of P50 monthly revenue and break-even probability across
+10 different seeds, i.e. how much the answer still moves at that size.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.metrics_engine import screenshot_area
+from app.services.monte_carlo import simulate_metrics
+
+METADATA = {"width": 1600, "height": 1000, "scale": 1.2}
+INPUTS = dict(building_width=10, operating_hours=12, price=20000, residential=50, road=20,
+              population_density=8000, competitor=0.6, monthly_cost=3_000_000)
+
+
+def main(repeat: int):
+    _, _, area = screenshot_area(METADATA)
+    print(f"{'samples':>8} | {'best ms':>8} | {'P50 spread':>10} | {'P(BE) spread':>12}")
+    print("-" * 48)
+    for n in (1_000, 10_000, 100_000, 200_000):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            simulate_metrics(area_sq_m=area, samples=n, seed=0, **INPUTS)
+            best = min(best, time.perf_counter() - start)
+        runs = [simulate_metrics(area_sq_m=area, samples=n, seed=s, **INPUTS) for s in range(10)]
+        p50 = np.array([r["monthlyRevenue"]["p50"] for r in runs])
+        be = np.array([r["breakEvenProbability"] for r in runs])
+        print(f"{n:>8} | {best * 1000:>8.2f} | {np.ptp(p50) / p50.mean():>9.2%} | {np.ptp(be):>12.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,61 @@
+"""
+Upstream traffic and latency of the Overpass competitor proxy.
+
+    cd backend && python -m benchmarks.bench_overpass_proxy [--latency 0.3]
+
+Against a local stand-in Overpass (see `fake_servers.create_fake_overpass_app`),
+a sequence of scans wanders around one district with varying radii, the way
+users pan the map. Before, every scan was one browser-side Overpass query;
+here only tiles nobody scanned yet go upstream.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import overpass_service
+from benchmarks.fake_servers import create_fake_overpass_app, serve
+
+CENTER = (-6.2, 106.82)
+
+
+async def scan(points, radii):
+    rows = []
+    for (lat, lng), radius in zip(points, radii):
+        start = time.perf_counter()
+        result = await overpass_service.osm_competitors(lat, lng, int(radius))
+        rows.append((time.perf_counter() - start, result["tiles"]["fetched"], result["count"]))
+    await overpass_service.close_overpass_client()
+    return rows
+
+
+def main(latency: float, scans: int):
+    overpass_service.overpass_cache._repository = None  # in-process tier only
+    app = create_fake_overpass_app(latency=latency)
+    rng = np.random.default_rng(0)
+    points = np.column_stack([CENTER[0] + rng.normal(0, 0.01, scans), CENTER[1] + rng.normal(0, 0.01, scans)])
+    radii = rng.choice([500, 1000, 1500, 2000], scans)
+
+    with serve(app) as base:
+        settings.OVERPASS_URLS = f"{base}/api/interpreter"
+        rows = asyncio.run(scan(points, radii))
+
+    elapsed = np.array([r[0] for r in rows]) * 1000
+    fetched = np.array([r[1] for r in rows])
+    served = fetched == 0
+    print(f"{scans} scans, {app.state.calls} upstream queries (was {scans}), {int(fetched.sum())} tiles fetched")
+    print(f"served from cache: {served.mean():.0%} of scans, median {np.median(elapsed[served]) if served.any() else float('nan'):.2f} ms")
+    print(f"needing upstream:  median {np.median(elapsed[~served]):.0f} ms (fake Overpass latency {latency * 1000:.0f} ms)")
+    print(f"first 10 scans fetched tiles: {fetched[:10].tolist()}; last 10: {fetched[-10:].tolist()}")
+    print(f"competitors per scan: median {int(np.median([r[2] for r in rows]))}")
+    print("cache:", overpass_service.overpass_cache.info())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--scans", type=int, default=60)
+    args = parser.parse_args()
+    main(args.latency, args.scans)
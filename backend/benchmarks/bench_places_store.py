@@ -0,0 +1,60 @@
+"""
+Share of nearby searches the local places store answers, and its latency.
+
+    cd backend && python -m benchmarks.bench_places_store [--searches 200]
+
+Searches with varying radii and two keywords wander around one district
+against a local stand-in for Google Places (see
+`fake_servers.create_fake_places_app`, ~450 m between places). Only searches
+inside an earlier complete one (under a full page of 20) are served locally.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.places_service import places_service
+from app.services.places_store import places_store
+from benchmarks.fake_servers import create_fake_places_app, serve
+
+CENTER = (-6.2, 106.82)
+
+
+async def run(queries):
+    timings = []
+    for lat, lng, radius, keyword in queries:
+        start = time.perf_counter()
+        await places_service.search_nearby(lat, lng, radius, keyword)
+        timings.append(time.perf_counter() - start)
+    await places_service.close()
+    return np.array(timings) * 1000
+
+
+def main(searches: int):
+    app = create_fake_places_app(latency=0.1, spacing_deg=0.004)
+    rng = np.random.default_rng(0)
+    queries = [
+        (CENTER[0] + rng.normal(0, 0.004), CENTER[1] + rng.normal(0, 0.004), int(rng.choice([150, 300, 600, 1200])), str(rng.choice(["bakery", "food"])))
+        for _ in range(searches)
+    ]
+    with serve(app) as base:
+        settings.GOOGLE_MAPS_API_KEY = settings.GOOGLE_MAPS_API_KEY or "bench"
+        places_service.BASE_URL = base
+        elapsed = asyncio.run(run(queries))
+
+    info = places_store.info()
+    print(f"{searches} searches, {app.state.calls} upstream calls, {info['served_locally']} served locally ({info['local_share']:.0%})")
+    local = elapsed < 5
+    if local.any():
+        print(f"local:    median {np.median(elapsed[local]) * 1000:.0f} us, p99 {np.percentile(elapsed[local], 99) * 1000:.0f} us")
+    print(f"upstream: median {np.median(elapsed[~local]):.0f} ms")
+    print("store:", info)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=200)
+    args = parser.parse_args()
+    main(args.searches)
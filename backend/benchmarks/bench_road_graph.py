@@ -0,0 +1,117 @@
+"""
+Compile time, memory and per-site lookup latency of the offline road graph.
+
+    cd backend && python -m benchmarks.bench_road_graph [--blocks 120] [--sites 2000]
+
+A synthetic OSM XML city (see `synthetic_data.write_synthetic_osm`) is
+compiled, saved as `.npz` and reloaded; then random sites are looked up cold
+(nearest node + approach walks) and warm (memoised per node). A small grid
+with a 300 m cul-de-sac hanging off it checks that sites on the cul-de-sac
+do not outscore sites in the grid.
+"""
+import argparse
+import collections
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.geo import METERS_PER_DEGREE_LAT
+from app.services import road_graph
+from app.services.road_graph import APPROACH_METERS, RoadGraph, site_traffic
+from app.services.traffic_probability import DEFAULT_JUNCTIONS, probabilistic_traffic
+from benchmarks.synthetic_data import write_synthetic_osm
+
+CENTER = (-6.2, 106.82)
+
+
+def cul_de_sac_graph(blocks: int = 16, block_m: float = 90.0, dead_end_m: float = 300.0):
+    """
+    (graph, grid sites, cul-de-sac sites): a `blocks` x `blocks` residential
+    grid and a straight cul-de-sac of 100 m segments leaving its west edge;
+    grid sites are the nodes more than APPROACH_METERS inside the edges
+    """
+    d_lat = block_m / METERS_PER_DEGREE_LAT
+    d_lng = d_lat / np.cos(np.radians(CENTER[0]))
+    r, c = np.divmod(np.arange((blocks + 1) ** 2), blocks + 1)
+    lat = list(CENTER[0] + r * d_lat)
+    lng = list(CENTER[1] + c * d_lng)
+    node = (r * (blocks + 1) + c).reshape(blocks + 1, blocks + 1)
+    u = list(node[:, :-1].ravel()) + list(node[:-1, :].ravel())
+    v = list(node[:, 1:].ravel()) + list(node[1:, :].ravel())
+
+    prev = int(node[blocks // 2, 0])
+    steps = int(dead_end_m // 100)
+    for i in range(1, steps + 1):
+        lat.append(lat[prev])
+        lng.append(CENTER[1] - i * 100 / block_m * d_lng)
+        u.append(prev)
+        v.append(len(lat) - 1)
+        prev = len(lat) - 1
+
+    graph = RoadGraph.from_edges(np.array(lat), np.array(lng), np.array(u), np.array(v), np.zeros(len(u), dtype=bool))
+    margin = int(APPROACH_METERS // block_m) + 1
+    inner = node[margin:-margin, margin:-margin].ravel()
+    grid_sites = [(lat[i], lng[i]) for i in inner]
+    dead_end_sites = [(lat[i], lng[i]) for i in range(len(lat) - steps, len(lat))]
+    return graph, grid_sites, dead_end_sites
+
+
+def check_cul_de_sac():
+    graph, grid_sites, dead_end_sites = cul_de_sac_graph()
+    road_graph.road_graph = graph
+    try:
+        grid = [site_traffic(*site)[0] for site in grid_sites]
+        dead_end = [site_traffic(*site) for site in dead_end_sites]
+    finally:
+        road_graph.road_graph = None
+    print(f"grid sites: traffic factor {min(grid):.3f}-{max(grid):.3f}, median {np.median(grid):.3f}")
+    for (factor, chains), m in zip(dead_end, range(100, 100 * len(dead_end) + 1, 100)):
+        print(f"cul-de-sac {m} m out: {factor:.3f} {chains}")
+    worst = max(factor for factor, _ in dead_end)
+    assert worst <= np.median(grid), f"cul-de-sac site scores {worst:.3f}, above the grid's {np.median(grid):.3f}"
+
+
+def main(blocks: int, sites: int):
+    check_cul_de_sac()
+    with tempfile.TemporaryDirectory() as tmp:
+        osm = os.path.join(tmp, "city.osm")
+        nodes, ways = write_synthetic_osm(osm, CENTER, blocks=blocks)
+        print(f"extract: {nodes:,} nodes, {ways:,} ways, {os.path.getsize(osm) / 1e6:.1f} MB XML")
+
+        start = time.perf_counter()
+        graph = RoadGraph.from_osm(osm)
+        print(f"compile from XML: {time.perf_counter() - start:.2f} s -> {graph.nodes:,} nodes, {graph.edges:,} directed edges")
+        npz = os.path.join(tmp, "city.npz")
+        graph.save(npz)
+        start = time.perf_counter()
+        graph = RoadGraph.load(npz)
+        arrays = sum(a.nbytes for a in (graph.lat, graph.lng, graph.indptr, graph.indices, graph.length, graph.main, graph.xy))
+        print(f"load from .npz:   {(time.perf_counter() - start) * 1000:.1f} ms ({os.path.getsize(npz) / 1e6:.1f} MB file, {arrays / 1e6:.1f} MB arrays)")
+
+        rng = np.random.default_rng(0)
+        span = blocks * 90 / 111_320 * 0.45
+        points = np.column_stack([CENTER[0] + rng.uniform(-span, span, sites), CENTER[1] + rng.uniform(-span, span, sites)])
+
+        for run in ("cold", "warm"):
+            start = time.perf_counter()
+            results = [graph.site_junctions(lat, lng) for lat, lng in points]
+            elapsed = time.perf_counter() - start
+            print(f"{run} lookups: {elapsed / sites * 1e6:8.1f} us/site")
+
+        kinds = collections.Counter(j for chains in results if chains for chain in chains for j in chain)
+        factors = [np.mean([probabilistic_traffic(1.0, c) for c in chains]) for chains in results if chains]
+        print(f"junction types: {dict(kinds)}")
+        print(
+            f"traffic factor: median {np.median(factors):.3f}, P10 {np.percentile(factors, 10):.3f}, "
+            f"P90 {np.percentile(factors, 90):.3f} (default chain {probabilistic_traffic(1.0, DEFAULT_JUNCTIONS):.3f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=120)
+    parser.add_argument("--sites", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.blocks, args.sites)
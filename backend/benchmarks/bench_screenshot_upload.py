@@ -0,0 +1,121 @@
+"""
+Memory and latency of the JSON/base64 screenshot path vs. the binary upload paths.
+
+    cd backend && python -m benchmarks.bench_screenshot_upload [--repeat 5]
+
+Requests go through the real ASGI app in-process. Geocoding, web search and
+weather are stubbed out, and the Gemini gateway uses an in-memory transport,
+so the request body is still fully built (base64 + JSON) but nothing leaves
+the process. Peak memory is the tracemalloc peak over one request, including
+the pre-built client body held by the transport.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import httpx
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+import main
+import app.services.analysis_pipeline as analysis_pipeline
+from app.services import llm_gateway
+from app.services.vision_cache import vision_cache
+
+MB = 1024 * 1024
+METADATA = {"width": 1600, "height": 1000, "scale": 1.2, "center": {"lat": -6.2, "lng": 106.8}, "zoomLevel": 16}
+PARAMS = {"buildingWidth": 10, "operatingHours": 12, "productPrice": 20000}
+LOCATION = "-6.2, 106.8"
+
+
+def _fake_gemini(request: httpx.Request) -> httpx.Response:
+    text = json.dumps({
+        "residential_percentage": 50, "road_percentage": 25, "open_space_percentage": 25,
+        "estimated_population_density": 8000, "competitor_density_estimate": "medium", "reasoning": "bench",
+    })
+    return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+
+def _stub_upstreams():
+    async def geocode(lat, lng):
+        return "Bench St"
+
+    async def search(name):
+        return "bench"
+
+    async def weather(lat, lng):
+        return "clear"
+
+    async def outlook(lat, lng, hours, opening):
+        return None
+
+    analysis_pipeline.reverse_geocode = geocode
+    analysis_pipeline._web_search_density = search
+    analysis_pipeline.get_weather = weather
+    analysis_pipeline.get_weather_outlook = outlook
+    llm_gateway.llm_gateway = llm_gateway.LLMGateway(api_key="bench", transport=httpx.MockTransport(_fake_gemini))
+    main.app.state.limiter = Limiter(key_func=get_remote_address)
+
+
+def _build_requests(image: bytes):
+    import base64
+    json_body = json.dumps({
+        "location": LOCATION,
+        "business_params": PARAMS,
+        "screenshot_base64": base64.b64encode(image).decode(),
+        "screenshot_metadata": METADATA,
+    }).encode()
+    fields = {"location": LOCATION, "business_params": json.dumps(PARAMS), "screenshot_metadata": json.dumps(METADATA)}
+    multipart = httpx.Request(
+        "POST", "http://bench/api/v1/analysis/analyze/upload",
+        data=fields, files={"screenshot": ("map.png", image, "image/png")},
+    )
+    multipart.read()
+    return {
+        "json (base64)": ("/api/v1/analysis/analyze", json_body, {"content-type": "application/json"}, None),
+        "multipart": ("/api/v1/analysis/analyze/upload", multipart.content, dict(multipart.headers), None),
+        "raw image/png": ("/api/v1/analysis/analyze/upload", image, {"content-type": "image/png"}, fields),
+    }
+
+
+async def _send(client: httpx.AsyncClient, path, body, headers, params):
+    vision_cache._memory.clear()  # every request must reach the (fake) model
+    resp = await client.post(path, content=body, headers=headers, params=params)
+    assert resp.status_code == 200, resp.text[:200]
+
+
+async def main_async(repeat: int):
+    _stub_upstreams()
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench") as client:
+        print(f"{'size':>5} | {'variant':<14} | {'p50 latency':>11} | {'peak memory':>11} | {'peak / image':>12}")
+        print("-" * 66)
+        for size_mb in (2, 4, 8):
+            image = b"\x89PNG\r\n\x1a\n" + os.urandom(size_mb * MB - 8)
+            for name, (path, body, headers, params) in _build_requests(image).items():
+                await _send(client, path, body, headers, params)  # warm-up
+
+                latencies = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    await _send(client, path, body, headers, params)
+                    latencies.append(time.perf_counter() - start)
+
+                tracemalloc.start()
+                await _send(client, path, body, headers, params)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(
+                    f"{size_mb:>3}MB | {name:<14} | {statistics.median(latencies) * 1000:>8.1f} ms | "
+                    f"{peak / MB:>8.1f} MB | {peak / len(image):>11.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args().repeat))
@@ -0,0 +1,201 @@
+"""
+Local stand-ins for upstream APIs, served by uvicorn on a background thread.
+
+Used by the benchmarks so they measure our own overhead and concurrency
+behaviour without network access or API keys.
+"""
+import asyncio
+import functools
+import io
+import json
+import math
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from PIL import Image, ImageDraw
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def create_fake_gemini_app(latency: float = 0.2, text: str = None, reply_for=None) -> FastAPI:
+    """
+    Minimal `models/{model}:generateContent` endpoint with a fixed delay;
+    `reply_for(prompt)` replaces the fixed reply text
+    """
+    app = FastAPI()
+    reply = text or (
+        '{"residential_percentage": 55, "road_percentage": 25, "open_space_percentage": 20, '
+        '"estimated_population_density": 8000, "competitor_density_estimate": "medium", '
+        '"reasoning": "fake server"}'
+    )
+    app.state.calls = 0
+
+    @app.post("/{version}/models/{model_action:path}")
+    async def generate_content(version: str, model_action: str, request: Request):
+        body = await request.body()
+        app.state.calls += 1
+        await asyncio.sleep(latency)
+        text = reply
+        if reply_for is not None:
+            data = json.loads(body)
+            text = reply_for("".join(p.get("text", "") for c in data["contents"] for p in c["parts"]))
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+            "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": len(text) // 4},
+        }
+
+    return app
+
+
+@functools.lru_cache(maxsize=1024)
+def _synthetic_tile(z: int, x: int, y: int) -> bytes:
+    """OSM-Carto-coloured tile: residential fill, a white road grid, and a park whose size varies by tile"""
+    image = Image.new("RGB", (256, 256), (224, 223, 223))
+    draw = ImageDraw.Draw(image)
+    park = (x * 7 + y * 3) % 10 * 20
+    if park:
+        draw.rectangle([0, 0, park, park], fill=(200, 250, 204))
+    spacing = 64 if (x + y) % 2 else 128
+    for p in range(0, 256, spacing):
+        draw.rectangle([p, 0, p + 5, 255], fill=(255, 255, 255))
+        draw.rectangle([0, p, 255, p + 5], fill=(255, 255, 255))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def create_fake_tile_app(latency: float = 0.05) -> FastAPI:
+    """Slippy-map `/{z}/{x}/{y}.png` tile server with synthetic, deterministic tiles"""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/{z}/{x}/{y}.png")
+    async def tile(z: int, x: int, y: int):
+        app.state.calls += 1
+        await asyncio.sleep(latency)
+        return Response(_synthetic_tile(z, x, y), media_type="image/png")
+
+    return app
+
+
+def create_fake_overpass_app(latency: float = 0.3, spacing_deg: float = 0.001) -> FastAPI:
+    """
+    Overpass `/api/interpreter` answering bbox queries with a deterministic
+    lattice of cafes (about one per `spacing_deg` cell, some cells empty), so
+    overlapping queries return the same elements. Records every query.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.queries = []
+    bbox_re = re.compile(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)")
+
+    @app.post("/api/interpreter")
+    async def interpreter(request: Request):
+        form = await request.form()
+        query = form.get("data") or (await request.body()).decode()
+        app.state.calls += 1
+        app.state.queries.append(query)
+        await asyncio.sleep(latency)
+        match = bbox_re.search(query)
+        if not match:
+            return Response("bad query", status_code=400)
+        s, w, n, e = map(float, match.groups())
+        elements = []
+        for i in range(math.ceil(s / spacing_deg), math.floor(n / spacing_deg) + 1):
+            for j in range(math.ceil(w / spacing_deg), math.floor(e / spacing_deg) + 1):
+                if (i * 31 + j * 17) % 3 == 0:
+                    continue
+                element = {"type": "node", "id": abs(i) * 1_000_000 + abs(j), "lat": i * spacing_deg, "lon": j * spacing_deg}
+                element["tags"] = {"amenity": "cafe", "name": f"Cafe {i},{j}"}
+                if (i + j) % 4 == 0:
+                    element["tags"]["addr:street"] = f"Jalan {abs(i) % 97}"
+                elements.append(element)
+        return {"version": 0.6, "generator": "finaya-fake-overpass", "elements": elements}
+
+    return app
+
+
+def create_fake_places_app(latency: float = 0.1, spacing_deg: float = 0.0015, token_delay: float = 2.0) -> FastAPI:
+    """
+    Google Places `nearbysearch/json` over a deterministic lattice of places.
+    Like the real API: 20 results per page ranked by a fixed prominence, at
+    most 3 pages, and a `next_page_token` that answers INVALID_REQUEST until
+    `token_delay` seconds after it was issued.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.tokens = {}
+
+    def places_around(lat: float, lng: float, radius: float, keyword: str):
+        reach = radius / 111_320 / max(math.cos(math.radians(lat)), 0.01)
+        found = []
+        for i in range(math.ceil((lat - reach) / spacing_deg), math.floor((lat + reach) / spacing_deg) + 1):
+            for j in range(math.ceil((lng - reach) / spacing_deg), math.floor((lng + reach) / spacing_deg) + 1):
+                if (i * 7 + j * 13 + len(keyword)) % 4 == 0:
+                    continue
+                p_lat, p_lng = i * spacing_deg, j * spacing_deg
+                d_lat = (p_lat - lat) * 111_320
+                d_lng = (p_lng - lng) * 111_320 * math.cos(math.radians(lat))
+                if math.hypot(d_lat, d_lng) <= radius:
+                    prominence = (i * 2654435761 + j * 40503) % 1000
+                    found.append((prominence, {
+                        "place_id": f"fake_{keyword}_{i}_{j}",
+                        "name": f"{keyword.title() or 'Place'} {i % 1000}-{j % 1000}",
+                        "geometry": {"location": {"lat": p_lat, "lng": p_lng}},
+                        "rating": round(3 + prominence % 20 / 10, 1),
+                        "user_ratings_total": prominence,
+                        "vicinity": f"Jalan {abs(i) % 97}",
+                        "price_level": prominence % 4 + 1,
+                        "types": ["cafe", "food"],
+                    }))
+        return [place for _, place in sorted(found, key=lambda x: -x[0])]
+
+    @app.get("/nearbysearch/json")
+    async def nearbysearch(request: Request):
+        app.state.calls += 1
+        await asyncio.sleep(latency)
+        q = request.query_params
+        token = q.get("pagetoken")
+        if token:
+            issued = app.state.tokens.get(token)
+            if issued is None or time.monotonic() - issued[0] < token_delay:
+                return {"status": "INVALID_REQUEST", "results": []}
+            lat, lng, radius, keyword, page = issued[1]
+        else:
+            lat, lng = map(float, q["location"].split(","))
+            radius, keyword, page = float(q.get("radius", 1000)), q.get("keyword", ""), 0
+        places = places_around(lat, lng, radius, keyword)[:60]
+        body = {"status": "OK" if places else "ZERO_RESULTS", "results": places[page * 20:(page + 1) * 20]}
+        if (page + 1) * 20 < len(places):
+            token = f"tok{len(app.state.tokens)}"
+            app.state.tokens[token] = (time.monotonic(), (lat, lng, radius, keyword, page + 1))
+            body["next_page_token"] = token
+        return body
+
+    return app
+
+
+@contextmanager
+def serve(app: FastAPI):
+    """Run `app` on a free localhost port for the duration of the block, yielding its base URL"""
+    port = _free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,115 @@
+"""
+Synthetic offline datasets for the benchmarks (no downloads needed).
+"""
+import math
+import os
+import random
+from typing import Tuple
+
+import numpy as np
+
+from app.core.geo import METERS_PER_DEGREE_LAT
+
+
+def write_synthetic_osm(path: str, center: Tuple[float, float], blocks: int = 40, block_m: float = 90.0, seed: int = 0):
+    """
+    A `blocks` x `blocks` street grid as OSM XML: every fifth street is a
+    `primary` road, the rest `residential`. Intersections are jittered and a
+    share of street segments dropped, so degrees and bends vary like a real
+    city's. Returns (nodes, ways).
+    """
+    rng = random.Random(seed)
+    lat0, lng0 = center
+    d_lat = block_m / METERS_PER_DEGREE_LAT
+    d_lng = d_lat / math.cos(math.radians(lat0))
+    half = blocks / 2
+
+    def node_id(r: int, c: int) -> int:
+        return r * (blocks + 1) + c + 1
+
+    ways = []
+    for r in range(blocks + 1):
+        ways.append(("primary" if r % 5 == 0 else "residential", [(r, c) for c in range(blocks + 1)]))
+    for c in range(blocks + 1):
+        ways.append(("primary" if c % 5 == 0 else "residential", [(r, c) for r in range(blocks + 1)]))
+
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="finaya-bench">\n')
+        for r in range(blocks + 1):
+            for c in range(blocks + 1):
+                lat = lat0 + (r - half + rng.uniform(-0.15, 0.15)) * d_lat
+                lng = lng0 + (c - half + rng.uniform(-0.15, 0.15)) * d_lng
+                f.write(f'  <node id="{node_id(r, c)}" lat="{lat:.7f}" lon="{lng:.7f}"/>\n')
+        way_id = 1
+        for highway, cells in ways:
+            # Split residential streets into pieces with gaps (cul-de-sacs, T-junctions)
+            piece = []
+            for cell in cells:
+                piece.append(cell)
+                if highway == "residential" and rng.random() < 0.12:
+                    if len(piece) > 1:
+                        refs = "".join(f'<nd ref="{node_id(*p)}"/>' for p in piece)
+                        f.write(f'  <way id="{way_id}">{refs}<tag k="highway" v="{highway}"/></way>\n')
+                        way_id += 1
+                    piece = [cell] if rng.random() < 0.5 else []
+            if len(piece) > 1:
+                refs = "".join(f'<nd ref="{node_id(*p)}"/>' for p in piece)
+                f.write(f'  <way id="{way_id}">{refs}<tag k="highway" v="{highway}"/></way>\n')
+                way_id += 1
+        f.write("</osm>\n")
+    return (blocks + 1) ** 2, way_id - 1
+
+
+def write_synthetic_population(path: str, center: Tuple[float, float], size: int = 4000, cell_deg: float = 1 / 1200, seed: int = 0):
+    """
+    A `size` x `size` people-per-cell raster as ESRI GridFloat (`path` =
+    `.flt`, header next to it): a dense core fading into suburbs, with noise
+    and a nodata band along one edge. The default 3-arc-second cells match
+    WorldPop's 100 m product. Returns the file size in bytes.
+    """
+    rng = np.random.default_rng(seed)
+    lat0, lng0 = center
+    north = lat0 + size / 2 * cell_deg
+    west = lng0 - size / 2 * cell_deg
+    cell_km2 = (cell_deg * METERS_PER_DEGREE_LAT / 1000) ** 2 * math.cos(math.radians(lat0))
+
+    data = np.memmap(path, dtype="<f4", mode="w+", shape=(size, size))
+    cols = np.arange(size)
+    for r0 in range(0, size, 256):
+        rows = np.arange(r0, min(r0 + 256, size))
+        dist_km = np.hypot(rows[:, None] - size / 2, cols[None, :] - size / 2) * cell_deg * METERS_PER_DEGREE_LAT / 1000
+        density = 20000 * np.exp(-dist_km / 8) * rng.lognormal(0, 0.4, dist_km.shape)
+        block = (density * cell_km2).astype(np.float32)
+        block[:, :8] = -9999
+        data[r0:r0 + len(rows)] = block
+    data.flush()
+    del data
+
+    with open(os.path.splitext(path)[0] + ".hdr", "w") as f:
+        f.write(
+            f"ncols {size}\nnrows {size}\nxllcorner {west:.9f}\nyllcorner {north - size * cell_deg:.9f}\n"
+            f"cellsize {cell_deg:.12f}\nNODATA_value -9999\nbyteorder LSBFIRST\n"
+        )
+    return os.path.getsize(path)
+
+
+def write_synthetic_gazetteer(path: str, places: int = 200_000, seed: int = 0):
+    """
+    GeoNames-format TSV (19 columns, as in `cities500.txt`) with `places`
+    populated places scattered over land-ish latitudes, plus one admin-area
+    row in twenty that the loader should skip. Returns the file size in bytes.
+    """
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-50, 65, places)
+    lng = rng.uniform(-180, 180, places)
+    population = rng.lognormal(7, 2, places).astype(np.int64)
+    codes = ["PPL", "PPLX", "PPLA", "PPLA2"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(places):
+            feature_class, code = ("A", "ADM2") if i % 20 == 0 else ("P", codes[i % len(codes)])
+            name = f"Kampung {i:06d}"
+            f.write(
+                f"{i + 1}\t{name}\t{name}\t\t{lat[i]:.5f}\t{lng[i]:.5f}\t{feature_class}\t{code}\tID\t\t04\t\t\t\t"
+                f"{population[i]}\t\t10\tAsia/Jakarta\t2024-01-01\n"
+            )
+    return os.path.getsize(path)
@@ -2,6 +2,7 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 import logging
 
@@ -12,6 +13,15 @@ from app.core.ratelimiter import rate_limiter, rate_limit_exceeded_handler
 from app.api.v1.auth import router as auth_router
 from app.api.v1.analysis import router as analysis_router
 from app.core.middleware import RequestLoggingMiddleware, OptionsMiddleware
+from app.services.llm_gateway import close_llm_gateway
+from app.services.tile_service import close_tile_service
+from app.services.weather_probability import close_weather_client
+from app.services.road_graph import load_road_graph
+from app.services.geocoder import close_geocode_client, load_gazetteer
+from app.services.overpass_service import close_overpass_client
+from app.services.places_service import places_service
+from app.services.places_store import places_store
+from app.core.singleflight import singleflight_stats
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
@@ -49,6 +59,11 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Database init failed: {e}")
 
+    # Road graph compiles in a worker thread; sites fall back to the default junction chain until it's ready
+    app.state.road_graph_task = asyncio.create_task(asyncio.to_thread(load_road_graph))
+    # Same for the gazetteer; reverse geocoding uses Nominatim until it's ready
+    app.state.gazetteer_task = asyncio.create_task(asyncio.to_thread(load_gazetteer))
+
     logger.info("All services initialized successfully")
 
     yield  # <---- app runs here
@@ -58,6 +73,12 @@ async def lifespan(app: FastAPI):
     try:
         await container.close()
         await rate_limiter.close()
+        await close_llm_gateway()
+        await close_tile_service()
+        await close_weather_client()
+        await close_geocode_client()
+        await close_overpass_client()
+        await places_service.close()
         logger.info("Services shut down gracefully")
     except Exception as e:
         logger.error(f"❌ Error during shutdown: {e}")
@@ -105,6 +126,16 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/health/singleflight")
+async def singleflight_health():
+    """Upstream calls saved by single-flight coalescing, per call group"""
+    return singleflight_stats()
+
+@app.get("/health/places")
+async def places_health():
+    """Share of nearby searches answered from the local places store"""
+    return places_store.info()
+
 from app.api.v1.agent import router as agent_router
 from app.api.v1.places import router as places_router
 
@@ -327,83 +327,27 @@ export const agentAPI = {
 // ============= Places API =============
 export const placesAPI = {
   getCompetitors: async (lat, lng, radius = 1000, osmFilter = '["amenity"~"cafe"]') => {
-    const maxRetries = 3;
-    const timeouts = [20000, 30000, 45000]; // Progressive timeout
-    const delays = [2000, 4000]; // Delay between retries
-    
-    // Server Failover List
-    const servers = [
-      'https://overpass-api.de/api/interpreter',
-      'https://overpass.kumi.systems/api/interpreter',
-      'https://lz4.overpass-api.de/api/interpreter'
-    ];
-
-    for (let attempt = 0; attempt < maxRetries; attempt++) {
-      try {
-        // Round robin server selection
-        const serverUrl = servers[attempt % servers.length];
-        
-        // Use 'out center' to get coordinates for Ways (buildings) too
-        const query = `
-          [out:json][timeout:${Math.floor(timeouts[attempt] / 1000)}];
-          (
-            node(around:${radius},${lat},${lng})${osmFilter};
-            way(around:${radius},${lat},${lng})${osmFilter};
-          );
-          out center;
-        `;
-        
-        // Use direct axios, not the configured 'api' instance
-        const response = await axios.post(serverUrl, query, {
-          headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-          timeout: timeouts[attempt]
-        });
-
-        const data = response.data;
-        if (!data || !data.elements) return [];
-
-        return data.elements.map(el => {
-          const latitude = el.lat || el.center?.lat;
-          const longitude = el.lon || el.center?.lon;
-          const type = el.tags?.amenity || el.tags?.shop || el.tags?.leisure || el.tags?.tourism || "Business";
-          
-          // Better fallback name if 'name' tag is missing
-          let name = el.tags?.name || el.tags?.brand;
-          if (!name) {
-             name = `Unnamed ${type.charAt(0).toUpperCase() + type.slice(1)}`;
-          }
-          
-          // Simulate rating for demo purposes since Overpass doesn't provide it
-          const simulatedRating = (3.5 + Math.random() * 1.4).toFixed(1); // 3.5 - 4.9
-          const simulatedReviews = Math.floor(Math.random() * 300) + 5;
-          
-          return {
-            lat: latitude,
-            lng: longitude,
-            name: name,
-            vicinity: el.tags?.["addr:street"] ? `${el.tags["addr:street"]} (${type})` : type,
-            rating: simulatedRating,
-            user_ratings_total: simulatedReviews
-          };
-        }).filter(item => item.lat && item.lng);
-
-      } catch (error) {
-        logger.warn(`Overpass attempt ${attempt + 1}/${maxRetries} failed:`, error.message);
-        
-        // If this was the last attempt, give up gracefully
-        if (attempt === maxRetries - 1) {
-          logger.error('All Overpass retries failed. Continuing without competitor data.');
-          return []; // Return empty instead of throwing
-        }
-        
-        // Wait before retry
-        if (delays[attempt]) {
-          await new Promise(resolve => setTimeout(resolve, delays[attempt]));
-        }
+    // Overpass is queried by the backend, which caches results per map tile
+    try {
+      const response = await api.get('/places/competitors/osm', {
+        params: { lat, lng, radius, filter: osmFilter },
+        timeout: 60000
+      });
+      const { places = [], complete } = response.data || {};
+      if (complete === false) {
+        logger.warn('Competitor scan is partial: Overpass unavailable for part of the area');
       }
+
+      return places.map(place => ({
+        ...place,
+        // Simulate rating for demo purposes since Overpass doesn't provide it
+        rating: (3.5 + Math.random() * 1.4).toFixed(1), // 3.5 - 4.9
+        user_ratings_total: Math.floor(Math.random() * 300) + 5
+      }));
+    } catch (error) {
+      logger.error('Competitor scan failed. Continuing without competitor data.', error.message);
+      return []; // Return empty instead of throwing
     }
-    
-    return []; // Fallback
   },
 };
 